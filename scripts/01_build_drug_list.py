@@ -3,17 +3,26 @@
 Step 1: 初期薬リスト（~300品目）の作成
 KEGG BRITE hierarchy + 手動キュレーションで主要薬を選定し、
 KEGG REST APIから詳細情報を取得
+
+薬名検索は list/drug を1回取得してローカルインデックスで行う。
+--kegg-find で従来の薬名ごとの find/drug 検索。
 """
 
+import asyncio
 import json
 import re
-import time
-import requests
+import sys
 from pathlib import Path
 
+from fetch_engine import AsyncFetcher, ordered_map
+from kegg_brite import load_jp_drug_info
+from kegg_flatfile import read_entries
+from kegg_name_index import KEGG_LIST_URL, KeggNameIndex
+
 DATA_DIR = Path(__file__).parent.parent / "data"
 KEGG_BASE = "https://rest.kegg.jp"
 RATE_LIMIT = 0.35  # 3 requests/sec max
+KEGG_RATES = {"rest.kegg.jp": 1 / RATE_LIMIT}
 
 # === 主要薬リスト（日本で頻用される一般名 → KEGG IDマッピング用） ===
 # NDB処方データ + 臨床使用頻度ベースで選定
@@ -92,15 +101,13 @@ PRIORITY_DRUGS_EN = [
 ]
 
 
-def search_kegg_drug(name: str) -> list[dict]:
+async def search_kegg_drug(fetcher: AsyncFetcher, name: str) -> list[dict]:
     """KEGGで薬名を検索してIDと名前を返す"""
-    time.sleep(RATE_LIMIT)
-    url = f"{KEGG_BASE}/find/drug/{name}"
-    r = requests.get(url)
-    if r.status_code != 200 or not r.text.strip():
+    text = await fetcher.get_text(f"{KEGG_BASE}/find/drug/{name}")
+    if not text or not text.strip():
         return []
     results = []
-    for line in r.text.strip().split('\n'):
+    for line in text.strip().split('\n'):
         parts = line.split('\t', 1)
         if len(parts) == 2:
             drug_id = parts[0].replace('dr:', '')
@@ -109,41 +116,24 @@ def search_kegg_drug(name: str) -> list[dict]:
     return results
 
 
-def get_drug_detail(kegg_id: str) -> dict:
-    """KEGGから薬の詳細情報を取得"""
-    time.sleep(RATE_LIMIT)
-    url = f"{KEGG_BASE}/get/{kegg_id}"
-    r = requests.get(url)
-    if r.status_code != 200:
-        return {}
-
-    info = {'kegg_id': kegg_id}
-    current_field = ''
-    current_value = []
-
-    for line in r.text.split('\n'):
-        if line.startswith('///'):
-            break
-        if line and not line[0].isspace():
-            # Save previous field
-            if current_field and current_value:
-                info[current_field] = '\n'.join(current_value)
-            # New field
-            parts = line.split(None, 1)
-            current_field = parts[0].lower()
-            current_value = [parts[1]] if len(parts) > 1 else []
-        elif line.startswith(' ') and current_field:
-            current_value.append(line.strip())
-
-    # Save last field
-    if current_field and current_value:
-        info[current_field] = '\n'.join(current_value)
+async def load_name_index(fetcher: AsyncFetcher) -> KeggNameIndex | None:
+    """KEGG list/drug を取得して薬名インデックスを構築"""
+    text = await fetcher.get_text(KEGG_LIST_URL, timeout=60)
+    if not text:
+        return None
+    index = KeggNameIndex.from_list(text)
+    print(f"KEGG list/drug: {len(index.entries)} entries indexed")
+    return index
 
-    return info
 
+async def get_drug_detail(fetcher: AsyncFetcher, kegg_id: str) -> dict:
+    """KEGGから薬の詳細情報を取得（必要なフィールドだけを読みながらパース）"""
+    entries = await fetcher.fetch_parsed(f"{KEGG_BASE}/get/{kegg_id}", read_entries)
+    return (entries or {}).get(kegg_id, {})
 
-def parse_drug_info(raw: dict) -> dict:
-    """生のKEGGデータを構造化"""
+
+def parse_drug_info(raw: dict, brite_info: dict = None) -> dict:
+    """生のKEGGデータを構造化（brite_info: load_jp_drug_info の要素）"""
     info = {
         'kegg_id': raw.get('kegg_id', ''),
         'name_en': '',
@@ -175,6 +165,12 @@ def parse_drug_info(raw: dict) -> dict:
     if atc_match:
         info['atc_code'] = atc_match.group(1)
 
+    # REMARK に無ければ BRITE 階層の薬効分類・日本語名
+    if brite_info:
+        if not info['therapeutic_category']:
+            info['therapeutic_category'] = brite_info.get('category_code', '')
+        info['name_ja'] = brite_info.get('name_ja', '')
+
     # Parse CLASS for drug groups
     class_raw = raw.get('class', '')
     if class_raw:
@@ -196,7 +192,7 @@ def parse_drug_info(raw: dict) -> dict:
     return info
 
 
-def main():
+async def main():
     print(f"=== Building initial drug list ({len(PRIORITY_DRUGS_EN)} target drugs) ===\n")
 
     # Load existing KEGG JP drugs for reference
@@ -209,15 +205,29 @@ def main():
     else:
         kegg_names = {}
 
+    try:
+        brite_index = load_jp_drug_info()
+    except Exception as e:
+        print(f"WARNING: BRITE hierarchy unavailable ({e})")
+        brite_index = {}
+
+    fetcher = AsyncFetcher(rates=KEGG_RATES)
+
     # Search each drug name in KEGG
     drug_list = []
     not_found = []
     search_cache = {}
 
-    for i, name in enumerate(PRIORITY_DRUGS_EN):
-        print(f"[{i+1}/{len(PRIORITY_DRUGS_EN)}] Searching: {name}...", end=' ')
+    index = None if "--kegg-find" in sys.argv else await load_name_index(fetcher)
+
+    async def search(entry):
+        _, name = entry
+        if index is not None:
+            return index.search(name)
+        return await search_kegg_drug(fetcher, name)
 
-        results = search_kegg_drug(name)
+    async for (i, name), results in ordered_map(search, enumerate(PRIORITY_DRUGS_EN, start=1)):
+        print(f"[{i}/{len(PRIORITY_DRUGS_EN)}] Searching: {name}...", end=' ')
 
         if not results:
             print("NOT FOUND")
@@ -246,19 +256,25 @@ def main():
     print(f"\n=== Fetching detailed info for {len(search_cache)} drugs ===\n")
 
     detailed_drugs = []
-    for i, (name, match) in enumerate(search_cache.items()):
+
+    async def detail(entry):
+        _, (_, match) = entry
+        return await get_drug_detail(fetcher, match['kegg_id'])
+
+    async for (i, (name, match)), raw in ordered_map(detail, enumerate(search_cache.items(), start=1)):
         kegg_id = match['kegg_id']
-        print(f"[{i+1}/{len(search_cache)}] Getting details: {kegg_id} ({name})...", end=' ')
+        print(f"[{i}/{len(search_cache)}] Getting details: {kegg_id} ({name})...", end=' ')
 
-        raw = get_drug_detail(kegg_id)
         if raw:
-            parsed = parse_drug_info(raw)
+            parsed = parse_drug_info(raw, brite_index.get(kegg_id))
             parsed['search_name'] = name  # Original search term
             detailed_drugs.append(parsed)
             print(f"OK (CYP: {parsed['cyp_enzymes']}, TC: {parsed['therapeutic_category']})")
         else:
             print("FAILED")
 
+    fetcher.close()
+
     # Save final drug list
     output_file = DATA_DIR / "initial_drugs.json"
     with open(output_file, "w", encoding='utf-8') as f:
@@ -272,4 +288,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    asyncio.run(main())
@@ -4,27 +4,27 @@ Step 2: 薬物間相互作用（DDI）データの収集
 initial_drugs.json の各薬についてKEGG REST APIからDDIを取得
 """
 
+import asyncio
 import json
-import time
-import requests
 from pathlib import Path
 from collections import defaultdict
 
+from fetch_engine import AsyncFetcher, ordered_map
+
 DATA_DIR = Path(__file__).parent.parent / "data"
 KEGG_BASE = "https://rest.kegg.jp"
 RATE_LIMIT = 0.35  # 3 requests/sec max
+KEGG_RATES = {"rest.kegg.jp": 1 / RATE_LIMIT}
 
 
-def fetch_ddi(kegg_id: str) -> list[dict]:
+async def fetch_ddi(fetcher: AsyncFetcher, kegg_id: str) -> list[dict]:
     """1薬のDDI（相互作用）を全て取得"""
-    time.sleep(RATE_LIMIT)
-    url = f"{KEGG_BASE}/ddi/{kegg_id}"
-    r = requests.get(url)
-    if r.status_code != 200 or not r.text.strip():
+    text = await fetcher.get_text(f"{KEGG_BASE}/ddi/{kegg_id}")
+    if not text or not text.strip():
         return []
 
     interactions = []
-    for line in r.text.strip().split('\n'):
+    for line in text.strip().split('\n'):
         parts = line.split('\t')
         if len(parts) >= 3:
             drug1 = parts[0].replace('dr:', '')
@@ -40,7 +40,7 @@ def fetch_ddi(kegg_id: str) -> list[dict]:
     return interactions
 
 
-def main():
+async def main():
     # Load initial drug list
     drugs_file = DATA_DIR / "initial_drugs.json"
     if not drugs_file.exists():
@@ -59,12 +59,16 @@ def main():
     internal_interactions = []  # Both drugs in our list
     stats = {'total': 0, 'CI': 0, 'P': 0, 'CI,P': 0, 'internal_CI': 0, 'internal_P': 0, 'internal_CI,P': 0}
 
-    for i, drug in enumerate(drugs):
+    fetcher = AsyncFetcher(rates=KEGG_RATES)
+
+    async def fetch(entry):
+        _, drug = entry
+        return await fetch_ddi(fetcher, drug['kegg_id'])
+
+    async for (i, drug), interactions in ordered_map(fetch, enumerate(drugs, start=1)):
         kegg_id = drug['kegg_id']
         name = drug.get('search_name', drug.get('name_en', kegg_id))
-        print(f"[{i+1}/{len(drugs)}] DDI for {kegg_id} ({name})...", end=' ')
-
-        interactions = fetch_ddi(kegg_id)
+        print(f"[{i}/{len(drugs)}] DDI for {kegg_id} ({name})...", end=' ')
         print(f"{len(interactions)} interactions")
 
         for ix in interactions:
@@ -88,6 +92,8 @@ def main():
                     stats[int_key] = 0
                 stats[int_key] += 1
 
+    fetcher.close()
+
     # Deduplicate internal interactions (A-B and B-A)
     seen = set()
     unique_internal = []
@@ -136,4 +142,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    asyncio.run(main())
@@ -9,12 +9,15 @@ import io
 import json
 import os
 import re
+import sys
 import zipfile
 from pathlib import Path
 from collections import defaultdict, Counter
 
-import pandas as pd
-import requests
+from http_cache import get_session
+from jader_aggregate import aggregate_jader, jader_drug_key
+from jader_signals import compute_signals
+from jader_store import jader_files
 
 DATA_DIR = Path(__file__).parent.parent / "data"
 JADER_DIR = DATA_DIR / "jader_raw"
@@ -59,7 +62,7 @@ def download_jader_csvs():
     print("自動ダウンロードを試みます...")
     try:
         # Try the direct download link (may not work)
-        r = requests.get(
+        r = get_session().get(
             "https://www.pmda.go.jp/safety/info-services/drugs/adr-info/suspected-adr/0004.html",
             timeout=30
         )
@@ -85,76 +88,63 @@ def download_jader_csvs():
     return False
 
 
-def process_jader_data(drug_list: list[dict]) -> dict:
-    """JADERデータを処理して薬→副作用マッピングを作成"""
+def process_jader_data(drug_list: list[dict]) -> list[dict]:
+    """JADERデータを処理して薬→副作用マッピングを作成
 
-    drug_file = JADER_DIR / "drug.csv"
-    reac_file = JADER_DIR / "reac.csv"
-
-    if not drug_file.exists() or not reac_file.exists():
+    drug.csv × reac.csv を症例IDで結合して数えた 被疑薬→有害事象 の症例数から
+    PRR / ROR / IC を計算し、薬ごとにシグナルのある有害事象を選ぶ。
+    JADER に一致する一般名が無い・シグナルが無い薬はクラスベースの代替データを使う。
+    """
+    if jader_files(JADER_DIR) is None:
         print("JADERファイルが見つかりません。代替データを生成します。")
         return generate_fallback_adverse_effects(drug_list)
 
     print("=== JADER CSVを処理中 ===\n")
+    counts = aggregate_jader(JADER_DIR, suspect_only="--all-drugs" not in sys.argv,
+                             drug_key=jader_drug_key)
+    signals = compute_signals(counts)
 
-    # Read drug.csv (case_id, drug_name_general, drug_name_brand, ...)
-    df_drug = pd.read_csv(drug_file, encoding='cp932', low_memory=False)
-    print(f"drug.csv: {len(df_drug)} rows")
-
-    # Read reac.csv (case_id, adverse_reaction, ...)
-    df_reac = pd.read_csv(reac_file, encoding='cp932', low_memory=False)
-    print(f"reac.csv: {len(df_reac)} rows")
-
-    # Create drug name → KEGG ID mapping
-    name_to_id = {}
+    # JADER の一般名（正規化キー）→ 薬コード
+    # （同じ薬に複数の一般名が一致したら症例数の多いものを使う）
+    drug_code = {}
     for d in drug_list:
-        name_en = d.get('name_en', '').lower()
-        search = d.get('search_name', '').lower()
-        kegg_id = d['kegg_id']
-        name_to_id[name_en] = kegg_id
-        name_to_id[search] = kegg_id
-
-    # Merge drug and reaction data
-    # JADER columns vary by year, try common column names
-    case_col = None
-    for col in ['識別番号', 'case_id', '症例番号']:
-        if col in df_drug.columns:
-            case_col = col
-            break
-
-    if case_col is None:
-        print(f"WARNING: Cannot find case ID column. Columns: {list(df_drug.columns)}")
-        return {}
-
-    drug_name_col = None
-    for col in ['医薬品（一般名）', 'drug_name', '一般名']:
-        if col in df_drug.columns:
-            drug_name_col = col
-            break
-
-    reac_name_col = None
-    for col in ['有害事象', 'adverse_reaction', '副作用名']:
-        if col in df_reac.columns:
-            reac_name_col = col
-            break
-
-    print(f"Using columns: case={case_col}, drug={drug_name_col}, reaction={reac_name_col}")
-
-    # Aggregate: drug → [adverse effects with counts]
-    # ... (Full JADER processing would go here)
-
-    return {}
+        candidates = [counts.drug_index.get(jader_drug_key(name)) for name in
+                      (d.get('name_ja', ''), d.get('name_en', ''), d.get('search_name', ''))]
+        candidates = [c for c in candidates if c is not None]
+        if candidates:
+            drug_code[d['kegg_id']] = max(candidates, key=lambda c: counts.drug_cases[c])
+    print(f"JADER一般名に一致: {len(drug_code)}/{len(drug_list)} drugs")
+
+    fallback = {d['kegg_id']: d for d in generate_fallback_adverse_effects(drug_list, save=False)}
+    drug_adverse = []
+    for drug in drug_list:
+        kegg_id = drug['kegg_id']
+        effects = signals.top_events(drug_code[kegg_id]) if kegg_id in drug_code else []
+        if effects:
+            drug_adverse.append({
+                'kegg_id': kegg_id,
+                'name': drug.get('search_name', drug.get('name_en', '')),
+                'source': 'JADER',
+                'jader_cases': int(counts.drug_cases[drug_code[kegg_id]]),
+                'adverse_effects': effects,
+            })
+        else:
+            drug_adverse.append(dict(fallback[kegg_id], source='class'))
+
+    save_adverse_effects(drug_adverse)
+    return drug_adverse
 
 
-def generate_fallback_adverse_effects(drug_list: list[dict]) -> list[dict]:
+def generate_fallback_adverse_effects(drug_list: list[dict], save: bool = True) -> list[dict]:
     """
     JADERが手元にない場合の代替：
     KEGG DRUGの情報と一般的な医学知識から主要副作用を構造化
     本番データが入手できたら差し替える
     """
-    print("=== 代替副作用データを生成 ===")
-    print("注意: これはKEGG情報ベースの推定データです。")
-    print("JADERデータ入手後に差し替えてください。\n")
+    if save:
+        print("=== 代替副作用データを生成 ===")
+        print("注意: これはKEGG情報ベースの推定データです。")
+        print("JADERデータ入手後に差し替えてください。\n")
 
     # Drug class → common adverse effects mapping
     class_adverse_effects = {
@@ -284,7 +274,12 @@ def generate_fallback_adverse_effects(drug_list: list[dict]) -> list[dict]:
             'adverse_effects': unique_effects,
         })
 
-    # Save
+    if save:
+        save_adverse_effects(drug_adverse)
+    return drug_adverse
+
+
+def save_adverse_effects(drug_adverse: list[dict]):
     output = DATA_DIR / "adverse_effects.json"
     with open(output, "w", encoding='utf-8') as f:
         json.dump(drug_adverse, f, ensure_ascii=False, indent=2)
@@ -295,8 +290,6 @@ def generate_fallback_adverse_effects(drug_list: list[dict]) -> list[dict]:
     print(f"Total adverse effect entries: {total_effects}")
     print(f"Saved to: {output}")
 
-    return drug_adverse
-
 
 def main():
     # Load initial drug list
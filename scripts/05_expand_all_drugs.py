@@ -1,25 +1,35 @@
 #!/usr/bin/env python3
 """
 Step 5: KEGG日本承認薬2,600品目を全取得
-- KEGG BRITE階層から全薬IDを取得済み（kegg_jp_drugs.json）
+- KEGG BRITE階層（br08301 / jp08301）から全薬ID・薬効分類・日本語名を取得
+  （kegg_jp_drugs.json があれば薬IDリストはそちらを使う）
 - 各薬の詳細情報をバッチ取得
 - 日本語名をカタカナ変換テーブル + 手動マッピングで付与
 - DDIをバッチ取得
 - 最終グラフデータを生成
+
+取得順は 日本販売薬（薬価収載成分・drug_search_results）→ 既知DDIの相手が多い薬 → 残り。
+--time-budget 20m などで取得時間に上限を付けられる（上限で止めて書き出し、再実行で続きから）。
 """
 
+import asyncio
 import json
 import re
-import time
 import sys
+from contextlib import aclosing
 from pathlib import Path
 from collections import defaultdict, Counter
 
-import requests
+from checkpoint_journal import Journal
+from fetch_engine import AsyncFetcher, ordered_map
+from fetch_priority import TimeBudget, load_yakka_names, partner_degree, priority_order
+from kegg_brite import load_jp_drug_info
+from kegg_flatfile import KEGG_BATCH_SIZE, chunked, read_entries
 
 DATA_DIR = Path(__file__).parent.parent / "data"
 KEGG_BASE = "https://rest.kegg.jp"
 RATE_LIMIT = 0.34
+KEGG_RATES = {"rest.kegg.jp": 1 / RATE_LIMIT}
 
 # ===== 日本語名マッピング（主要薬 + カタカナ変換ルール） =====
 
@@ -262,37 +272,15 @@ def english_to_katakana(name: str) -> str:
     return ""  # 自動変換は精度が低いので空文字を返す
 
 
-def get_drug_detail(kegg_id: str) -> dict:
-    """KEGGから薬の詳細情報を取得"""
-    time.sleep(RATE_LIMIT)
-    url = f"{KEGG_BASE}/get/{kegg_id}"
-    try:
-        r = requests.get(url, timeout=15)
-        if r.status_code != 200:
-            return {}
-    except Exception:
-        return {}
-
-    info = {'kegg_id': kegg_id}
-    current_field = ''
-    current_value = []
-
-    for line in r.text.split('\n'):
-        if line.startswith('///'):
-            break
-        if line and not line[0].isspace():
-            if current_field and current_value:
-                info[current_field] = '\n'.join(current_value)
-            parts = line.split(None, 1)
-            current_field = parts[0].lower()
-            current_value = [parts[1]] if len(parts) > 1 else []
-        elif line.startswith(' ') and current_field:
-            current_value.append(line.strip())
-
-    if current_field and current_value:
-        info[current_field] = '\n'.join(current_value)
+async def get_drug_details(fetcher: AsyncFetcher, kegg_ids: list[str]) -> dict[str, dict]:
+    """KEGGから複数薬の詳細情報を1リクエストで取得（{kegg_id: raw}）"""
+    entries = await fetcher.fetch_parsed(f"{KEGG_BASE}/get/{'+'.join(kegg_ids)}", read_entries)
+    return entries or {}
 
-    return info
+
+async def get_drug_detail(fetcher: AsyncFetcher, kegg_id: str) -> dict:
+    """KEGGから薬の詳細情報を取得"""
+    return (await get_drug_details(fetcher, [kegg_id])).get(kegg_id, {})
 
 
 def parse_drug_info(raw: dict, brite_info: dict = None) -> dict:
@@ -319,10 +307,10 @@ def parse_drug_info(raw: dict, brite_info: dict = None) -> dict:
         info['name_en'] = names[0] if names else ''
         info['names_alt'] = names[1:] if len(names) > 1 else []
 
-    # Japanese name
+    # Japanese name（jp08301 の日本語名 → なければカタカナ変換）
     search_name = info['name_en'].split('(')[0].strip()
     info['search_name'] = search_name
-    info['name_ja'] = english_to_katakana(info['name_en'])
+    info['name_ja'] = (brite_info or {}).get('name_ja') or english_to_katakana(info['name_en'])
 
     # Parse REMARK
     remark = raw.get('remark', '')
@@ -357,18 +345,10 @@ def parse_drug_info(raw: dict, brite_info: dict = None) -> dict:
     return info
 
 
-def fetch_ddi(kegg_id: str) -> list[dict]:
-    """1薬のDDIを取得"""
-    time.sleep(RATE_LIMIT)
-    try:
-        r = requests.get(f"{KEGG_BASE}/ddi/{kegg_id}", timeout=15)
-        if r.status_code != 200 or not r.text.strip():
-            return []
-    except Exception:
-        return []
-
+def parse_ddi_lines(text: str) -> list[dict]:
+    """ddi 応答（タブ区切り）をパース"""
     interactions = []
-    for line in r.text.strip().split('\n'):
+    for line in text.strip().split('\n'):
         parts = line.split('\t')
         if len(parts) >= 3:
             drug1 = parts[0].replace('dr:', '')
@@ -385,11 +365,74 @@ def fetch_ddi(kegg_id: str) -> list[dict]:
     return interactions
 
 
-def main():
-    # Load BRITE drug list
+async def fetch_ddi_batch(fetcher: AsyncFetcher, kegg_ids: list[str]) -> dict[str, list[dict]]:
+    """複数薬のDDIを1リクエストで取得し、問い合わせた薬ごとに振り分け
+
+    取得に失敗した薬は結果に含めない（空リスト =「DDIなし」は status 200 の応答のときだけ）。
+    まとめた取得が失敗したら1薬ずつ取り直す。
+    """
+    text = await fetcher.get_text(f"{KEGG_BASE}/ddi/{'+'.join(kegg_ids)}")
+    if text is None:
+        if len(kegg_ids) == 1:
+            return {}
+        result = {}
+        for part in await asyncio.gather(*(fetch_ddi_batch(fetcher, [kid]) for kid in kegg_ids)):
+            result.update(part)
+        return result
+
+    result = {kid: [] for kid in kegg_ids}
+    for ix in parse_ddi_lines(text):
+        # 1列目が問い合わせた薬
+        owner = ix['drug1'] if ix['drug1'] in result else ix['drug2']
+        if owner in result:
+            result[owner].append(ix)
+    return result
+
+
+async def fetch_ddi(fetcher: AsyncFetcher, kegg_id: str) -> list[dict] | None:
+    """1薬のDDIを取得（失敗時は None）"""
+    return (await fetch_ddi_batch(fetcher, [kegg_id])).get(kegg_id)
+
+
+def japan_priority_ids(brite_index: dict) -> set[str]:
+    """日本で販売されている薬の KEGG ID（薬価収載成分と日本語名が一致 + 01 の検索結果）"""
+    yakka_names = load_yakka_names()
+    if yakka_names:
+        ids = {kid for kid, b in brite_index.items() if b.get('name_ja') in yakka_names}
+    else:
+        # 薬価リストが無ければ日本語名のあるものを優先
+        ids = {kid for kid, b in brite_index.items() if b.get('name_ja')}
+
+    search_file = DATA_DIR / "drug_search_results.json"
+    if search_file.exists():
+        with open(search_file, encoding='utf-8') as f:
+            ids.update(r['kegg_id'] for r in json.load(f).values() if r.get('kegg_id'))
+    return ids
+
+
+def ddi_degree(ddi_cache: dict) -> Counter:
+    """既知DDI（前回取得分 + ジャーナル）での薬ごとの相手数"""
+    return partner_degree((ix['drug1'], ix['drug2'])
+                          for interactions in ddi_cache.values() for ix in interactions)
+
+
+async def main():
+    budget = TimeBudget.from_argv()
+
+    # Load BRITE drug list（薬効分類・日本語名は BRITE 階層から辞書引き）
+    try:
+        brite_index = load_jp_drug_info()
+        print(f"KEGG BRITE: {len(brite_index)} drugs indexed")
+    except Exception as e:
+        print(f"WARNING: BRITE hierarchy unavailable ({e})")
+        brite_index = {}
+
     brite_file = DATA_DIR / "kegg_jp_drugs.json"
-    with open(brite_file) as f:
-        brite_drugs = json.load(f)
+    if brite_file.exists():
+        with open(brite_file) as f:
+            brite_drugs = json.load(f)
+    else:
+        brite_drugs = list(brite_index.values())
 
     # Get unique drug IDs
     seen_ids = set()
@@ -405,43 +448,73 @@ def main():
     print(f"=== Total unique drugs to process: {len(unique_drugs)} ===\n")
 
     # Load existing data to skip already fetched
+    # (前回中断分は追記ジャーナルから復元)
     existing_file = DATA_DIR / "all_drugs_detail.json"
+    detail_journal = Journal(DATA_DIR / "all_drugs_detail.jsonl")
     existing = {}
     if existing_file.exists():
         with open(existing_file) as f:
             for d in json.load(f):
                 existing[d['kegg_id']] = d
+    existing.update(detail_journal.replay())
+    if existing:
         print(f"Already fetched: {len(existing)} drugs (resuming)\n")
 
+    # 既知DDI（前回分 + 中断分）。取得順の決定と Phase 2 の両方で使う
+    ddi_cache_file = DATA_DIR / "all_ddi_cache.json"
+    ddi_journal = Journal(DATA_DIR / "all_ddi_cache.jsonl")
+    ddi_cache = {}
+    if ddi_cache_file.exists():
+        with open(ddi_cache_file) as f:
+            ddi_cache = json.load(f)
+    ddi_cache.update(ddi_journal.replay())
+
+    # 取得順: 日本販売薬 → 既知DDIの相手が多い薬 → 残り（BRITE 順）
+    preferred = japan_priority_ids(brite_index)
+    degree = ddi_degree(ddi_cache)
+    by_id = lambda d: d['kegg_id']
+    print(f"Priority: {len(preferred & seen_ids)} Japan-marketed drugs first\n")
+
     # Phase 1: Fetch details
     all_drugs = list(existing.values())
     to_fetch = [d for d in unique_drugs if d['kegg_id'] not in existing]
+    to_fetch = priority_order(to_fetch, by_id, preferred, degree)
 
     print(f"Phase 1: Fetching details for {len(to_fetch)} new drugs...\n")
 
-    for i, drug in enumerate(to_fetch):
-        kegg_id = drug['kegg_id']
-        print(f"[{i+1}/{len(to_fetch)}] {kegg_id}...", end=' ', flush=True)
-
-        raw = get_drug_detail(kegg_id)
-        if raw:
-            parsed = parse_drug_info(raw, brite_map.get(kegg_id))
-            all_drugs.append(parsed)
-            print(f"OK - {parsed.get('name_ja', '') or parsed.get('name_en', '')[:30]}")
-        else:
-            print("SKIP")
-
-        # Save progress every 100 drugs
-        if (i + 1) % 100 == 0:
-            with open(existing_file, "w", encoding='utf-8') as f:
-                json.dump(all_drugs, f, ensure_ascii=False, indent=2)
-            print(f"  [Progress saved: {len(all_drugs)} drugs]\n")
-
-    # Final save
-    with open(existing_file, "w", encoding='utf-8') as f:
-        json.dump(all_drugs, f, ensure_ascii=False, indent=2)
+    # --no-batch: 1リクエスト1薬（従来動作）
+    batch_size = 1 if "--no-batch" in sys.argv else KEGG_BATCH_SIZE
+    fetcher = AsyncFetcher(rates=KEGG_RATES)
+
+    async def details(chunk):
+        return await get_drug_details(fetcher, [d['kegg_id'] for d in chunk])
+
+    attempted = set()
+    async with aclosing(ordered_map(details, chunked(to_fetch, batch_size))) as results:
+        async for chunk, raws in results:
+            if budget.expired:
+                break
+            for drug in chunk:
+                kegg_id = drug['kegg_id']
+                attempted.add(kegg_id)
+                print(f"[{len(attempted)}/{len(to_fetch)}] {kegg_id}...", end=' ', flush=True)
+
+                raw = raws.get(kegg_id)
+                if raw:
+                    parsed = parse_drug_info(raw, brite_index.get(kegg_id) or brite_map.get(kegg_id))
+                    all_drugs.append(parsed)
+                    detail_journal.append(kegg_id, parsed)
+                    print(f"OK - {parsed.get('name_ja', '') or parsed.get('name_en', '')[:30]}")
+                else:
+                    print("SKIP")
+
+    # Final save (ジャーナルを最終JSONに圧縮)
+    detail_journal.compact(existing_file, all_drugs)
 
     drug_ids = {d['kegg_id'] for d in all_drugs}
+    # 時間予算で未取得の薬も DDI キャッシュには相手として残す（次回取得されれば使う）。
+    # ddi_internal.json には all_drugs にある薬同士の DDI だけを書く
+    cache_ids = drug_ids | {d['kegg_id'] for d in to_fetch if d['kegg_id'] not in attempted}
     with_ja = sum(1 for d in all_drugs if d.get('name_ja'))
     print(f"\n=== Phase 1 Complete ===")
     print(f"Total drugs: {len(all_drugs)}")
@@ -450,39 +523,52 @@ def main():
     # Phase 2: Fetch DDI (internal only)
     print(f"\n=== Phase 2: Fetching DDI ===\n")
 
-    ddi_cache_file = DATA_DIR / "all_ddi_cache.json"
-    ddi_cache = {}
-    if ddi_cache_file.exists():
-        with open(ddi_cache_file) as f:
-            ddi_cache = json.load(f)
+    if ddi_cache:
         print(f"DDI cache: {len(ddi_cache)} drugs already fetched\n")
 
     to_fetch_ddi = [d for d in all_drugs if d['kegg_id'] not in ddi_cache]
+    to_fetch_ddi = priority_order(to_fetch_ddi, by_id, preferred, degree)
     print(f"DDI to fetch: {len(to_fetch_ddi)} drugs\n")
 
-    for i, drug in enumerate(to_fetch_ddi):
-        kegg_id = drug['kegg_id']
-        print(f"[{i+1}/{len(to_fetch_ddi)}] DDI {kegg_id}...", end=' ', flush=True)
-
-        interactions = fetch_ddi(kegg_id)
-        # Only keep internal interactions (both drugs in our list)
-        internal = [ix for ix in interactions if ix['drug1'] in drug_ids and ix['drug2'] in drug_ids]
-        ddi_cache[kegg_id] = internal
-        print(f"{len(interactions)} total, {len(internal)} internal")
-
-        if (i + 1) % 100 == 0:
-            with open(ddi_cache_file, "w", encoding='utf-8') as f:
-                json.dump(ddi_cache, f, ensure_ascii=False, indent=2)
-            print(f"  [DDI progress saved]\n")
-
-    with open(ddi_cache_file, "w", encoding='utf-8') as f:
-        json.dump(ddi_cache, f, ensure_ascii=False, indent=2)
+    async def ddi(chunk):
+        return await fetch_ddi_batch(fetcher, [d['kegg_id'] for d in chunk])
+
+    attempted_ddi = set()
+    ddi_failed = 0
+    async with aclosing(ordered_map(ddi, chunked(to_fetch_ddi, batch_size))) as results:
+        async for chunk, batch in results:
+            if budget.expired:
+                break
+            for drug in chunk:
+                kegg_id = drug['kegg_id']
+                attempted_ddi.add(kegg_id)
+                print(f"[{len(attempted_ddi)}/{len(to_fetch_ddi)}] DDI {kegg_id}...", end=' ', flush=True)
+
+                interactions = batch.get(kegg_id)
+                if interactions is None:
+                    # 取得失敗はキャッシュ・ジャーナルに残さない（次回取り直す）
+                    ddi_failed += 1
+                    print("FAILED")
+                    continue
+                # Only keep internal interactions (both drugs in our list)
+                internal = [ix for ix in interactions if ix['drug1'] in cache_ids and ix['drug2'] in cache_ids]
+                ddi_cache[kegg_id] = internal
+                ddi_journal.append(kegg_id, internal)
+                print(f"{len(interactions)} total, {len(internal)} internal")
+
+    fetcher.close()
+    if ddi_failed:
+        print(f"\nDDI fetch failed: {ddi_failed} drugs (retried on next run)")
+
+    ddi_journal.compact(ddi_cache_file, ddi_cache)
 
     # Deduplicate all DDI
     seen = set()
     all_ddi = []
     for interactions in ddi_cache.values():
         for ix in interactions:
+            if ix['drug1'] not in drug_ids or ix['drug2'] not in drug_ids:
+                continue
             pair = tuple(sorted([ix['drug1'], ix['drug2']]))
             key = (pair[0], pair[1], ix['severity'])
             if key not in seen:
@@ -507,4 +593,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    asyncio.run(main())
@@ -3,13 +3,14 @@
 10_kegg_ja_fetch.py — KEGG日本語薬効分類(jp08301)から日本語名を一括取得
 
 KEGG BRITE jp08301 は日本語の薬効分類で、各薬のIDと日本語名が含まれる。
-1回のAPI呼び出しで全件取得可能（APIレート制限なし）。
+1回のAPI呼び出しで全件取得可能（APIレート制限なし）。パースは kegg_brite に共通化。
 
 取得した日本語名を graph-light.json の name_ja に反映する。
 """
 
 import json, re, os
-import urllib.request
+
+from kegg_brite import clean_name, load_brite
 
 BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 GRAPH_LIGHT = os.path.join(BASE, 'data', 'graph', 'graph-light.json')
@@ -17,25 +18,11 @@ ALL_DRUGS = os.path.join(BASE, 'data', 'all_drugs_detail.json')
 
 def fetch_kegg_ja_names():
     """KEGG BRITE jp08301 から KEGG_ID → 日本語名 マッピングを取得"""
-    url = "https://rest.kegg.jp/get/br:jp08301"
-    print(f"Fetching {url} ...")
-    req = urllib.request.Request(url)
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        text = resp.read().decode('utf-8')
-
-    # Parse: lines like "E        D00714  チオペンタールナトリウム (JP18)"
-    ja_names = {}
-    for line in text.split('\n'):
-        m = re.match(r'^E\s+(D\d{5})\s+(.+)$', line)
-        if m:
-            kegg_id = m.group(1)
-            name_raw = m.group(2).strip()
-            # Remove (JP18), (JAN), (USAN) etc. suffixes
-            name_clean = re.sub(r'\s*\((?:JP\d+|JAN|USAN|INN|USP|JAN/USAN|JAN/INN)\)\s*$', '', name_raw).strip()
-            # Remove trailing semicolons
-            name_clean = name_clean.rstrip(';').strip()
-            if kegg_id not in ja_names:
-                ja_names[kegg_id] = name_clean
+    print("Fetching br:jp08301 ...")
+    brite = load_brite("jp08301")
+
+    # E 階層の "D00714  チオペンタールナトリウム (JP18)" → 注記を除いた名前
+    ja_names = {kegg_id: clean_name(brite.name(kegg_id)) for kegg_id in brite.entries}
 
     print(f"  Fetched {len(ja_names)} Japanese drug names")
     return ja_names
@@ -43,25 +30,14 @@ def fetch_kegg_ja_names():
 
 def fetch_kegg_ja_product_names():
     """KEGG BRITE jp08311 (日本薬局方) からも取得"""
-    url = "https://rest.kegg.jp/get/br:jp08311"
-    print(f"Fetching {url} ...")
+    print("Fetching br:jp08311 ...")
     try:
-        req = urllib.request.Request(url)
-        with urllib.request.urlopen(req, timeout=30) as resp:
-            text = resp.read().decode('utf-8')
+        brite = load_brite("jp08311")
     except Exception as e:
         print(f"  Failed: {e}")
         return {}
 
-    ja_names = {}
-    for line in text.split('\n'):
-        m = re.match(r'^B\s+(D\d{5})\s+(.+)$', line)
-        if m:
-            kegg_id = m.group(1)
-            name_raw = m.group(2).strip()
-            name_clean = re.sub(r'\s*\((?:JP\d+|JAN|USAN|INN|USP)\)\s*$', '', name_raw).strip()
-            if kegg_id not in ja_names:
-                ja_names[kegg_id] = name_clean
+    ja_names = {kegg_id: clean_name(brite.name(kegg_id)) for kegg_id in brite.entries}
 
     print(f"  Fetched {len(ja_names)} names from JP pharmacopoeia")
     return ja_names
@@ -11,12 +11,12 @@ graph-light.json の各薬ノードに、SSK薬価マスターから抽出した
 冪等: 何度実行しても同じ結果
 """
 
-import csv, re, json, os, zipfile, urllib.request
+import re, json, os
+
+from ssk_master import download_ssk_master, load_ssk_columns
 
 BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 GRAPH_LIGHT = os.path.join(BASE, 'data', 'graph', 'graph-light.json')
-SSK_ZIP_URL = "https://www.ssk.or.jp/seikyushiharai/tensuhyo/kihonmasta/r06/kihonmasta_04.files/y_ALL20260219.zip"
-SSK_CACHE = os.path.join(BASE, 'data', 'ssk_yakka_master.csv')
 
 DOSAGE_FORMS = [
     'ドライシロップ', 'シロップ', 'カプセル', 'ローション',
@@ -27,26 +27,7 @@ DOSAGE_FORMS = [
     'ゲル', '粉末',
 ]
 
-
-def download_ssk_master():
-    """SSK薬価マスターをダウンロード（キャッシュ使用）"""
-    if os.path.exists(SSK_CACHE):
-        print(f"Using cached SSK master: {SSK_CACHE}")
-        return SSK_CACHE
-
-    print(f"Downloading SSK master from {SSK_ZIP_URL} ...")
-    zip_path = SSK_CACHE + '.zip'
-    urllib.request.urlretrieve(SSK_ZIP_URL, zip_path)
-
-    with zipfile.ZipFile(zip_path, 'r') as zf:
-        names = zf.namelist()
-        csv_name = [n for n in names if n.endswith('.csv')][0]
-        with zf.open(csv_name) as src, open(SSK_CACHE, 'wb') as dst:
-            dst.write(src.read())
-
-    os.remove(zip_path)
-    print(f"Saved to {SSK_CACHE}")
-    return SSK_CACHE
+SSK_CACHE_VERSION = 1  # ssk_brand_row の処理を変えたら上げる（列キャッシュの作り直し）
 
 
 def extract_base_name(full_name):
@@ -72,37 +53,31 @@ def extract_ingredient_name(generic_str):
     return extract_base_name(name)
 
 
-def parse_ssk_master(csv_path):
-    """SSKマスターCSVから 一般名→商品名 マッピングを構築"""
-    with open(csv_path, encoding='shift_jis', errors='replace') as f:
-        rows = list(csv.reader(f))
-
-    # Col4=商品名, Col37=【般】一般名
-    ingredient_brands = {}
-
-    for r in rows:
-        if len(r) < 38:
-            continue
-        brand_full = r[4].strip()
-        generic_raw = r[37].strip()
+def ssk_brand_row(r):
+    """SSK 1行 → (成分名, 商品名の基本名)。【般】の無い行・短すぎる名前は None"""
+    if not r.generic.startswith('【般】'):
+        return None
 
-        if not generic_raw.startswith('【般】'):
-            continue
+    ingredient = extract_ingredient_name(r.generic)
+    if len(ingredient) < 2:
+        return None
 
-        ingredient = extract_ingredient_name(generic_raw)
-        if len(ingredient) < 2:
-            continue
+    brand_base = extract_base_name(r.brand)
+    if len(brand_base) < 2:
+        return None
+    return ingredient, brand_base
 
-        brand_base = extract_base_name(brand_full)
-        if len(brand_base) < 2:
-            continue
-
-        if ingredient not in ingredient_brands:
-            ingredient_brands[ingredient] = set()
 
+def parse_ssk_master(ssk_path):
+    """SSKマスターから 一般名→商品名 マッピングを構築（正規化済みの行はキャッシュから読む）"""
+    table = load_ssk_columns('brands_11', ('ingredient', 'brand'), ssk_brand_row,
+                             SSK_CACHE_VERSION, ssk_path)
+    ingredient_brands = {}
+    for ingredient, brand_base in zip(table['ingredient'], table['brand']):
+        brands = ingredient_brands.setdefault(ingredient, set())
         # Only add if different from ingredient name
         if brand_base != ingredient and not brand_base.startswith(ingredient):
-            ingredient_brands[ingredient].add(brand_base)
+            brands.add(brand_base)
 
     return ingredient_brands
 
@@ -163,10 +138,10 @@ def match_and_patch(ingredient_brands):
 
 def main():
     # 1. Download SSK master
-    csv_path = download_ssk_master()
+    ssk_path = download_ssk_master()
 
     # 2. Parse
-    ingredient_brands = parse_ssk_master(csv_path)
+    ingredient_brands = parse_ssk_master(ssk_path)
     total_brands = sum(len(v) for v in ingredient_brands.values())
     print(f"SSK: {len(ingredient_brands)} ingredients, {total_brands} unique brand names")
 
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+checkpoint_journal.py
+長時間フェッチ用の追記型 JSONL チェックポイント。
+
+1件取得するごとに1行 {"k": キー, "v": レコード} を追記するだけなので、
+チェックポイントのコストは件数によらず一定（全体 JSON の再書き込み不要）。
+
+- fsync_every 件ごとに fsync（クラッシュ時に失うのは最大その件数）
+- 再開時は最後の完全な行までを読み込み、途中で切れた末尾行は切り捨てて追記を続ける
+- 最後に compact() で最終 JSON を一度だけ書き出し、ジャーナルを空にする
+
+使い方:
+    with Journal(DATA_DIR / "xxx.jsonl") as journal:
+        done = journal.replay()           # {キー: レコード}
+        journal.append(key, record)
+    journal.compact(DATA_DIR / "xxx.json", list(done.values()))
+"""
+
+import json
+import os
+from pathlib import Path
+
+DEFAULT_FSYNC_EVERY = 50
+
+
+def write_json_atomic(path: Path, data, indent: int | None = 2):
+    """一時ファイルに書いてから置き換え（途中で落ちても元ファイルは壊れない）"""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class Journal:
+    """追記型 JSONL ジャーナル"""
+
+    def __init__(self, path: Path, fsync_every: int = DEFAULT_FSYNC_EVERY):
+        self.path = Path(path)
+        self.fsync_every = fsync_every
+        self.offset = 0
+        self._pending = 0
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def replay(self) -> dict:
+        """ジャーナルを先頭から読み {キー: レコード} を返す（同一キーは後勝ち）"""
+        records = {}
+        self.offset = 0
+        if not self.path.exists():
+            return records
+
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # 書き込み途中で切れた末尾行
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    break
+                records[item["k"]] = item["v"]
+                self.offset += len(line)
+        return records
+
+    def _open(self):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self.path.exists() and self.path.stat().st_size != self.offset:
+                # 壊れた末尾を捨てて最後の完全な行の直後から再開
+                if self.offset == 0:
+                    self.replay()
+                with open(self.path, "r+b") as f:
+                    f.truncate(self.offset)
+            self._file = open(self.path, "ab")
+        return self._file
+
+    def append(self, key, value):
+        """1件追記。fsync_every 件ごとにディスクへ同期"""
+        f = self._open()
+        line = json.dumps({"k": key, "v": value}, ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8") + b"\n"
+        f.write(line)
+        self.offset += len(line)
+        self._pending += 1
+        if self._pending >= self.fsync_every:
+            self.sync()
+
+    def sync(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def compact(self, output: Path, data, indent: int | None = 2):
+        """最終 JSON を書き出してジャーナルを空にする"""
+        self.close()
+        write_json_atomic(output, data, indent=indent)
+        if self.path.exists():
+            self.path.unlink()
+        self.offset = 0
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+fetch_engine.py
+KEGG REST 等を並行取得するための共有 asyncio フェッチエンジン。
+
+- ホストごとのトークンバケットでレート制限（例: rest.kegg.jp = 3 req/s）
+- レート上限までリクエストを重ねて発行（1件ずつ sleep + GET しない）
+- requests.Session の接続プールで keep-alive 接続を再利用
+- 429 / 5xx / 接続エラーは指数バックオフでリトライ
+- 同時実行数は固定上限、または AimdLimiter で応答状況に応じて自動調整
+- 応答は http_cache の SQLite キャッシュを経由（KUSURI_OFFLINE=1 で再生のみ）
+- fetch_parsed は本文を読みながらワーカースレッドでパース（大きな応答を文字列にしない）
+- レート制限・同時実行数・バックオフの待ち時間とリトライを fetch_telemetry に記録
+
+使い方:
+    async with AsyncFetcher(rates={"rest.kegg.jp": 3.0}) as fetcher:
+        text = await fetcher.get_text("https://rest.kegg.jp/get/D00109")
+
+    async for item, result in ordered_map(fn, items):
+        ...  # 並行実行しつつ入力順に結果を受け取る
+"""
+
+import asyncio
+import functools
+import itertools
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from fetch_telemetry import TELEMETRY
+from http_cache import CachedSession, OfflineCacheMiss
+
+DEFAULT_RATE = 2.0         # req/s（rates に無いホスト）
+DEFAULT_CONCURRENCY = 8    # 同時接続数の上限
+DEFAULT_TIMEOUT = 15
+DEFAULT_RETRIES = 3
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """asyncio 用トークンバケット（rate 個/秒, 最大 burst 個まで貯まる）"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> float:
+        """トークンを1つ取得。待機した秒数を返す"""
+        async with self._lock:
+            waited = 0.0
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+                await asyncio.sleep(wait)
+                waited += wait
+
+
+class FixedLimiter:
+    """同時実行数の固定上限"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = None
+
+    async def acquire(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        await self._semaphore.acquire()
+
+    def release(self, ok: bool | None, latency: float):
+        self._semaphore.release()
+
+
+class AimdLimiter:
+    """AIMD（加算増加・乗算減少）で同時実行数を調整する
+
+    - 成功応答ごとに limit += increase / limit（1ラウンドトリップで約 +increase）
+    - 429 / 5xx / 接続エラー、またはレイテンシ移動平均が最小値の
+      latency_factor 倍を超えたら limit *= decrease
+    - 減少は直近の減少から平均レイテンシ分の時間が経つまで1回だけ
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32,
+                 increase: float = 1.0, decrease: float = 0.5,
+                 latency_factor: float = 3.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_factor = latency_factor
+        self.in_flight = 0
+        self.avg_latency = None
+        self.min_latency = None
+        self.last_decrease = 0.0
+        self._cond = None
+        self._notify_tasks = set()  # 通知タスクが実行前に GC されないよう参照を持つ
+
+    async def acquire(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    def release(self, ok: bool | None, latency: float):
+        """枠を1つ返す。ok が None（取り消し等）なら limit は変えない"""
+        self.in_flight -= 1
+        if ok is None:
+            self._wake()
+            return
+
+        congested = not ok
+        if ok:
+            self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+            self.avg_latency = latency if self.avg_latency is None else \
+                0.8 * self.avg_latency + 0.2 * latency
+            congested = self.avg_latency > self.min_latency * self.latency_factor
+
+        now = time.monotonic()
+        if congested:
+            if now - self.last_decrease > (self.avg_latency or 1.0):
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self.last_decrease = now
+        else:
+            self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+        self._wake()
+
+    def _wake(self):
+        task = asyncio.get_running_loop().create_task(self._notify())
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+
+    async def _notify(self):
+        async with self._cond:
+            self._cond.notify_all()
+
+
+class AsyncFetcher:
+    """ホスト別レート制限付きの並行 HTTP クライアント
+
+    実際の通信は CachedSession（接続プール付き）をスレッドで実行する。
+    """
+
+    def __init__(self, rates: dict = None, default_rate: float = DEFAULT_RATE,
+                 max_concurrency: int = DEFAULT_CONCURRENCY,
+                 timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 headers: dict = None, session: requests.Session = None,
+                 limiter=None):
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self.timeout = timeout
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self.limiter = limiter or FixedLimiter(max_concurrency)
+        self._buckets = {}
+
+        if session is None:
+            session = CachedSession()
+        pool_size = max(max_concurrency, getattr(self.limiter, "maximum", 0))
+        self._executor = ThreadPoolExecutor(max_workers=pool_size)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if headers:
+            session.headers.update(headers)
+        self.session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def _bucket(self, host: str) -> TokenBucket:
+        if host not in self._buckets:
+            self._buckets[host] = TokenBucket(self.rates.get(host, self.default_rate))
+        return self._buckets[host]
+
+    async def fetch(self, url: str, method: str = "GET", **kwargs) -> requests.Response | None:
+        """1リクエストを発行。リトライ後も失敗なら None"""
+        kwargs.setdefault("timeout", self.timeout)
+        host = urlsplit(url).netloc
+        bucket = self._bucket(host)
+
+        # キャッシュで返せるものはレート制限の対象外
+        if isinstance(self.session, CachedSession):
+            cached = self.session.lookup(method, url, **kwargs)
+            if cached is not None:
+                return cached
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                TELEMETRY.retry(host)
+            TELEMETRY.slept(host, await bucket.acquire(), "rate_limit")
+            queued = time.monotonic()
+            await self.limiter.acquire()
+            start = time.monotonic()
+            TELEMETRY.slept(host, start - queued, "concurrency")
+            resp = None
+            ok = None  # 取り消し・オフラインのキャッシュ無しは混雑として扱わない
+            try:
+                resp = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, functools.partial(self.session.request, method, url, **kwargs))
+                ok = resp.status_code not in RETRY_STATUS
+            except OfflineCacheMiss:
+                return None
+            except requests.RequestException:
+                ok = False
+            finally:
+                self.limiter.release(ok, time.monotonic() - start)
+
+            if resp is not None and resp.status_code not in RETRY_STATUS:
+                return resp
+            if attempt == self.retries:
+                return resp
+
+            delay = 2 ** attempt
+            if resp is not None and resp.headers.get("Retry-After", "").isdigit():
+                delay = max(delay, int(resp.headers["Retry-After"]))
+            TELEMETRY.slept(host, delay, "backoff")
+            await asyncio.sleep(delay)
+        return None
+
+    async def get_text(self, url: str, **kwargs) -> str | None:
+        """GET して status 200 なら本文を返す（それ以外は None）"""
+        resp = await self.fetch(url, **kwargs)
+        if resp is None or resp.status_code != 200:
+            return None
+        return resp.text
+
+    async def fetch_parsed(self, url: str, parse, **kwargs):
+        """stream=True で GET し、status 200 なら parse(resp) の結果を返す（それ以外は None）
+
+        parse はワーカースレッドで実行するので、本文を読みながらパースしても
+        イベントループを止めない（本文全体を1つの文字列にしない）。
+        """
+        resp = await self.fetch(url, stream=True, **kwargs)
+        if resp is None:
+            return None
+        try:
+            if resp.status_code != 200:
+                return None
+            return await asyncio.get_running_loop().run_in_executor(None, parse, resp)
+        finally:
+            resp.close()
+
+
+async def ordered_map(fn, items, window: int = 64):
+    """items の各要素に非同期関数 fn を並行適用し、入力順に (item, result) を返す
+
+    先読みは最大 window 件。途中で break された場合は残りのタスクを取り消す。
+    """
+    it = iter(items)
+    pending = deque((item, asyncio.ensure_future(fn(item)))
+                    for item in itertools.islice(it, window))
+    try:
+        while pending:
+            item, task = pending.popleft()
+            result = await task
+            for nxt in itertools.islice(it, 1):
+                pending.append((nxt, asyncio.ensure_future(fn(nxt))))
+            yield item, result
+    finally:
+        for _, task in pending:
+            task.cancel()
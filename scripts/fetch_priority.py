@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+fetch_priority.py
+長時間の取得キューの優先順位付けと時間予算（05 / new_02 共通）。
+
+取得順を「グラフとして価値の高い順」に並べ替える:
+  1. 日本で販売されている薬（薬価収載成分と日本語名が一致するもの など）
+  2. 既知の DDI で相手の多い薬（前回取得分・ジャーナルから数える）
+  3. 残り（元の順序のまま）
+途中で止めても、その時点の出力で主要な薬の相互作用はそろっている。
+
+--time-budget で取得時間に上限を付けられる。上限に達したら新しい取得を止め、
+それまでの分を書き出して終了する（再実行するとジャーナルから続きを取得）。
+  --time-budget 20m / 1200s / 1.5h（単位なしは分）
+"""
+
+import json
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR.parent / "data"
+YAKKA_FILE = DATA_DIR / "yakka_ingredients.json"
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smh]?)\s*$")
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "": 60}
+
+
+def parse_duration(text: str) -> float:
+    """"20m" / "1200s" / "1.5h" / "30"（分）→ 秒"""
+    m = _DURATION.match(text.lower())
+    if not m:
+        raise ValueError(f"時間の形式が不正です: {text!r}（例: 20m, 1200s, 1.5h）")
+    return float(m.group(1)) * _UNIT_SECONDS[m.group(2)]
+
+
+class TimeBudget:
+    """取得時間の上限（seconds=None なら無制限）"""
+
+    def __init__(self, seconds: float | None = None):
+        self.seconds = seconds
+        self.started = time.monotonic()
+        self._announced = False
+
+    @classmethod
+    def from_argv(cls) -> "TimeBudget":
+        """--time-budget オプションから作る"""
+        if "--time-budget" in sys.argv:
+            return cls(parse_duration(sys.argv[sys.argv.index("--time-budget") + 1]))
+        return cls()
+
+    @property
+    def remaining(self) -> float:
+        if self.seconds is None:
+            return float("inf")
+        return max(0.0, self.seconds - (time.monotonic() - self.started))
+
+    @property
+    def expired(self) -> bool:
+        if self.remaining > 0:
+            return False
+        if not self._announced:
+            self._announced = True
+            print(f"\n時間予算（{self.seconds:.0f}秒）に達したため取得を中断します。"
+                  f"再実行すると続きから取得します。")
+        return True
+
+
+def load_yakka_names(normalize=lambda s: s) -> set[str]:
+    """薬価収載成分の日本語名（new_01 の出力, normalize 適用後）。無ければ空集合"""
+    if not YAKKA_FILE.exists():
+        return set()
+    with open(YAKKA_FILE, encoding="utf-8") as f:
+        ingredients = json.load(f).get("ingredients", [])
+    names = set()
+    for ing in ingredients:
+        for key in ("name_ja", "original_name"):
+            if ing.get(key):
+                names.add(normalize(ing[key]))
+    return names
+
+
+def partner_degree(pairs) -> Counter:
+    """(a, b) ペアの列から、ID ごとの相互作用相手の数"""
+    degree = Counter()
+    for a, b in pairs:
+        if a and b and a != b:
+            degree[a] += 1
+            degree[b] += 1
+    return degree
+
+
+def priority_order(items: list, key, preferred: set, degree: Counter) -> list:
+    """items を（preferred に含まれる → 相手の多い順 → 元の順）に並べ替える"""
+    return sorted(items, key=lambda item: (key(item) not in preferred, -degree[key(item)]))
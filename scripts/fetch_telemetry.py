@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+fetch_telemetry.py
+HTTP フェッチの計測（全スクリプト共通）。
+
+CachedSession と fetch_engine から自動で記録される:
+  - リクエストごとのレイテンシ・ステータス・受信バイト数（ホスト別）
+    stream=True の応答はレイテンシ = ヘッダ受信までの時間とし、本文の受信時間は
+    読み取りにかかった時間だけを body_time として別に数える（読みながらのパース時間は含めない）
+  - キャッシュヒット数
+  - リトライ回数、レート制限・同時実行数待ち・バックオフで待った時間
+
+プロセス終了時にホスト別 p50/p95/p99 を表示し、JSON サマリーを
+data/telemetry/<スクリプト名>.json に書き出す（何も通信しなければ何もしない）。
+「サーバーが遅いのか / こちらの待ちか / パース等の処理か」は
+wall_time と network_time・sleep の比較で判断する。
+
+環境変数:
+  KUSURI_TELEMETRY=0     計測しない
+  KUSURI_TELEMETRY=PATH  JSON サマリーの出力先
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR.parent / "data"
+TELEMETRY_DIR = DATA_DIR / "telemetry"
+
+SETTING = os.environ.get("KUSURI_TELEMETRY", "")
+ENABLED = SETTING != "0"
+
+# レイテンシ分布のバケット上限（ミリ秒）
+HISTOGRAM_BOUNDS_MS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """ソート済みリストの q パーセンタイル（線形補間）"""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class HostStats:
+    def __init__(self):
+        self.latencies = []          # 秒（通信したものだけ）
+        self.statuses = Counter()
+        self.bytes = 0
+        self.body_time = 0.0         # stream=True の本文受信時間（秒）
+        self.cache_hits = 0
+        self.retries = 0
+        self.sleep = Counter()       # 種類 → 秒
+
+    def summary(self) -> dict:
+        lat = sorted(self.latencies)
+        histogram = Counter()
+        for value in lat:
+            ms = value * 1000
+            bound = next((b for b in HISTOGRAM_BOUNDS_MS if ms <= b), None)
+            histogram[f"<={bound}ms" if bound else f">{HISTOGRAM_BOUNDS_MS[-1]}ms"] += 1
+        return {
+            "requests": len(lat),
+            "cache_hits": self.cache_hits,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items(), key=str)},
+            "bytes": self.bytes,
+            "retries": self.retries,
+            "latency_ms": {
+                "p50": round(percentile(lat, 50) * 1000, 1),
+                "p95": round(percentile(lat, 95) * 1000, 1),
+                "p99": round(percentile(lat, 99) * 1000, 1),
+                "max": round(lat[-1] * 1000, 1) if lat else 0.0,
+                "mean": round(sum(lat) / len(lat) * 1000, 1) if lat else 0.0,
+            },
+            "latency_histogram": dict(histogram),
+            "network_time_s": round(sum(lat), 3),
+            "body_time_s": round(self.body_time, 3),
+            "sleep_s": {k: round(v, 3) for k, v in self.sleep.items()},
+        }
+
+
+class Telemetry:
+    """プロセス全体の計測値（スレッドセーフ）"""
+
+    def __init__(self):
+        self.hosts = defaultdict(HostStats)
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._registered = False
+
+    def _touch(self):
+        if not self._registered:
+            self._registered = True
+            atexit.register(self.finish)
+
+    def request(self, host: str, status, latency: float, nbytes: int = 0):
+        """通信したリクエスト1件（status は例外時 "error"）"""
+        if not ENABLED:
+            return
+        with self._lock:
+            self._touch()
+            stats = self.hosts[host]
+            stats.latencies.append(latency)
+            stats.statuses[status] += 1
+            stats.bytes += nbytes
+
+    def body(self, host: str, seconds: float, nbytes: int):
+        """stream=True の本文1件（読み取りにかかった時間と受信バイト数）"""
+        if not ENABLED:
+            return
+        with self._lock:
+            self._touch()
+            stats = self.hosts[host]
+            stats.body_time += seconds
+            stats.bytes += nbytes
+
+    def cache_hit(self, host: str):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._touch()
+            self.hosts[host].cache_hits += 1
+
+    def retry(self, host: str):
+        if not ENABLED:
+            return
+        with self._lock:
+            self.hosts[host].retries += 1
+
+    def slept(self, host: str, seconds: float, kind: str = "rate_limit"):
+        """待った時間（kind: rate_limit / concurrency / backoff）"""
+        if not ENABLED or seconds <= 0:
+            return
+        with self._lock:
+            self._touch()
+            self.hosts[host].sleep[kind] += seconds
+
+    def summary(self) -> dict:
+        with self._lock:
+            hosts = {host: stats.summary() for host, stats in sorted(self.hosts.items())}
+        return {
+            "script": Path(sys.argv[0]).name,
+            "argv": sys.argv[1:],
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "wall_time_s": round(time.time() - self.started, 3),
+            "hosts": hosts,
+        }
+
+    def report(self, summary: dict):
+        print(f"\n=== Fetch telemetry ({summary['wall_time_s']:.1f}s wall) ===")
+        for host, s in summary["hosts"].items():
+            lat = s["latency_ms"]
+            sleep = ", ".join(f"{k} {v:.1f}s" for k, v in s["sleep_s"].items()) or "-"
+            print(f"  {host}: {s['requests']} req (+{s['cache_hits']} cached), "
+                  f"{s['bytes'] / 1024:.0f} KB, retries {s['retries']}")
+            print(f"    latency p50/p95/p99 = {lat['p50']:.0f}/{lat['p95']:.0f}/{lat['p99']:.0f} ms, "
+                  f"network {s['network_time_s']:.1f}s, body {s['body_time_s']:.1f}s, sleep {sleep}")
+
+    def finish(self):
+        """終了時のサマリー表示と JSON 書き出し"""
+        summary = self.summary()
+        if not summary["hosts"]:
+            return
+        self.report(summary)
+        if SETTING and SETTING != "1":
+            path = Path(SETTING)
+        else:
+            path = TELEMETRY_DIR / f"{Path(sys.argv[0]).stem or 'python'}.json"
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+            print(f"  → {path}")
+        except OSError as e:
+            print(f"  telemetry 書き出し失敗: {e}")
+
+
+TELEMETRY = Telemetry()
+
+
+def throttle_sleep(host: str, seconds: float):
+    """固定間隔の待ち（time.sleep の代わり。待ち時間を rate_limit として記録）"""
+    time.sleep(seconds)
+    TELEMETRY.slept(host, seconds, "rate_limit")
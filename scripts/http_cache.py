@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+http_cache.py
+全フェッチャー共通の HTTP レスポンスキャッシュ（SQLite）。
+
+- キー: sha256(メソッド + URL(クエリ込み) + リクエストボディ)
+- 本文は zlib 圧縮し、内容の sha256 をキーに blobs テーブルへ格納（同一内容は1つだけ保存）
+- 保存後 KUSURI_CACHE_TTL 秒（既定1日）は再取得しない
+- それ以降は ETag / Last-Modified があれば条件付きリクエスト（304 ならキャッシュを再利用）
+- stream=True の要求も対応（読み進めながら圧縮して保存 / キャッシュからは逐次展開）
+
+環境変数:
+  KUSURI_OFFLINE=1     ネットワークを使わずキャッシュのみで再生（未キャッシュは OfflineCacheMiss）
+  KUSURI_NO_CACHE=1    キャッシュを使わない
+  KUSURI_CACHE_TTL=秒  再検証なしで使う期間
+  KUSURI_MOCK_URL=URL  全リクエストを mock_server.py へ向ける
+                       （https://rest.kegg.jp/get/x → URL/rest.kegg.jp/get/x）
+
+使い方:
+    SESSION = CachedSession()           # requests.Session の代わり
+    data = fetch_bytes(url)             # urllib.request.urlopen(url).read() の代わり
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from fetch_telemetry import TELEMETRY
+
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR.parent / "data"
+CACHE_DB = DATA_DIR / "cache" / "http_cache.sqlite"
+
+OFFLINE = os.environ.get("KUSURI_OFFLINE") == "1"
+DISABLED = os.environ.get("KUSURI_NO_CACHE") == "1"
+DEFAULT_TTL = float(os.environ.get("KUSURI_CACHE_TTL", 24 * 3600))
+MOCK_URL = os.environ.get("KUSURI_MOCK_URL", "").rstrip("/")
+
+USER_AGENT = "kusuri-research/1.0"
+
+# 本文はデコード済みで保存するので、転送系ヘッダーは保存しない
+SKIP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    body_hash TEXT NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    body BLOB NOT NULL
+);
+"""
+
+
+class OfflineCacheMiss(requests.ConnectionError):
+    """オフライン再生中にキャッシュに無いリクエストが来た"""
+
+
+def route_url(url: str) -> str:
+    """KUSURI_MOCK_URL 指定時は https://host/path を MOCK_URL/host/path に置き換える"""
+    if MOCK_URL and url.startswith("https://"):
+        return f"{MOCK_URL}/{url[len('https://'):]}"
+    return url
+
+
+def cache_key(method: str, url: str, body=None) -> str:
+    """メソッド + URL + ボディから キャッシュキーを生成"""
+    h = hashlib.sha256()
+    h.update(method.upper().encode())
+    h.update(b"\0")
+    h.update(url.encode())
+    h.update(b"\0")
+    if body:
+        h.update(body if isinstance(body, bytes) else str(body).encode())
+    return h.hexdigest()
+
+
+class ResponseCache:
+    """SQLite ベースのレスポンスキャッシュ（スレッドごとに接続を持つ）"""
+
+    def __init__(self, path: Path = CACHE_DB, ttl: float = DEFAULT_TTL):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> dict | None:
+        row = self._conn().execute(
+            "SELECT r.url, r.status, r.headers, r.etag, r.last_modified, "
+            "r.fetched_at, b.body FROM responses r JOIN blobs b ON b.hash = r.body_hash "
+            "WHERE r.key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, etag, last_modified, fetched_at, body = row
+        return {
+            "url": url,
+            "status": status,
+            "headers": json.loads(headers),
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": fetched_at,
+            "zbody": body,
+        }
+
+    def put(self, key: str, url: str, status: int, headers: dict, body: bytes):
+        self.put_compressed(key, url, status, headers, zlib.compress(body, 6),
+                            hashlib.sha256(body).hexdigest())
+
+    def put_compressed(self, key: str, url: str, status: int, headers: dict,
+                       zbody: bytes, body_hash: str):
+        """圧縮済み本文と元本文の sha256 で保存"""
+        headers = {k: v for k, v in headers.items() if k.lower() not in SKIP_HEADERS}
+        validators = CaseInsensitiveDict(headers)
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO blobs (hash, body) VALUES (?, ?)",
+                (body_hash, zbody),
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, url, status, headers, etag, last_modified, body_hash, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, status, json.dumps(headers), validators.get("ETag"),
+                 validators.get("Last-Modified"), body_hash, time.time()),
+            )
+
+    def touch(self, key: str):
+        """304 で再検証できたエントリの取得時刻を更新"""
+        with self._conn() as conn:
+            conn.execute("UPDATE responses SET fetched_at = ? WHERE key = ?",
+                         (time.time(), key))
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def prune(self):
+        """どのレスポンスからも参照されない本文を削除"""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM blobs WHERE hash NOT IN "
+                         "(SELECT body_hash FROM responses)")
+
+
+class _InflateReader:
+    """圧縮済み本文を read() のたびに少しずつ展開する（stream=True のキャッシュ応答用）"""
+
+    CHUNK = 1 << 16
+
+    def __init__(self, zbody: bytes):
+        self._src = memoryview(zbody)
+        self._pos = 0
+        self._z = zlib.decompressobj()
+        self._buf = b""
+
+    def read(self, amt: int = None, **kwargs) -> bytes:
+        while (amt is None or len(self._buf) < amt) and self._pos < len(self._src):
+            piece = self._src[self._pos:self._pos + self.CHUNK]
+            self._pos += self.CHUNK
+            self._buf += self._z.decompress(piece)
+            if self._pos >= len(self._src):
+                self._buf += self._z.flush()
+        if amt is None:
+            amt = len(self._buf)
+        out, self._buf = self._buf[:amt], self._buf[amt:]
+        return out
+
+    def close(self):
+        self._buf = b""
+
+
+class _TeeRaw:
+    """ストリーミング本文を読みながら圧縮し、読み終えたらキャッシュへ保存する
+
+    保持するのは圧縮済みデータのみ。途中で読むのをやめた場合は保存しない。
+    """
+
+    def __init__(self, raw, on_complete):
+        self._raw = raw
+        self._on_complete = on_complete
+        self._z = zlib.compressobj(6)
+        self._hash = hashlib.sha256()
+        self._parts = []
+        self._done = False
+
+    def _feed(self, chunk: bytes):
+        self._hash.update(chunk)
+        self._parts.append(self._z.compress(chunk))
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self._parts.append(self._z.flush())
+            self._on_complete(b"".join(self._parts), self._hash.hexdigest())
+            self._parts = []
+
+    def stream(self, amt: int = 1 << 16, decode_content: bool = None):
+        for chunk in self._raw.stream(amt, decode_content=decode_content):
+            self._feed(chunk)
+            yield chunk
+        self._finish()
+
+    def read(self, amt: int = None, **kwargs) -> bytes:
+        data = self._raw.read(amt, **kwargs)
+        if data:
+            self._feed(data)
+        if not data or amt is None:
+            self._finish()
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class _MeteredRaw:
+    """ストリーミング本文の受信バイト数と読み取り時間を数え、読み終えた・閉じた時点で
+    on_done(バイト数, 秒) を呼ぶ
+
+    chunked / 圧縮の応答は Content-Length が無い（or 展開後と違う）ので、実際に読んだ量を数える。
+    時間は raw からの読み取り中だけを足す（読む側のパース時間は含めない）。
+    """
+
+    def __init__(self, raw, on_done):
+        self._raw = raw
+        self._on_done = on_done
+        self._nbytes = 0
+        self._seconds = 0.0
+        self._done = False
+
+    def _finish(self):
+        if not self._done:
+            self._done = True
+            self._on_done(self._nbytes, self._seconds)
+
+    def stream(self, amt: int = 1 << 16, decode_content: bool = None):
+        chunks = self._raw.stream(amt, decode_content=decode_content)
+        try:
+            while True:
+                start = time.monotonic()
+                chunk = next(chunks, None)
+                self._seconds += time.monotonic() - start
+                if chunk is None:
+                    break
+                self._nbytes += len(chunk)
+                yield chunk
+        finally:
+            self._finish()
+
+    def read(self, amt: int = None, **kwargs) -> bytes:
+        start = time.monotonic()
+        data = self._raw.read(amt, **kwargs)
+        self._seconds += time.monotonic() - start
+        self._nbytes += len(data)
+        if not data or amt is None:
+            self._finish()
+        return data
+
+    def close(self):
+        self._finish()
+        self._raw.close()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+def _to_response(entry: dict, prep: requests.PreparedRequest,
+                 stream: bool = False) -> requests.Response:
+    """キャッシュエントリを requests.Response に復元"""
+    resp = requests.Response()
+    resp.status_code = entry["status"]
+    resp.reason = "OK"
+    resp.headers = CaseInsensitiveDict(entry["headers"])
+    resp.encoding = get_encoding_from_headers(resp.headers)
+    resp.url = prep.url
+    resp.request = prep
+    if stream:
+        resp.raw = _InflateReader(entry["zbody"])
+    else:
+        resp._content = zlib.decompress(entry["zbody"])
+        resp._content_consumed = True
+    resp.from_cache = True
+    return resp
+
+
+class CachedSession(requests.Session):
+    """ResponseCache を通す requests.Session
+
+    GET/POST の 200 応答をキャッシュする。
+    """
+
+    def __init__(self, cache: ResponseCache = None, offline: bool = OFFLINE):
+        super().__init__()
+        self.headers["User-Agent"] = USER_AGENT
+        self.offline = offline
+        self.cache = None if DISABLED else (cache or _default_cache())
+
+    def _cacheable(self, method: str, kwargs: dict) -> bool:
+        return self.cache is not None and method in ("GET", "POST")
+
+    def _prepare(self, method: str, url: str, kwargs: dict) -> requests.PreparedRequest:
+        return self.prepare_request(requests.Request(
+            method=method, url=url,
+            headers=kwargs.get("headers"), params=kwargs.get("params"),
+            data=kwargs.get("data"), json=kwargs.get("json"),
+        ))
+
+    def lookup(self, method: str, url: str, **kwargs) -> requests.Response | None:
+        """通信せずに返せる（新鮮 or オフライン）キャッシュ応答があれば返す"""
+        method = method.upper()
+        if not self._cacheable(method, kwargs):
+            return None
+        prep = self._prepare(method, route_url(url), kwargs)
+        entry = self.cache.get(cache_key(method, prep.url, prep.body))
+        if entry and (self.offline or self.cache.is_fresh(entry)):
+            TELEMETRY.cache_hit(urlsplit(url).netloc)
+            return _to_response(entry, prep, stream=bool(kwargs.get("stream")))
+        return None
+
+    def _send(self, host: str, method: str, url: str, **kwargs) -> requests.Response:
+        """実際に通信し、レイテンシ・ステータス・バイト数を記録
+
+        stream=True はヘッダ受信までをレイテンシとして記録し、本文の受信時間・バイト数は
+        読み終えた（or 閉じた）時点で別に記録する。
+        """
+        start = time.monotonic()
+        try:
+            resp = super().request(method, url, **kwargs)
+        except requests.RequestException:
+            TELEMETRY.request(host, "error", time.monotonic() - start)
+            raise
+        if kwargs.get("stream"):
+            TELEMETRY.request(host, resp.status_code, time.monotonic() - start)
+            resp.raw = _MeteredRaw(resp.raw, lambda nbytes, seconds: TELEMETRY.body(host, seconds, nbytes))
+        else:
+            TELEMETRY.request(host, resp.status_code, time.monotonic() - start, len(resp.content))
+        return resp
+
+    def request(self, method, url, **kwargs):
+        method = method.upper()
+        host = urlsplit(url).netloc
+        url = route_url(url)
+        if not self._cacheable(method, kwargs):
+            return self._send(host, method, url, **kwargs)
+
+        prep = self._prepare(method, url, kwargs)
+        key = cache_key(method, prep.url, prep.body)
+        entry = self.cache.get(key)
+        stream = bool(kwargs.get("stream"))
+
+        if entry and (self.offline or self.cache.is_fresh(entry)):
+            TELEMETRY.cache_hit(host)
+            return _to_response(entry, prep, stream)
+        if self.offline:
+            raise OfflineCacheMiss(f"not in cache: {method} {prep.url}")
+
+        headers = dict(kwargs.pop("headers", None) or {})
+        if entry:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        resp = self._send(host, method, url, headers=headers, **kwargs)
+        if resp.status_code == 304 and entry:
+            # stream=True でも（空の）本文を読み切ってから閉じ、接続をプールへ返す
+            resp.content
+            resp.close()
+            self.cache.touch(key)
+            return _to_response(entry, prep, stream)
+        if resp.status_code == 200 and stream:
+            headers = dict(resp.headers)
+            resp.raw = _TeeRaw(resp.raw, lambda zbody, body_hash: self.cache.put_compressed(
+                key, prep.url, 200, headers, zbody, body_hash))
+        elif resp.status_code == 200:
+            self.cache.put(key, prep.url, resp.status_code, dict(resp.headers), resp.content)
+        resp.from_cache = False
+        return resp
+
+
+_CACHE = None
+_SESSION = None
+_LOCK = threading.Lock()
+
+
+def _default_cache() -> ResponseCache:
+    global _CACHE
+    with _LOCK:
+        if _CACHE is None:
+            _CACHE = ResponseCache()
+        return _CACHE
+
+
+def get_session() -> CachedSession:
+    """プロセス共通の CachedSession"""
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = CachedSession()
+    return _SESSION
+
+
+def fetch_bytes(url: str, headers: dict = None, timeout: float = 60) -> bytes:
+    """キャッシュ経由で GET し本文を返す（HTTP エラーは例外）"""
+    resp = get_session().get(url, headers=headers, timeout=timeout)
+    resp.raise_for_status()
+    return resp.content
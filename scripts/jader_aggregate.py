@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+jader_aggregate.py
+JADER（drug.csv × reac.csv）の症例IDでの結合と 薬→有害事象 の件数集計（03 / new_05 共通）。
+
+1. drug.csv・reac.csv をチャンクごとに category 型で読み、症例ID・一般名・有害事象名を
+   ファイル全体で共通の辞書で整数コードに置き換える（文字列の処理はユニーク値ごとに1回。
+   結果は jader_store の列形式キャッシュに保存し、同じリリースでは CSV を読み直さない）
+2. (症例, 薬) と (症例, 有害事象) をそれぞれ重複除去し、症例IDで整列
+   （一般名の正規化はユニークな名前ごとに1回行い、コードの付け替え表として重複除去の前に適用）
+3. 症例ごとの 薬 × 有害事象 を一定件数ずつのブロックで展開して数える
+   （全症例の直積をメモリに持たない）
+4. 2〜3 は症例コードの剰余で分けたパーティションごとにプロセスプールで並行実行し、
+   部分集計を合計する（--workers N, 既定は CPU 数）
+5. 部分集計は報告年度・四半期ごとに保存し（jader_snapshots）、新しいリリースでは
+   新しい四半期だけを集計して保存済みの四半期と足し合わせる
+
+件数はすべて「症例数」（同じ症例で同じ薬が複数行あっても1件）。
+既定では医薬品の関与が「被疑薬」の行だけを使う。
+シグナル指標（PRR / ROR / IC）と頻度ラベルは jader_signals で計算する。
+
+使い方:
+    counts = aggregate_jader(JADER_DIR, drug_key=jader_drug_key)
+    counts.drug_cases[counts.drug_index[jader_drug_key("ワルファリンカリウム")]]
+"""
+
+import os
+import re
+import sys
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+
+from jader_snapshots import CountSnapshots
+from jader_store import load_column, open_store
+from new_03_match_names import normalize_ja
+
+JOIN_BLOCK_PAIRS = 5_000_000   # 1ブロックで展開する (薬, 有害事象) の上限
+PARTITIONS_PER_WORKER = 4      # ワーカー1つあたりの症例パーティション数（負荷の偏りを均す）
+
+# JADER の一般名に付く括弧書き（「（遺伝子組換え）」など）と空白
+_NAME_NOISE = re.compile(r"\(.*?\)|\[.*?\]|\s")
+# normalize_ja の一覧に無い酸の塩（ベシル酸塩 など）
+_ACID_SALT = re.compile(r"(?<=.)(塩酸|硫酸|酢酸|リン酸|マレイン酸|フマル酸|コハク酸|酒石酸|クエン酸|"
+                        r"安息香酸|臭化水素酸|メシル酸|ベシル酸|トシル酸)塩$")
+
+
+def jader_drug_key(name: str) -> str:
+    """一般名 → 照合キー（NFKC・括弧書き/空白の除去・塩/水和物の除去）
+
+    JADER 側はユニークな一般名ごとに1回だけ呼ぶ。マスタ側の名前も同じ関数で引く。
+    """
+    name = _NAME_NOISE.sub("", unicodedata.normalize("NFKC", name))
+    return normalize_ja(_ACID_SALT.sub("", name))
+
+
+def remap_codes(names: list[str], key: Callable[[str], str]) -> tuple[np.ndarray, list[str]]:
+    """コード → 名前 の一覧に key を適用し、(旧コード → 新コード の表, 新コード → キー) を返す
+
+    同じキーになる名前は1つのコードにまとめる（キーが空なら -1）。
+    列全体の変換は表を引くだけなので、コストは行数ではなくユニーク値の数で決まる。
+    """
+    index = {}
+    lookup = np.full(len(names), -1, dtype=np.int32)
+    for code, name in enumerate(names):
+        k = key(name)
+        if k:
+            lookup[code] = index.setdefault(k, len(index))
+    return lookup, list(index)
+
+
+def unique_pairs(case_codes: np.ndarray, item_codes: np.ndarray, n_items: int) -> tuple[np.ndarray, np.ndarray]:
+    """(症例, 項目) を重複除去し、症例 → 項目 の順に整列して返す"""
+    keys = np.unique(case_codes.astype(np.int64) * max(n_items, 1) + item_codes)
+    return (keys // max(n_items, 1)).astype(np.int32), (keys % max(n_items, 1)).astype(np.int32)
+
+
+def _sum_by_key(keys: np.ndarray, counts: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    return uniq, np.bincount(inverse, weights=counts, minlength=len(uniq)).astype(np.int64)
+
+
+def count_cooccurrence(cd_case: np.ndarray, cd_drug: np.ndarray,
+                       ce_case: np.ndarray, ce_event: np.ndarray,
+                       n_events: int) -> tuple[np.ndarray, np.ndarray]:
+    """症例ごとの 薬 × 有害事象 を数え、(キー = 薬 * n_events + 有害事象, 症例数) を返す
+
+    cd_* / ce_* は unique_pairs で重複除去・症例順に整列済みであること。
+    """
+    starts = np.searchsorted(ce_case, cd_case, side="left")
+    lengths = np.searchsorted(ce_case, cd_case, side="right") - starts
+
+    keys_parts, count_parts = [], []
+    ends = np.cumsum(lengths)
+    block_start = 0
+    while block_start < len(cd_case):
+        # 展開後の件数が JOIN_BLOCK_PAIRS を超えない範囲（最低1行）
+        base = ends[block_start - 1] if block_start else 0
+        block_end = max(int(np.searchsorted(ends, base + JOIN_BLOCK_PAIRS, side="right")),
+                        block_start + 1)
+        lens = lengths[block_start:block_end]
+        total = int(lens.sum())
+        if total:
+            offsets = np.arange(total) - np.repeat(np.cumsum(lens) - lens, lens)
+            events = ce_event[np.repeat(starts[block_start:block_end], lens) + offsets]
+            drugs = np.repeat(cd_drug[block_start:block_end], lens)
+            keys, counts = np.unique(drugs.astype(np.int64) * n_events + events, return_counts=True)
+            keys_parts.append(keys)
+            count_parts.append(counts)
+        block_start = block_end
+
+    if not keys_parts:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    return _sum_by_key(np.concatenate(keys_parts), np.concatenate(count_parts))
+
+
+def count_cases(d_case: np.ndarray, d_drug: np.ndarray, r_case: np.ndarray, r_event: np.ndarray,
+                n_drugs: int, n_events: int) -> tuple:
+    """(症例, 薬)・(症例, 有害事象) の行から部分集計を作る
+
+    戻り値は (組み合わせキー, 症例数, 薬ごとの症例数, 有害事象ごとの症例数, 症例数)。
+    症例の集合が重ならない部分集計どうしは merge_partials で足し合わせられる。
+    """
+    cd_case, cd_drug = unique_pairs(d_case, d_drug, n_drugs)
+    ce_case, ce_event = unique_pairs(r_case, r_event, n_events)
+
+    # 薬と有害事象の両方がある症例だけを母数にする
+    both = np.intersect1d(cd_case, ce_case)
+    cd_keep = np.isin(cd_case, both)
+    ce_keep = np.isin(ce_case, both)
+    cd_case, cd_drug = cd_case[cd_keep], cd_drug[cd_keep]
+    ce_case, ce_event = ce_case[ce_keep], ce_event[ce_keep]
+
+    keys, counts = count_cooccurrence(cd_case, cd_drug, ce_case, ce_event, max(n_events, 1))
+    return (keys, counts,
+            np.bincount(cd_drug, minlength=n_drugs).astype(np.int64),
+            np.bincount(ce_event, minlength=n_events).astype(np.int64),
+            len(both))
+
+
+def merge_partials(partials: list[tuple]) -> tuple:
+    """count_cases の部分集計を合計（入力の順序・分け方によらず同じ結果）"""
+    keys, counts = _sum_by_key(np.concatenate([p[0] for p in partials]),
+                               np.concatenate([p[1] for p in partials]))
+    return (keys, counts,
+            np.sum([p[2] for p in partials], axis=0, dtype=np.int64),
+            np.sum([p[3] for p in partials], axis=0, dtype=np.int64),
+            sum(p[4] for p in partials))
+
+
+def _group_rows(row_periods: np.ndarray, periods: np.ndarray) -> list[np.ndarray]:
+    """四半期コードの配列を periods ごとの行番号に分ける"""
+    order = np.argsort(row_periods, kind="stable")
+    lo = np.searchsorted(row_periods[order], periods, side="left")
+    hi = np.searchsorted(row_periods[order], periods, side="right")
+    return [order[a:b] for a, b in zip(lo, hi)]
+
+
+def _count_partition(root: Path, suspect_only: bool, drug_map: np.ndarray | None,
+                     n_drugs: int, n_events: int, periods: np.ndarray,
+                     n_parts: int, part: int) -> list[tuple]:
+    """症例コード % n_parts == part の症例を四半期（periods）ごとに集計（ワーカープロセスで実行）
+
+    drug_map があれば薬コードを付け替えてから (症例, 薬) を重複除去する
+    （塩違いの一般名が同じ症例にあっても1件）。
+    """
+    case_period = load_column(root, "case_period")
+    d_case, d_drug = load_column(root, "drug_case"), load_column(root, "drug_name")
+    d_sel = d_case % n_parts == part
+    if suspect_only:
+        d_sel &= load_column(root, "drug_suspect")
+    d_case, d_drug = d_case[d_sel], d_drug[d_sel]
+    if drug_map is not None:
+        d_drug = drug_map[d_drug]
+        d_case, d_drug = d_case[d_drug >= 0], d_drug[d_drug >= 0]
+    r_case, r_event = load_column(root, "reac_case"), load_column(root, "reac_event")
+    r_sel = r_case % n_parts == part
+    r_case, r_event = r_case[r_sel], r_event[r_sel]
+
+    return [count_cases(d_case[d_rows], d_drug[d_rows], r_case[r_rows], r_event[r_rows], n_drugs, n_events)
+            for d_rows, r_rows in zip(_group_rows(case_period[d_case], periods),
+                                      _group_rows(case_period[r_case], periods))]
+
+
+class JaderCounts:
+    """薬 × 有害事象 の症例数（疎行列の COO 形式, 薬 → 有害事象コード順）と周辺度数"""
+
+    def __init__(self, drugs: list[str], events: list[str],
+                 pair_drug: np.ndarray, pair_event: np.ndarray, pair_count: np.ndarray,
+                 drug_cases: np.ndarray, event_cases: np.ndarray, n_cases: int):
+        self.drugs = drugs                # 薬コード → 一般名
+        self.events = events              # 有害事象コード → 名前
+        self.pair_drug = pair_drug        # 組み合わせごとの薬コード
+        self.pair_event = pair_event      # 組み合わせごとの有害事象コード
+        self.pair_count = pair_count      # 組み合わせごとの症例数
+        self.drug_cases = drug_cases      # 薬ごとの症例数
+        self.event_cases = event_cases    # 有害事象ごとの症例数
+        self.n_cases = n_cases            # 薬・有害事象の両方がある症例数
+        self.drug_index = {name: i for i, name in enumerate(drugs)}
+
+    @classmethod
+    def from_partial(cls, drugs: list[str], events: list[str], partial: tuple) -> "JaderCounts":
+        """count_cases / merge_partials の結果から作る"""
+        keys, counts, drug_cases, event_cases, n_cases = partial
+        n_events = max(len(events), 1)
+        return cls(drugs, events,
+                   (keys // n_events).astype(np.int32), (keys % n_events).astype(np.int32),
+                   counts, drug_cases, event_cases, n_cases)
+
+
+def default_workers() -> int:
+    """--workers N（省略時は CPU 数）"""
+    if "--workers" in sys.argv:
+        return int(sys.argv[sys.argv.index("--workers") + 1])
+    return os.cpu_count() or 1
+
+
+def aggregate_jader(jader_dir: Path, suspect_only: bool = True, workers: int = None,
+                    drug_key: Callable[[str], str] = None) -> JaderCounts | None:
+    """jader_dir の drug.csv・reac.csv を集計（ファイルが無ければ None）
+
+    CSV は jader_store の列形式キャッシュ経由で読む（2回目以降はパースしない）。
+    drug_key（例: jader_drug_key）を渡すと一般名をそのキーでまとめて数え、
+    counts.drugs / drug_index もキーになる。
+    集計は報告年度・四半期ごとに jader_snapshots に保存し、新しいリリースでは
+    新しい（行数・チェックサムが変わった）四半期だけを集計して足し合わせる。
+    症例コードの剰余で workers * PARTITIONS_PER_WORKER 個に分け、プロセスプールで
+    並行に集計して合計する。症例単位で分けるので結果はワーカー数によらない。
+    """
+    store = open_store(jader_dir)
+    if store is None:
+        return None
+
+    variant = ("suspect" if suspect_only else "all") + "-" + (drug_key.__name__ if drug_key else "raw")
+    snapshots = CountSnapshots(variant)
+    fingerprints = store.meta["periods"]
+    stale = snapshots.stale(fingerprints)
+    workers = workers or default_workers()
+
+    if stale:
+        print(f"  JADER集計: {len(stale)}/{len(fingerprints)} 四半期を集計（{workers} プロセス）")
+        drugs, drug_map = store.drugs, None
+        if drug_key is not None:
+            drug_map, drugs = remap_codes(store.drugs, drug_key)
+            print(f"  JADER一般名: {len(store.drugs)} → {len(drugs)}（正規化後）")
+
+        period_code = {period: i for i, period in enumerate(store.periods)}
+        periods = np.array([period_code[p] for p in stale], dtype=np.int32)
+        n_parts = 1 if workers == 1 else workers * PARTITIONS_PER_WORKER
+        args = (store.root, suspect_only, drug_map, len(drugs), len(store.events), periods, n_parts)
+        if n_parts == 1:
+            partials = [_count_partition(*args, 0)]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                partials = list(pool.map(_count_partition, *zip(*[(*args, part) for part in range(n_parts)])))
+
+        for i, period in enumerate(stale):
+            snapshots.save(period, fingerprints[period], drugs, store.events,
+                           merge_partials([p[i] for p in partials]))
+    snapshots.save_index(fingerprints)
+
+    drugs, events, merged = snapshots.merge(list(fingerprints))
+    counts = JaderCounts.from_partial(drugs, events, merged)
+    print(f"  JADER集計: {counts.n_cases} 症例, {len(counts.drugs)} 薬, "
+          f"{len(counts.events)} 有害事象, {len(counts.pair_count)} 組み合わせ"
+          + ("（被疑薬のみ）" if suspect_only else "") + f", {len(fingerprints)} 四半期")
+    return counts
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+jader_signals.py
+JADER の 薬 × 有害事象 の不均衡分析（シグナル検出）。03 / new_05 共通。
+
+jader_aggregate の症例数（COO 形式の疎行列と周辺度数）から全組み合わせの 2×2 分割表
+
+                 有害事象あり   なし
+    薬あり            a          b        a + b = 薬の症例数
+    薬なし            c          d        a + c = 有害事象の症例数
+                                          N = a + b + c + d
+
+を配列のまま作り、次の指標と 95% 信頼区間を NumPy のベクトル演算で一度に計算する
+（組み合わせごとの Python ループは無い）。
+  PRR   = (a / (a+b)) / (c / (c+d))      対数正規近似の CI、Yates 補正付き χ²
+  ROR   = (a d) / (b c)                  対数正規近似の CI
+  IC    = log2((a + 0.5) / (E + 0.5))     BCPNN（E = (a+b)(a+c) / N）、CI は Norén らの近似式
+0 のセルがある組み合わせは全セルに 0.5 を足して（Haldane 補正）PRR・ROR を計算する。
+
+頻度ラベルは3つの基準のうち満たした数で決める（フロントの FREQUENCY_LABELS と同じ値）:
+  PRR ≥ 2 かつ χ² ≥ 4（Evans の基準） / ROR の下限 > 1 / IC の下限 > 0
+  3つ → high, 2つ → medium, 1つ → low, 0 → rare（rare は副作用一覧に使わない）
+
+使い方:
+    signals = compute_signals(counts)
+    signals.top_events(counts.drug_index["ワルファリンカリウム"])
+"""
+
+import numpy as np
+
+from jader_aggregate import JaderCounts
+
+Z_95 = 1.959964        # 95% 信頼区間の z 値
+HALDANE = 0.5          # 0 のセルがあるときに全セルへ足す値
+PRR_MIN = 2.0          # Evans の基準
+CHI2_MIN = 4.0
+
+AE_TOP_N = 10          # 1薬あたりの有害事象数の上限
+AE_MIN_REPORTS = 3     # これ未満の症例数の組み合わせは使わない
+
+# 満たした基準の数 → 頻度ラベル
+SIGNAL_LABELS = np.array(["rare", "low", "medium", "high"])
+
+
+def contingency(counts: JaderCounts) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """全組み合わせの 2×2 分割表 (a, b, c, d)（float64 の配列）"""
+    a = counts.pair_count.astype(np.float64)
+    b = counts.drug_cases[counts.pair_drug] - a
+    c = counts.event_cases[counts.pair_event] - a
+    d = counts.n_cases - a - b - c
+    return a, b, c, d
+
+
+def _ic_interval(a: np.ndarray, expected: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """BCPNN IC とその 95% 信頼区間（Norén et al. 2013 の閉形式近似）"""
+    a_s = a + 0.5
+    ic = np.log2(a_s / (expected + 0.5))
+    lower = ic - 3.3 * a_s ** -0.5 - 2.0 * a_s ** -1.5
+    upper = ic + 2.4 * a_s ** -0.5 - 0.5 * a_s ** -1.5
+    return ic, lower, upper
+
+
+class Signals:
+    """組み合わせごとの PRR / ROR / IC（JaderCounts の pair_* と同じ並び）"""
+
+    def __init__(self, counts: JaderCounts):
+        self.counts = counts
+        a, b, c, d = contingency(counts)
+        n = a + b + c + d
+
+        # PRR・ROR は 0 のセルがある行だけ Haldane 補正
+        zero = (b == 0) | (c == 0) | (d == 0)
+        ah, bh, ch, dh = (np.where(zero, x + HALDANE, x) for x in (a, b, c, d))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.prr = (ah / (ah + bh)) / (ch / (ch + dh))
+            se = np.sqrt(1 / ah - 1 / (ah + bh) + 1 / ch - 1 / (ch + dh))
+            self.prr_lower = self.prr * np.exp(-Z_95 * se)
+            self.prr_upper = self.prr * np.exp(Z_95 * se)
+
+            self.ror = (ah * dh) / (bh * ch)
+            se = np.sqrt(1 / ah + 1 / bh + 1 / ch + 1 / dh)
+            self.ror_lower = self.ror * np.exp(-Z_95 * se)
+            self.ror_upper = self.ror * np.exp(Z_95 * se)
+
+            # Yates 補正付き χ²（PRR の判定用）
+            margins = (a + b) * (c + d) * (a + c) * (b + d)
+            diff = np.maximum(np.abs(a * d - b * c) - n / 2, 0)
+            self.chi2 = np.where(margins > 0, n * diff ** 2 / margins, 0.0)
+
+        self.ic, self.ic_lower, self.ic_upper = _ic_interval(a, (a + b) * (a + c) / n)
+
+        self.level = ((self.prr >= PRR_MIN) & (self.chi2 >= CHI2_MIN)).astype(np.int8)
+        self.level += self.ror_lower > 1
+        self.level += self.ic_lower > 0
+        # 症例数が少なすぎる組み合わせは判定しない
+        self.level[counts.pair_count < AE_MIN_REPORTS] = 0
+
+    @property
+    def labels(self) -> np.ndarray:
+        """組み合わせごとの頻度ラベル（high / medium / low / rare）"""
+        return SIGNAL_LABELS[self.level]
+
+    def top_events(self, drug: int, n: int = AE_TOP_N) -> list[dict]:
+        """薬コード drug のシグナルのある有害事象を 基準の数 → 症例数 の多い順に返す"""
+        counts = self.counts
+        if drug is None or drug < 0 or not counts.drug_cases[drug]:
+            return []
+        lo, hi = np.searchsorted(counts.pair_drug, [drug, drug + 1])
+        rows = np.arange(lo, hi)[self.level[lo:hi] > 0]
+        rows = rows[np.lexsort((-counts.pair_count[rows], -self.level[rows]))][:n]
+        return [{
+            "name": counts.events[counts.pair_event[r]],
+            "name_en": "",
+            "frequency": str(SIGNAL_LABELS[self.level[r]]),
+            "reports": int(counts.pair_count[r]),
+            "prr": round(float(self.prr[r]), 2),
+            "ror": round(float(self.ror[r]), 2),
+            "ror_lower": round(float(self.ror_lower[r]), 2),
+            "ic": round(float(self.ic[r]), 2),
+            "ic_lower": round(float(self.ic_lower[r]), 2),
+        } for r in rows]
+
+
+def compute_signals(counts: JaderCounts) -> Signals:
+    signals = Signals(counts)
+    tally = np.bincount(signals.level, minlength=len(SIGNAL_LABELS))
+    print("  シグナル: " + ", ".join(f"{label} {int(k)}" for label, k in zip(SIGNAL_LABELS, tally))
+          + f"（{len(counts.pair_count)} 組み合わせ）")
+    return signals
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+jader_snapshots.py
+JADER の 薬 × 有害事象 の症例数を報告年度・四半期ごとに保存し、足し合わせる。
+
+JADER は累積で公開される（新しいリリースは前のリリース + 新しい四半期）。
+症例は1つの四半期にだけ属するので、四半期ごとの症例数は単純な足し算でまとめられる。
+jader_store の meta.json にある四半期ごとの行数・チェックサム（fingerprint）が
+保存済みのものと同じ四半期は集計し直さず、新しい（または訂正された）四半期だけを集計する。
+
+data/cache/jader_counts/<集計条件>/
+  index.json       {version, periods: {四半期: {fingerprint, file}}}
+  <hash>.npz       1四半期分の症例数（コードではなく名前で持つ。リリースごとにコードが変わるため）
+    drugs / events                       この四半期に出てくる薬・有害事象の名前
+    pair_drug / pair_event / pair_count  組み合わせ（drugs / events の添字）と症例数
+    drug_cases / event_cases / n_cases   周辺度数
+
+使い方:
+    snapshots = CountSnapshots("suspect-jader_drug_key")
+    stale = snapshots.stale(store.meta["periods"])
+    snapshots.save(period, fingerprint, drugs, events, partial)
+    drugs, events, partial = snapshots.merge(store.meta["periods"])
+"""
+
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+
+from checkpoint_journal import write_json_atomic
+
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR.parent / "data"
+SNAPSHOT_DIR = DATA_DIR / "cache" / "jader_counts"
+# 集計方法（被疑薬の判定・一般名の正規化など）を変えたら上げる
+SNAPSHOT_VERSION = 1
+
+
+class CountSnapshots:
+    """1つの集計条件（variant）の四半期ごとの症例数"""
+
+    def __init__(self, variant: str):
+        self.root = SNAPSHOT_DIR / variant
+        self.index_file = self.root / "index.json"
+        self.periods = {}
+        if self.index_file.exists():
+            with open(self.index_file, encoding="utf-8") as f:
+                index = json.load(f)
+            if index.get("version") == SNAPSHOT_VERSION:
+                self.periods = index["periods"]
+
+    def stale(self, fingerprints: dict) -> list[str]:
+        """集計し直す四半期（未保存、または行数・チェックサムが変わったもの）"""
+        return [period for period, fp in fingerprints.items()
+                if self.periods.get(period, {}).get("fingerprint") != fp
+                or not (self.root / self.periods[period]["file"]).exists()]
+
+    def save(self, period: str, fingerprint: list, drugs: list[str], events: list[str], partial: tuple):
+        """1四半期分の部分集計（jader_aggregate.count_cases の戻り値）を名前付きで保存
+
+        index.json の書き込みは save_index でまとめて行う。
+        """
+        keys, counts, drug_cases, event_cases, n_cases = partial
+        n_events = max(len(events), 1)
+        used_drugs = np.flatnonzero(drug_cases)
+        used_events = np.flatnonzero(event_cases)
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        name = hashlib.sha256(period.encode("utf-8")).hexdigest()[:16] + ".npz"
+        tmp = self.root / (name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f,
+                     drugs=np.array([drugs[i] for i in used_drugs], dtype=str),
+                     events=np.array([events[i] for i in used_events], dtype=str),
+                     pair_drug=np.searchsorted(used_drugs, keys // n_events).astype(np.int32),
+                     pair_event=np.searchsorted(used_events, keys % n_events).astype(np.int32),
+                     pair_count=counts,
+                     drug_cases=drug_cases[used_drugs],
+                     event_cases=event_cases[used_events],
+                     n_cases=np.int64(n_cases))
+        tmp.replace(self.root / name)
+        self.periods[period] = {"fingerprint": fingerprint, "file": name}
+
+    def save_index(self, fingerprints: dict):
+        """index.json を更新し、リリースから消えた四半期のファイルを削除"""
+        for period in [p for p in self.periods if p not in fingerprints]:
+            (self.root / self.periods.pop(period)["file"]).unlink(missing_ok=True)
+        self.root.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(self.index_file, {"version": SNAPSHOT_VERSION, "periods": self.periods})
+
+    def merge(self, periods: list[str]) -> tuple[list[str], list[str], tuple]:
+        """periods の四半期を足し合わせて (薬の名前, 有害事象の名前, 部分集計) を返す
+
+        名前の和集合で共通のコードを振り直し、組み合わせキーごとに合計する（キーは薬 → 有害事象順）。
+        """
+        loaded = []
+        for period in sorted(periods):
+            with np.load(self.root / self.periods[period]["file"]) as z:
+                loaded.append({k: z[k] for k in z.files})
+
+        drug_index, event_index = {}, {}
+        for snap in loaded:
+            snap["drug_codes"] = np.array([drug_index.setdefault(d, len(drug_index)) for d in snap["drugs"].tolist()],
+                                          dtype=np.int64)
+            snap["event_codes"] = np.array([event_index.setdefault(e, len(event_index)) for e in snap["events"].tolist()],
+                                           dtype=np.int64)
+
+        n_drugs, n_events = len(drug_index), max(len(event_index), 1)
+        keys = np.concatenate([s["drug_codes"][s["pair_drug"]] * n_events + s["event_codes"][s["pair_event"]]
+                               for s in loaded]) if loaded else np.empty(0, np.int64)
+        counts = np.concatenate([s["pair_count"] for s in loaded]) if loaded else np.empty(0, np.int64)
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        pair_count = np.bincount(inverse, weights=counts, minlength=len(uniq)).astype(np.int64)
+
+        drug_cases = np.zeros(n_drugs, dtype=np.int64)
+        event_cases = np.zeros(len(event_index), dtype=np.int64)
+        for snap in loaded:
+            np.add.at(drug_cases, snap["drug_codes"], snap["drug_cases"])
+            np.add.at(event_cases, snap["event_codes"], snap["event_cases"])
+        n_cases = int(sum(int(s["n_cases"]) for s in loaded))
+        return list(drug_index), list(event_index), (uniq, pair_count, drug_cases, event_cases, n_cases)
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+jader_store.py
+JADER 生 CSV（drug.csv / reac.csv / demo.csv）の列形式キャッシュ。
+
+cp932 のデコードと型推定に時間がかかる CSV のパースはリリースごとに1回だけ行い、
+整数コードの列を .npy に、文字列の辞書を JSON に保存する。以後の集計は
+.npy をメモリマップで開くだけで CSV を読まない。
+CSV は latin-1（1バイト = 1文字）で区切りだけを読み、cp932 のデコードは
+使われているユニーク値ごとに行う（cp932 の2バイト目に , " 改行 は現れない）。
+
+data/cache/jader/<リリースID>/
+  meta.json          元 CSV のサイズ・sha256、使った列名、行数
+  drug_case.npy      int32  drug.csv 各行の症例コード
+  drug_name.npy      int32  一般名コード
+  drug_suspect.npy   bool   医薬品の関与 = 被疑薬
+  reac_case.npy      int32  reac.csv 各行の症例コード
+  reac_event.npy     int32  有害事象コード
+  case_period.npy    int32  症例コード → 報告年度・四半期のコード（demo.csv。無い症例は ""）
+  cases.json / drug_names.json / event_names.json / periods.json   コード → 文字列
+リリースID は drug.csv・reac.csv（・demo.csv）の sha256 から作る（古いリリースのものは削除）。
+meta.json の periods には四半期ごとの行数とチェックサムを持たせ、前のリリースから
+変わった四半期だけを集計し直せるようにする（jader_snapshots）。
+
+新しいリリースは前のリリース + 新しい四半期なので、前のリリースのキャッシュがあれば
+その列・辞書（コード）を引き継ぎ、demo.csv で前のリリースに無い四半期の症例の行だけを
+デコードして追記する。前のリリースにある四半期の行は名前をデコードせずに読み飛ばし、
+四半期ごとの行数が前のリリースと違えば（訂正・削除があれば）全体を作り直す。
+（Parquet/Arrow は依存を増やすため使わず、NumPy の .npy で同じ役割を持たせている）
+
+使い方:
+    store = open_store(JADER_DIR)
+    store.column("drug_case"), store.drugs, store.events, store.meta["periods"]
+"""
+
+import hashlib
+import json
+import shutil
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from checkpoint_journal import write_json_atomic
+from ssk_master import file_sha256
+
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR.parent / "data"
+STORE_DIR = DATA_DIR / "cache" / "jader"
+STORE_VERSION = 2
+
+JADER_ENCODING = "cp932"
+RAW_ENCODING = "latin-1"   # CSV の区切りを読むだけのエンコーディング（値は後で cp932 にデコード）
+CSV_CHUNK_ROWS = 200_000
+
+# JADER の列名は公開年により異なるので候補から探す
+CASE_COLUMNS = ["識別番号", "case_id", "症例番号"]
+DRUG_NAME_COLUMNS = ["医薬品（一般名）", "drug_name", "一般名"]
+REAC_NAME_COLUMNS = ["有害事象", "adverse_reaction", "副作用名"]
+INVOLVEMENT_COLUMNS = ["医薬品の関与"]
+PERIOD_COLUMNS = ["報告年度・四半期", "報告年度", "period"]
+SUSPECT = "被疑薬"
+UNKNOWN_PERIOD = ""
+CHECKSUM_BITS = 20   # 行ごとのチェックサムの幅（float64 の合計が正確な範囲に収める）
+
+
+def detect_column(columns, candidates: list[str]) -> str | None:
+    for col in candidates:
+        if col in columns:
+            return col
+    return None
+
+
+def _raw(text: str) -> str:
+    """cp932 の文字列を RAW_ENCODING で読んだときの表記（列名・値の照合用）"""
+    return text.encode(JADER_ENCODING).decode(RAW_ENCODING)
+
+
+class Dictionary:
+    """文字列 → 整数コード（チャンクをまたいで共通）"""
+
+    def __init__(self, values: list[str] = ()):
+        # values: 前のリリースの コード → 文字列（同じコードを振り続ける）
+        self.index = {value: code for code, value in enumerate(values)}
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def values(self) -> list[str]:
+        return list(self.index)
+
+    def encode(self, series: pd.Series) -> np.ndarray:
+        """RAW_ENCODING で読んだ category 型の列をコード配列に変換（空・欠損は -1）
+
+        cp932 のデコード・前後空白の除去・辞書引きは、使われているユニーク値（カテゴリ）ごとに1回だけ行う。
+        """
+        cat = series.astype("category").cat.remove_unused_categories().cat
+        lookup = []
+        for value in cat.categories:
+            value = str(value).encode(RAW_ENCODING).decode(JADER_ENCODING).strip()
+            lookup.append(self.index.setdefault(value, len(self.index)) if value else -1)
+        lookup.append(-1)  # 欠損（codes = -1）
+        return np.asarray(lookup, dtype=np.int32)[cat.codes.to_numpy()]
+
+
+def jader_files(jader_dir: Path) -> tuple[Path, Path] | None:
+    drug_file, reac_file = jader_dir / "drug.csv", jader_dir / "reac.csv"
+    if drug_file.exists() and reac_file.exists():
+        return drug_file, reac_file
+    return None
+
+
+def demo_file(jader_dir: Path) -> Path | None:
+    """症例ごとの報告年度・四半期を持つ demo.csv（無くても集計はできる）"""
+    path = jader_dir / "demo.csv"
+    return path if path.exists() else None
+
+
+def code_columns(path: Path, name_candidates: list[str], flag_candidates: list[str] = None) -> list[str]:
+    """CSV の 症例ID・名前（・フラグ）の列名"""
+    header = pd.read_csv(path, encoding=JADER_ENCODING, nrows=0).columns
+    case_col = detect_column(header, CASE_COLUMNS)
+    name_col = detect_column(header, name_candidates)
+    if case_col is None or name_col is None:
+        raise ValueError(f"{path.name}: 症例ID・名前の列が見つかりません。Columns: {list(header)}")
+    flag_col = detect_column(header, flag_candidates) if flag_candidates else None
+    return [c for c in (case_col, name_col, flag_col) if c]
+
+
+def read_code_columns(path: Path, name_candidates: list[str], cases: Dictionary,
+                      names: Dictionary, flag_candidates: list[str] = None,
+                      flag_value: str = None, skip_cases: np.ndarray = None) -> dict:
+    """CSV をチャンクで読み {case, name, flag} のコード配列と使った列名を返す
+
+    flag は flag_candidates の列が flag_value の行で True（列が無ければ全行 True）。
+    症例ID・名前が空の行は除く。
+    skip_cases（症例コード → bool）が True の症例の行は名前をデコードせずに読み飛ばし、
+    名前が空でない行の数を症例ごとに "skipped" に返す（保存済みの行数との照合用）。
+    """
+    usecols = code_columns(path, name_candidates, flag_candidates)
+    case_col, name_col = (_raw(c) for c in usecols[:2])
+    flag_col = _raw(usecols[2]) if len(usecols) > 2 else None
+    print(f"  {path.name}: " + ", ".join(f"{k}={c}" for k, c in zip(("case", "name", "flag"), usecols)))
+
+    parts = {"case": [], "name": [], "flag": []}
+    skipped = np.zeros(0 if skip_cases is None else len(skip_cases), dtype=np.int64)
+    rows = 0
+    for chunk in pd.read_csv(path, encoding=RAW_ENCODING, usecols=[_raw(c) for c in usecols],
+                             dtype="category", chunksize=CSV_CHUNK_ROWS):
+        rows += len(chunk)
+        case_codes = cases.encode(chunk[case_col])
+        rows_in = case_codes >= 0
+        if skip_cases is not None:
+            old = rows_in & (case_codes < len(skip_cases))
+            old[old] = skip_cases[case_codes[old]]
+            raw_names = chunk[name_col].cat
+            named = np.append([bool(str(v).strip()) for v in raw_names.categories], False)
+            skipped += np.bincount(case_codes[old & named[raw_names.codes.to_numpy()]],
+                                   minlength=len(skip_cases))
+            rows_in &= ~old
+        name_codes = names.encode(chunk[name_col][rows_in])
+        keep = name_codes >= 0
+        parts["case"].append(case_codes[rows_in][keep])
+        parts["name"].append(name_codes[keep])
+        if flag_col:
+            parts["flag"].append((chunk[flag_col] == _raw(flag_value)).to_numpy()[rows_in][keep])
+        else:
+            parts["flag"].append(np.ones(int(keep.sum()), dtype=bool))
+    n_new = sum(len(a) for a in parts["case"])
+    print(f"  {path.name}: {rows} rows" + (f"（追記 {n_new} 行）" if skip_cases is not None else ""))
+
+    empty = {"case": np.int32, "name": np.int32, "flag": bool}
+    columns = {key: np.concatenate(arrays) if arrays else np.empty(0, empty[key])
+               for key, arrays in parts.items()}
+    columns["columns"] = usecols
+    columns["skipped"] = skipped
+    return columns
+
+
+def read_case_periods(path: Path | None, cases: Dictionary, periods: Dictionary) -> np.ndarray:
+    """症例コード → 四半期コード（demo.csv に無い症例は UNKNOWN_PERIOD）"""
+    unknown = periods.index.setdefault(UNKNOWN_PERIOD, len(periods))
+    if path is None:
+        return np.full(len(cases), unknown, dtype=np.int32)
+
+    header = pd.read_csv(path, encoding=JADER_ENCODING, nrows=0).columns
+    case_col = detect_column(header, CASE_COLUMNS)
+    period_col = detect_column(header, PERIOD_COLUMNS)
+    if case_col is None or period_col is None:
+        print(f"  {path.name}: 症例ID・報告年度の列が見つかりません（四半期ごとの更新は無効）")
+        return np.full(len(cases), unknown, dtype=np.int32)
+    print(f"  {path.name}: case={case_col}, period={period_col}")
+
+    case_parts, period_parts = [], []
+    for chunk in pd.read_csv(path, encoding=RAW_ENCODING, usecols=[_raw(case_col), _raw(period_col)],
+                             dtype="category", chunksize=CSV_CHUNK_ROWS):
+        case_codes = cases.encode(chunk[_raw(case_col)])
+        period_codes = periods.encode(chunk[_raw(period_col)])
+        keep = case_codes >= 0
+        case_parts.append(case_codes[keep])
+        period_parts.append(np.where(period_codes[keep] >= 0, period_codes[keep], unknown))
+
+    case_period = np.full(len(cases), unknown, dtype=np.int32)
+    if case_parts:
+        case_period[np.concatenate(case_parts)] = np.concatenate(period_parts)
+    return case_period
+
+
+def _checksums(values: list[str]) -> np.ndarray:
+    return np.array([zlib.crc32(v.encode("utf-8")) for v in values], dtype=np.int64)
+
+
+def period_fingerprints(case_period: np.ndarray, periods: list[str], cases: list[str],
+                        drug_cols: dict, drugs: list[str], reac_cols: dict, events: list[str]) -> dict:
+    """四半期ごとの [drug 行数, reac 行数, drug チェックサム, reac チェックサム]
+
+    行のチェックサムは 症例ID・名前（・被疑薬フラグ）の crc32 から作り、四半期ごとに合計する。
+    文字列の crc32 はユニーク値ごとに1回だけ計算する。
+    """
+    mask = (1 << CHECKSUM_BITS) - 1
+    case_sum = _checksums(cases)
+    n = len(periods)
+
+    d_period = case_period[drug_cols["case"]]
+    d_sum = (case_sum[drug_cols["case"]] + 3 * _checksums(drugs)[drug_cols["name"]] + drug_cols["flag"]) & mask
+    r_period = case_period[reac_cols["case"]]
+    r_sum = (case_sum[reac_cols["case"]] + 3 * _checksums(events)[reac_cols["name"]]) & mask
+
+    table = np.stack([
+        np.bincount(d_period, minlength=n),
+        np.bincount(r_period, minlength=n),
+        np.bincount(d_period, weights=d_sum, minlength=n),
+        np.bincount(r_period, weights=r_sum, minlength=n),
+    ]).astype(np.int64)
+    return {period: table[:, i].tolist() for i, period in enumerate(periods) if table[:2, i].any()}
+
+
+def load_column(root: Path, name: str) -> np.ndarray:
+    """列をメモリマップで開く（読み取り専用）"""
+    return np.load(root / f"{name}.npy", mmap_mode="r")
+
+
+class JaderStore:
+    """1リリース分の列形式キャッシュ"""
+
+    def __init__(self, root: Path, meta: dict):
+        self.root = root
+        self.meta = meta
+        self.drugs = self._load_json("drug_names.json")
+        self.events = self._load_json("event_names.json")
+        self.periods = self._load_json("periods.json")
+        self._cases = None
+
+    def _load_json(self, name: str) -> list[str]:
+        with open(self.root / name, encoding="utf-8") as f:
+            return json.load(f)
+
+    @property
+    def cases(self) -> list[str]:
+        """症例コード → 識別番号（必要なときだけ読む）"""
+        if self._cases is None:
+            self._cases = self._load_json("cases.json")
+        return self._cases
+
+    def column(self, name: str) -> np.ndarray:
+        return load_column(self.root, name)
+
+
+def _source_info(files: tuple[Path, ...]) -> tuple[str, dict]:
+    """リリースID（sha256 の先頭）と元ファイルの情報"""
+    info = {}
+    h = hashlib.sha256()
+    for path in files:
+        digest = file_sha256(path)
+        h.update(digest.encode())
+        info[path.name] = {"size": path.stat().st_size, "sha256": digest}
+    return h.hexdigest()[:16], info
+
+
+def _write_store(root: Path, cases: Dictionary, drugs: Dictionary, events: Dictionary,
+                 periods: Dictionary, drug_cols: dict, reac_cols: dict, case_period: np.ndarray, meta: dict):
+    """列・辞書・meta.json を一時ディレクトリに書いてから root に置き換える"""
+    tmp = root.with_name(root.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    tmp.mkdir(parents=True)
+    np.save(tmp / "drug_case.npy", drug_cols["case"])
+    np.save(tmp / "drug_name.npy", drug_cols["name"])
+    np.save(tmp / "drug_suspect.npy", drug_cols["flag"])
+    np.save(tmp / "reac_case.npy", reac_cols["case"])
+    np.save(tmp / "reac_event.npy", reac_cols["name"])
+    np.save(tmp / "case_period.npy", case_period)
+    for name, values in (("cases", cases.values), ("drug_names", drugs.values),
+                         ("event_names", events.values), ("periods", periods.values)):
+        write_json_atomic(tmp / f"{name}.json", values, indent=None)
+
+    meta.update({
+        "drug_columns": drug_cols["columns"],
+        "reac_columns": reac_cols["columns"],
+        "rows": {"drug": len(drug_cols["case"]), "reac": len(reac_cols["case"])},
+        "n_cases": len(cases), "n_drugs": len(drugs), "n_events": len(events),
+        "periods": period_fingerprints(case_period, periods.values, cases.values,
+                                       drug_cols, drugs.values, reac_cols, events.values),
+    })
+    write_json_atomic(tmp / "meta.json", meta)
+    tmp.replace(root)
+
+
+def _build_store(root: Path, drug_file: Path, reac_file: Path, demo: Path | None, meta: dict):
+    print(f"  JADER列キャッシュ作成: {root}")
+    cases, drugs, events, periods = Dictionary(), Dictionary(), Dictionary(), Dictionary()
+    drug_cols = read_code_columns(drug_file, DRUG_NAME_COLUMNS, cases, drugs,
+                                  INVOLVEMENT_COLUMNS, SUSPECT)
+    reac_cols = read_code_columns(reac_file, REAC_NAME_COLUMNS, cases, events)
+    case_period = read_case_periods(demo, cases, periods)
+    _write_store(root, cases, drugs, events, periods, drug_cols, reac_cols, case_period, meta)
+
+
+def _previous_store(root: Path) -> JaderStore | None:
+    """root 以外のリリースのキャッシュ（四半期が分かるもの）"""
+    if not STORE_DIR.exists():
+        return None
+    for other in STORE_DIR.iterdir():
+        meta_file = other / "meta.json"
+        if other == root or not other.is_dir() or not meta_file.exists():
+            continue
+        with open(meta_file, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") == STORE_VERSION and set(meta.get("periods", {})) - {UNKNOWN_PERIOD}:
+            return JaderStore(other, meta)
+    return None
+
+
+def _extend_store(root: Path, prev: JaderStore, drug_file: Path, reac_file: Path, demo: Path,
+                  meta: dict) -> bool:
+    """前のリリースの列・辞書を引き継ぎ、新しい四半期の症例の行だけを追記して root を作る
+
+    前のリリースにある四半期の行は CSV から読み直さない（名前もデコードしない）。
+    列名が変わった、または前のリリースにある四半期の行数が変わった場合は False（作り直す）。
+    """
+    if (code_columns(drug_file, DRUG_NAME_COLUMNS, INVOLVEMENT_COLUMNS) != prev.meta["drug_columns"]
+            or code_columns(reac_file, REAC_NAME_COLUMNS) != prev.meta["reac_columns"]):
+        print("  JADER: 列名が前のリリースと違うため作り直します")
+        return False
+
+    print(f"  JADER列キャッシュ追記: {prev.root.name} → {root.name}")
+    cases, drugs = Dictionary(prev.cases), Dictionary(prev.drugs)
+    events, periods = Dictionary(prev.events), Dictionary(prev.periods)
+    case_period = read_case_periods(demo, cases, periods)
+    old_periods = [p for p in prev.meta["periods"] if p != UNKNOWN_PERIOD]
+    is_old = np.zeros(len(periods), dtype=bool)
+    is_old[[periods.index[p] for p in old_periods if p in periods.index]] = True
+    old_case = is_old[case_period]
+
+    drug_new = read_code_columns(drug_file, DRUG_NAME_COLUMNS, cases, drugs,
+                                 INVOLVEMENT_COLUMNS, SUSPECT, skip_cases=old_case)
+    reac_new = read_code_columns(reac_file, REAC_NAME_COLUMNS, cases, events, skip_cases=old_case)
+
+    # 読み飛ばした行数が前のリリースの四半期ごとの行数と合わなければ引き継げない
+    n_periods = len(periods)
+    skipped_drug = np.bincount(case_period, weights=drug_new["skipped"], minlength=n_periods)
+    skipped_reac = np.bincount(case_period, weights=reac_new["skipped"], minlength=n_periods)
+    changed = [p for p in old_periods
+               if p not in periods.index
+               or [int(skipped_drug[periods.index[p]]), int(skipped_reac[periods.index[p]])]
+               != prev.meta["periods"][p][:2]]
+    if changed:
+        print(f"  JADER: 前のリリースの {len(changed)} 四半期で行数が変わったため作り直します（{changed[:3]}）")
+        return False
+
+    # demo.csv に無く drug.csv / reac.csv にだけある症例は四半期不明
+    unknown = periods.index[UNKNOWN_PERIOD]
+    case_period = np.concatenate([case_period, np.full(len(cases) - len(case_period), unknown, np.int32)])
+
+    d_case, r_case = prev.column("drug_case"), prev.column("reac_case")
+    d_old, r_old = old_case[d_case], old_case[r_case]
+    drug_cols = {"case": np.concatenate([d_case[d_old], drug_new["case"]]),
+                 "name": np.concatenate([prev.column("drug_name")[d_old], drug_new["name"]]),
+                 "flag": np.concatenate([prev.column("drug_suspect")[d_old], drug_new["flag"]]),
+                 "columns": drug_new["columns"]}
+    reac_cols = {"case": np.concatenate([r_case[r_old], reac_new["case"]]),
+                 "name": np.concatenate([prev.column("reac_event")[r_old], reac_new["name"]]),
+                 "columns": reac_new["columns"]}
+    meta["base_release"] = prev.meta["release"]
+    _write_store(root, cases, drugs, events, periods, drug_cols, reac_cols, case_period, meta)
+    return True
+
+
+def open_store(jader_dir: Path) -> JaderStore | None:
+    """jader_dir の CSV に対応する列形式キャッシュを開く
+
+    無ければ前のリリースのキャッシュに新しい四半期を追記して作る（できなければ CSV 全体から作る）。
+    CSV が無ければ None。
+    """
+    files = jader_files(jader_dir)
+    if files is None:
+        return None
+
+    demo = demo_file(jader_dir)
+    release, sources = _source_info(files + ((demo,) if demo else ()))
+    root = STORE_DIR / release
+    meta_file = root / "meta.json"
+    if meta_file.exists():
+        with open(meta_file, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") == STORE_VERSION:
+            return JaderStore(root, meta)
+        shutil.rmtree(root)
+
+    meta = {"version": STORE_VERSION, "release": release, "sources": sources}
+    prev = _previous_store(root) if demo else None
+    if prev is None or not _extend_store(root, prev, *files, demo, dict(meta)):
+        _build_store(root, *files, demo, meta)
+    # 古いリリースのキャッシュは使わないので削除
+    for other in STORE_DIR.iterdir():
+        if other.is_dir() and other != root:
+            shutil.rmtree(other)
+    with open(meta_file, encoding="utf-8") as f:
+        return JaderStore(root, json.load(f))
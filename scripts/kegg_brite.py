@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+kegg_brite.py
+KEGG BRITE 階層ファイル（br:br08301 / br:jp08301 など）のローダー。
+
+get/br:<id> を1回取得して
+  分類コード → 親コード（親の連鎖）
+  分類コード → 配下の D 番号
+  D 番号 → 名前, 所属する分類コード
+に分解し、data/cache/brite_<id>.json にキャッシュする（元テキストの sha256 が
+変わったときだけ再パース）。薬ごとの get 応答の CLASS/BRITE を読まずに、
+薬効分類や日本語名を KEGG ID から辞書引きできる。
+
+階層ファイルの行:
+  A<b>1  Agents affecting nervous system and sensory organs</b>
+  B  11  Agents affecting central nervous system
+  C    111  General anesthetics
+  E        D00714  Thiopental sodium (JP18/USP/INN)
+
+使い方:
+    brite = load_brite("br08301")
+    brite.category_code("D00714")        # "11"（B 階層）
+    brite.name("D00714")                 # "Thiopental sodium (JP18/USP/INN)"
+    brite.members("111")                 # ["D00714", ...]
+"""
+
+import hashlib
+import json
+import re
+from pathlib import Path
+
+from checkpoint_journal import write_json_atomic
+from http_cache import fetch_bytes
+
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR.parent / "data"
+CACHE_DIR = DATA_DIR / "cache"
+
+BRITE_URL = "https://rest.kegg.jp/get/br:{brite_id}"
+CACHE_VERSION = 1
+
+_TAG = re.compile(r"<[^>]+>")
+_KEGG_ID = re.compile(r"^D\d{5}$")
+# (JP18), (JAN), (USAN), (JAN/INN) などの末尾注記
+_NAME_SUFFIX = re.compile(r"\s*\((?:JP\d+|JAN|USAN|INN|USP|JAN/USAN|JAN/INN)\)\s*$")
+
+
+def clean_name(name: str) -> str:
+    """末尾の (JP18) 等の注記と ; を除く"""
+    return _NAME_SUFFIX.sub("", name).strip().rstrip(";").strip()
+
+
+class BriteHierarchy:
+    """パース済みの BRITE 階層"""
+
+    def __init__(self, nodes: dict, entries: dict):
+        self.nodes = nodes        # code → [name, parent_code, level]
+        self.entries = entries    # kegg_id → [name, [所属 code, ...]]
+        self._members = None
+
+    @classmethod
+    def parse(cls, text: str) -> "BriteHierarchy":
+        nodes = {}
+        entries = {}
+        path = []  # [(level, code)] 現在行までの祖先
+        for line in text.split("\n"):
+            if not line or not line[0].isalpha() or not line[0].isupper():
+                continue
+            level = line[0]
+            parts = _TAG.sub("", line[1:]).strip().split(None, 1)
+            if not parts:
+                continue
+            code = parts[0]
+            name = parts[1].strip() if len(parts) > 1 else ""
+
+            while path and path[-1][0] >= level:
+                path.pop()
+            parent = path[-1][1] if path else None
+
+            if _KEGG_ID.match(code):
+                entry = entries.setdefault(code, [name, []])
+                if parent and parent not in entry[1]:
+                    entry[1].append(parent)
+            else:
+                nodes.setdefault(code, [name, parent, level])
+                path.append((level, code))
+        return cls(nodes, entries)
+
+    def lineage(self, code: str) -> list[str]:
+        """最上位から code までの分類コード"""
+        chain = []
+        while code is not None and code in self.nodes:
+            chain.append(code)
+            code = self.nodes[code][1]
+        return chain[::-1]
+
+    def name(self, kegg_id: str) -> str:
+        entry = self.entries.get(kegg_id)
+        return entry[0] if entry else ""
+
+    def categories(self, kegg_id: str) -> list[str]:
+        """kegg_id が直接属する分類コード（階層内の出現順）"""
+        entry = self.entries.get(kegg_id)
+        return list(entry[1]) if entry else []
+
+    def category_code(self, kegg_id: str, level: str = "B") -> str:
+        """最初に出現する位置での level 階層の分類コード（無ければ空文字）"""
+        for parent in self.categories(kegg_id):
+            for code in self.lineage(parent):
+                if self.nodes[code][2] == level:
+                    return code
+        return ""
+
+    def category_name(self, code: str) -> str:
+        node = self.nodes.get(code)
+        return node[0] if node else ""
+
+    def members(self, code: str) -> list[str]:
+        """分類コード配下（子孫の分類を含む）の D 番号"""
+        if self._members is None:
+            self._members = {}
+            for kegg_id, (_, parents) in self.entries.items():
+                for parent in parents:
+                    for c in self.lineage(parent):
+                        ids = self._members.setdefault(c, [])
+                        if not ids or ids[-1] != kegg_id:
+                            ids.append(kegg_id)
+        return self._members.get(code, [])
+
+
+def load_brite(brite_id: str, timeout: float = 30) -> BriteHierarchy:
+    """BRITE 階層を取得してパース（結果は data/cache にキャッシュ）"""
+    text = fetch_bytes(BRITE_URL.format(brite_id=brite_id), timeout=timeout).decode("utf-8")
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    cache_file = CACHE_DIR / f"brite_{brite_id}.json"
+    if cache_file.exists():
+        try:
+            with open(cache_file, encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("version") == CACHE_VERSION and cached.get("sha256") == digest:
+                return BriteHierarchy(cached["nodes"], cached["entries"])
+        except ValueError:
+            pass
+
+    brite = BriteHierarchy.parse(text)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    write_json_atomic(cache_file, {
+        "version": CACHE_VERSION,
+        "brite_id": brite_id,
+        "sha256": digest,
+        "nodes": brite.nodes,
+        "entries": brite.entries,
+    }, indent=None)
+    return brite
+
+
+def load_jp_drug_info() -> dict[str, dict]:
+    """日本の薬効分類（br08301 英語 + jp08301 日本語）から KEGG ID → 分類・名前
+
+    値は kegg_jp_drugs.json の各要素と同じ形に name_ja を加えたもの。
+    順序は階層内で最初に出現した順。
+    """
+    en = load_brite("br08301")
+    try:
+        ja = load_brite("jp08301")
+    except Exception as e:
+        print(f"  br:jp08301 取得失敗（日本語名なし）: {e}")
+        ja = None
+
+    info = {}
+    for kegg_id in en.entries:
+        code = en.category_code(kegg_id, "B")
+        major = en.category_code(kegg_id, "A")
+        info[kegg_id] = {
+            "kegg_id": kegg_id,
+            "name": en.name(kegg_id),
+            "category_code": code,
+            "category_name": en.category_name(code),
+            "major_class": f"{major}  {en.category_name(major)}" if major else "",
+            "name_ja": clean_name(ja.name(kegg_id)) if ja else "",
+        }
+    return info
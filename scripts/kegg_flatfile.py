@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+kegg_flatfile.py
+KEGG REST のフラットファイル（get 応答）パーサ。
+
+KEGG の get / ddi は複数エントリを "+" で連結して1回で取得できる
+（1リクエスト最大10件）。get の応答は "///" 区切りで複数エントリが並ぶので、
+エントリごとに分割して parse_drug_info が期待する dict に変換する。
+
+パースは1パスの逐次処理で、応答を行単位で読みながらエントリを返す。
+必要なフィールド（既定は DRUG_FIELDS）だけを文字列にし、それ以外の節
+（ATOM / BOND / DBLINKS / INTERACTION など、分子構造や相互作用の長い節）は読み飛ばす。
+
+使い方:
+    entries = await fetcher.fetch_parsed(f"{KEGG_BASE}/get/D00109+D00564", read_entries)
+    entries["D00109"]["name"]
+"""
+
+from typing import Iterable, Iterator
+
+KEGG_BATCH_SIZE = 10  # get/ddi 1リクエスト当たりの最大エントリ数
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# parse_drug_info が使うフィールド（ENTRY は kegg_id のため常に読む）
+DRUG_FIELDS = frozenset({
+    "entry", "name", "formula", "efficacy", "target", "metabolism", "remark", "class",
+})
+
+
+def chunked(items: list, size: int = KEGG_BATCH_SIZE) -> list[list]:
+    """items を size 件ずつのリストに分割"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def iter_entries(lines: Iterable[str], fields: frozenset = DRUG_FIELDS) -> Iterator[dict]:
+    """フラットファイルの行を1パスで読み、エントリごとに {field(小文字): value} を返す
+
+    fields に無いフィールドは値を作らずに読み飛ばす（None なら全フィールド）。
+    kegg_id は ENTRY 行の先頭トークン（例: "ENTRY  D00109  Drug" → D00109）。
+    """
+    info = {}
+    field = None     # 読み取り中のフィールド（読み飛ばし中は None）
+    values = []
+
+    for line in lines:
+        if line.startswith("///"):
+            if field and values:
+                info[field] = "\n".join(values)
+            entry = info.get("entry", "").split()
+            if entry:
+                info["kegg_id"] = entry[0]
+                yield info
+            info, field, values = {}, None, []
+        elif line and not line[0].isspace():
+            if field and values:
+                info[field] = "\n".join(values)
+            parts = line.split(None, 1)
+            name = parts[0].lower()
+            if fields is None or name in fields or name == "entry":
+                field = name
+                values = [parts[1]] if len(parts) > 1 else []
+            else:
+                field = None
+        elif field and line.startswith(" "):
+            values.append(line.strip())
+
+    # 末尾に "///" が無い場合
+    if field and values:
+        info[field] = "\n".join(values)
+    entry = info.get("entry", "").split()
+    if entry:
+        info["kegg_id"] = entry[0]
+        yield info
+
+
+def parse_entry(lines: list[str], fields: frozenset = None) -> dict:
+    """1エントリ分の行を {field(小文字): value} に変換"""
+    return next(iter_entries(lines, fields), {})
+
+
+def split_entries(text: str, fields: frozenset = DRUG_FIELDS) -> dict[str, dict]:
+    """複数エントリの get 応答（文字列）を分割して {kegg_id: raw} を返す"""
+    return {info["kegg_id"]: info for info in iter_entries(text.splitlines(), fields)}
+
+
+def read_entries(resp, fields: frozenset = DRUG_FIELDS) -> dict[str, dict]:
+    """stream=True の get 応答を読みながら分割して {kegg_id: raw} を返す"""
+    lines = (line.decode("utf-8") for line in resp.iter_lines(chunk_size=STREAM_CHUNK_SIZE))
+    return {info["kegg_id"]: info for info in iter_entries(lines, fields)}
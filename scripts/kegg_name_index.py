@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+kegg_name_index.py
+KEGG list/drug から作るローカルの薬名転置インデックス。
+
+list/drug（約1.2万件, 1リクエスト）を一度取得し、名前検索をメモリ上で行う。
+find/drug/<name> を薬名ごとに叩く代わりに使う。
+
+- 名前は ";" 区切りで複数（先頭が一般名, "(TN)" 付きは商品名）
+- "(JP18/USP)" などの括弧注記を除いて小文字化・英数字トークン化
+- 塩・水和物（sodium, hydrochloride, hydrate ...）を除いた名前でも一致させる
+
+検索結果の並び（find の代わりに「先頭が最良」になるよう順位付け）:
+  1. 一般名（先頭の名前）が一致（塩・水和物を除いての一致を含む）
+  2. 一般名以外の名前（商品名を除く）が一致
+  3. 商品名 (TN) が一致
+  4. すべてのトークンが前方一致（find/drug 相当のキーワード検索）
+同順位内は 日本薬局方収載 (JP..) → 完全一致 → KEGG ID の順。
+"""
+
+import bisect
+import re
+
+KEGG_LIST_URL = "https://rest.kegg.jp/list/drug"
+
+# 塩・水和物など、一般名の末尾に付く語
+SALT_WORDS = {
+    "sodium", "potassium", "calcium", "magnesium", "lithium", "zinc", "aluminum",
+    "hydrochloride", "dihydrochloride", "hydrobromide", "hydroiodide",
+    "sulfate", "bisulfate", "mesylate", "mesilate", "besylate", "besilate",
+    "tosylate", "tosilate", "maleate", "fumarate", "succinate", "tartrate",
+    "bitartrate", "citrate", "acetate", "phosphate", "carbonate", "bicarbonate",
+    "lactate", "gluconate", "nitrate", "oxalate", "malate", "benzoate",
+    "bromide", "chloride", "iodide", "hydrate", "monohydrate", "dihydrate",
+    "trihydrate", "sesquihydrate", "hemihydrate", "anhydrous",
+}
+_ANNOTATION = re.compile(r"\s*\([^)]*\)")
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(name: str) -> list[str]:
+    """括弧注記を除いて小文字の英数字トークンに分割"""
+    return _TOKEN.findall(_ANNOTATION.sub("", name).lower())
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(tokenize(name))
+
+
+def strip_salt(name: str) -> str:
+    """正規化済みの名前から塩・水和物の語を除く
+
+    lithium carbonate のように全部消える場合はそのまま返す。
+    """
+    tokens = name.split()
+    kept = [t for t in tokens if t not in SALT_WORDS]
+    return " ".join(kept) if kept else name
+
+
+class KeggNameIndex:
+    """list/drug の応答から作る薬名インデックス"""
+
+    def __init__(self):
+        self.entries = {}      # kegg_id → list/drug の名前欄そのまま
+        self._exact = {}       # 正規化名 → [(順位, kegg_id)]
+        self._stripped = {}    # 塩除去名 → [(順位, kegg_id)]
+        self._tokens = {}      # トークン → {kegg_id}
+        self._jp = set()       # 日本薬局方収載の kegg_id
+        self._sorted_tokens = []
+
+    @classmethod
+    def from_list(cls, text: str) -> "KeggNameIndex":
+        """list/drug の応答テキスト（"D00001<TAB>名前; 名前 ..."）から構築"""
+        index = cls()
+        for line in text.split("\n"):
+            parts = line.split("\t", 1)
+            if len(parts) == 2:
+                index.add(parts[0].replace("dr:", "").strip(), parts[1].strip())
+        index._sorted_tokens = sorted(index._tokens)
+        return index
+
+    def add(self, kegg_id: str, names_raw: str):
+        self.entries[kegg_id] = names_raw
+        if "(JP" in names_raw:
+            self._jp.add(kegg_id)
+        for i, name in enumerate(n.strip() for n in names_raw.split(";")):
+            norm = normalize_name(name)
+            if not norm:
+                continue
+            if "(TN)" in name:
+                self._exact.setdefault(norm, []).append((2, kegg_id))
+            else:
+                tier = 0 if i == 0 else 1
+                self._exact.setdefault(norm, []).append((tier, kegg_id))
+                self._stripped.setdefault(strip_salt(norm), []).append((tier, kegg_id))
+            for token in norm.split():
+                self._tokens.setdefault(token, set()).add(kegg_id)
+
+    def _prefix_ids(self, prefix: str) -> set:
+        """prefix で始まるトークンを持つ kegg_id"""
+        ids = set()
+        i = bisect.bisect_left(self._sorted_tokens, prefix)
+        while i < len(self._sorted_tokens) and self._sorted_tokens[i].startswith(prefix):
+            ids |= self._tokens[self._sorted_tokens[i]]
+            i += 1
+        return ids
+
+    def search(self, name: str) -> list[dict]:
+        """薬名を検索し [{'kegg_id', 'name'}] を良い順に返す（find/drug と同じ形式）"""
+        norm = normalize_name(name)
+        if not norm:
+            return []
+
+        rank = {}  # kegg_id → (順位, 局方外, 完全一致でない)
+        matches = [(tier, 0, k) for tier, k in self._exact.get(norm, [])]
+        matches += [(tier, 1, k) for tier, k in self._stripped.get(strip_salt(norm), [])]
+        for tier, inexact, kegg_id in matches:
+            key = (tier, kegg_id not in self._jp, inexact)
+            rank[kegg_id] = min(key, rank.get(kegg_id, key))
+
+        ids = None
+        for token in norm.split():
+            ids = self._prefix_ids(token) if ids is None else ids & self._prefix_ids(token)
+        for kegg_id in ids or ():
+            rank.setdefault(kegg_id, (3, kegg_id not in self._jp, 1))
+
+        return [{"kegg_id": kegg_id, "name": self.entries[kegg_id]}
+                for kegg_id in sorted(rank, key=lambda k: (rank[k], k))]
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+mock_server.py
+外部 API（KEGG / DDinter2 / ChEMBL / Wikidata / SSK など）のローカル代替サーバー。
+
+http_cache の SQLite キャッシュ（data/cache/http_cache.sqlite）に記録済みの応答を
+フィクスチャとして再生する。一度オンラインで各スクリプトを実行すれば記録は揃う。
+--record を付けるとキャッシュに無いリクエストは本物へ取りに行って記録する。
+
+フェッチスクリプト側は環境変数で向け先を切り替える:
+    python scripts/mock_server.py --latency 200 --jitter 50 --rate-429 0.05 &
+    KUSURI_MOCK_URL=http://127.0.0.1:8765 KUSURI_NO_CACHE=1 python scripts/05_expand_all_drugs.py
+
+URL 対応: http://127.0.0.1:8765/<host>/<path>?<query> → https://<host>/<path>?<query>
+
+オプション:
+  --port N           待ち受けポート（既定 8765）
+  --db PATH          フィクスチャの SQLite（既定 data/cache/http_cache.sqlite）
+  --latency MS       応答前の固定遅延
+  --jitter MS        遅延に加える一様乱数（0〜MS）
+  --rate-429 P       確率 P で 429 Too Many Requests を返す
+  --retry-after S    429 の Retry-After 秒（既定 1）
+  --bandwidth KBPS   1接続あたりの送信帯域上限（KB/s, 0 = 無制限）
+  --seed N           乱数シード（遅延・429 を再現可能にする）
+  --record           未記録のリクエストは本物から取得して記録
+  --quiet            リクエストごとのログを出さない
+"""
+
+import random
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import requests
+
+from http_cache import CACHE_DB, SKIP_HEADERS, USER_AGENT, ResponseCache, cache_key
+
+DEFAULT_PORT = 8765
+SEND_CHUNK = 16 * 1024
+
+
+def _arg_value(name: str, default, cast=str):
+    """--name VALUE 形式のオプション値"""
+    if name in sys.argv:
+        return cast(sys.argv[sys.argv.index(name) + 1])
+    return default
+
+
+class MockConfig:
+    def __init__(self):
+        self.db = Path(_arg_value("--db", CACHE_DB))
+        self.port = _arg_value("--port", DEFAULT_PORT, int)
+        self.latency = _arg_value("--latency", 0.0, float) / 1000
+        self.jitter = _arg_value("--jitter", 0.0, float) / 1000
+        self.rate_429 = _arg_value("--rate-429", 0.0, float)
+        self.retry_after = _arg_value("--retry-after", 1, int)
+        self.bandwidth = _arg_value("--bandwidth", 0.0, float) * 1024
+        self.record = "--record" in sys.argv
+        self.quiet = "--quiet" in sys.argv
+        self.rng = random.Random(_arg_value("--seed", None, int))
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def draw(self) -> tuple[float, bool]:
+        """(遅延秒, 429 を返すか) を決める"""
+        with self.lock:
+            delay = self.latency + self.rng.uniform(0, self.jitter)
+            throttled = self.rng.random() < self.rate_429
+        return delay, throttled
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: MockConfig = None
+    cache: ResponseCache = None
+
+    def do_GET(self):
+        self._serve("GET")
+
+    def do_POST(self):
+        self._serve("POST")
+
+    def log_message(self, fmt, *args):
+        if not self.config.quiet:
+            super().log_message(fmt, *args)
+
+    def _upstream_url(self) -> str:
+        return "https://" + self.path.lstrip("/")
+
+    def _serve(self, method: str):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+        url = self._upstream_url()
+
+        delay, throttled = self.config.draw()
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            self.config.count("429")
+            self._send(429, {"Retry-After": str(self.config.retry_after)}, b"Too Many Requests\n")
+            return
+
+        entry = self.cache.get(cache_key(method, url, body))
+        if entry is not None:
+            self.config.count("hit")
+            self._send(entry["status"], entry["headers"], zlib.decompress(entry["zbody"]))
+        elif self.config.record:
+            self._record(method, url, body)
+        else:
+            self.config.count("miss")
+            self._send(404, {"Content-Type": "text/plain"}, f"no fixture: {method} {url}\n".encode())
+
+    def _record(self, method: str, url: str, body):
+        try:
+            resp = requests.request(method, url, data=body, timeout=120,
+                                    headers={"User-Agent": USER_AGENT,
+                                             "Content-Type": self.headers.get("Content-Type", "")})
+        except requests.RequestException as e:
+            self.config.count("upstream_error")
+            self._send(502, {"Content-Type": "text/plain"}, f"upstream error: {e}\n".encode())
+            return
+        if resp.status_code == 200:
+            self.cache.put(cache_key(method, url, body), url, 200, dict(resp.headers), resp.content)
+        self.config.count("recorded")
+        self._send(resp.status_code, dict(resp.headers), resp.content)
+
+    def _send(self, status: int, headers: dict, body: bytes):
+        self.send_response(status)
+        for k, v in headers.items():
+            if k.lower() not in SKIP_HEADERS:
+                self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        if not self.config.bandwidth:
+            self.wfile.write(body)
+            return
+        # 帯域制限: チャンクごとに送信量 / 帯域 の時間を空ける
+        start = time.monotonic()
+        for i in range(0, len(body), SEND_CHUNK):
+            self.wfile.write(body[i:i + SEND_CHUNK])
+            ahead = (i + SEND_CHUNK) / self.config.bandwidth - (time.monotonic() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+
+def main():
+    config = MockConfig()
+    if not config.db.exists() and not config.record:
+        print(f"フィクスチャがありません: {config.db}（--record で記録しながら起動）")
+        sys.exit(1)
+
+    MockHandler.config = config
+    MockHandler.cache = ResponseCache(config.db)
+    server = ThreadingHTTPServer(("127.0.0.1", config.port), MockHandler)
+    server.daemon_threads = True
+
+    print(f"mock server: http://127.0.0.1:{config.port}  (fixtures: {config.db})")
+    print(f"  latency={config.latency * 1000:.0f}ms jitter={config.jitter * 1000:.0f}ms "
+          f"429={config.rate_429:.0%} bandwidth={config.bandwidth / 1024:.0f}KB/s "
+          f"record={config.record}")
+    print(f"  export KUSURI_MOCK_URL=http://127.0.0.1:{config.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n=== mock server stats ===")
+        for key, count in sorted(config.stats.items()):
+            print(f"  {key}: {count}")
+
+
+if __name__ == "__main__":
+    main()
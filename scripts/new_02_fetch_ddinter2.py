@@ -15,25 +15,39 @@ API (jQuery DataTables Server-Side Processing):
 出力:
   data/ddinter_drugs.json         — DDinter2の全薬リスト
   data/ddinter_interactions.json  — 全DDIペア
+
+per-drug API は 日本販売薬（drug_master.json で薬価収載・日本語名あり）→ 既知DDIの
+相手が多い薬 → 残り の順に取得する。--time-budget 20m などで取得時間に上限を付けられ、
+上限で止めた場合は "complete": false で書き出し、再実行でジャーナルから続きを取得する。
 """
 
+import asyncio
 import csv
-import io
 import json
-import time
+import sys
+import queue
+import threading
+from contextlib import aclosing, closing
 from pathlib import Path
 from collections import Counter
+from typing import Iterator
 
-import requests
+from checkpoint_journal import Journal
+from fetch_engine import RETRY_STATUS, AimdLimiter, AsyncFetcher, ordered_map
+from fetch_priority import TimeBudget, partner_degree, priority_order
+from fetch_telemetry import throttle_sleep
+from http_cache import CachedSession
 
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR.parent / "data"
 DRUGS_OUTPUT = DATA_DIR / "ddinter_drugs.json"
 DDI_OUTPUT = DATA_DIR / "ddinter_interactions.json"
+PER_DRUG_JOURNAL = DATA_DIR / "ddinter_ddi_per_drug.jsonl"
+DRUG_MASTER = DATA_DIR / "drug_master.json"
 
 BASE_URL = "https://ddinter2.scbdd.com"
 
-SESSION = requests.Session()
+SESSION = CachedSession()
 SESSION.headers.update({
     "User-Agent": "Mozilla/5.0 (kusuri-research/1.0; academic use)",
     "Accept": "application/json",
@@ -42,80 +56,122 @@ SESSION.headers.update({
 
 REQUEST_DELAY = 0.3
 
+# per-drug API の並行取得（AIMD で 1〜MAX_CONCURRENCY の間を自動調整）
+DDINTER_HOST = "ddinter2.scbdd.com"
+MAX_CONCURRENCY = 16
+MAX_RATE = 10.0  # req/s 上限
+
+DRUG_PAGE_SIZE = 200  # drug-source の1ページ行数（--page-size で変更可）
+
 # ATCコード別CSV（DDinter2ダウンロードページ提供分）
 DDI_CSV_CODES = ["A", "B", "D", "H", "L", "P", "R", "V"]
 DDI_CSV_URL = f"{BASE_URL}/static/media/download/ddinter_downloads_code_{{code}}.csv"
+CSV_CHUNK_SIZE = 64 * 1024
+CSV_CHUNK_ROWS = 10_000   # 統合側へ渡すパース済み行の単位
+
+
+def _parse_drug_items(items: list) -> list[dict]:
+    """DataTablesレスポンスの各行をパース"""
+    drugs = []
+    for item in items:
+        # item は dict or list
+        if isinstance(item, dict):
+            drug = {
+                "DDInter_id": item.get("internalID", ""),
+                "Drug_Name": item.get("name", ""),
+                "DrugBank_ID": item.get("drugbank_id", ""),
+            }
+        elif isinstance(item, list):
+            # リスト形式の場合: [name, display, internalID, smiles, structure, drugbank_id, exist]
+            drug = {
+                "DDInter_id": item[2] if len(item) > 2 else "",
+                "Drug_Name": item[0] if len(item) > 0 else "",
+                "DrugBank_ID": item[5] if len(item) > 5 else "",
+            }
+        else:
+            continue
 
+        if drug["DDInter_id"]:
+            drugs.append(drug)
+    return drugs
 
-def fetch_all_drugs() -> list[dict]:
-    """DDinter2から全薬リストを取得（DataTables形式）"""
-    if DRUGS_OUTPUT.exists():
-        print(f"キャッシュ使用: {DRUGS_OUTPUT}")
-        with open(DRUGS_OUTPUT, encoding="utf-8") as f:
-            data = json.load(f)
-        return data["drugs"]
 
-    all_drugs = []
-    start = 0
-    page_size = 200
-    draw = 1
+async def _fetch_drug_pages(page_size: int) -> tuple[list[dict], int]:
+    """1ページ目で recordsTotal を得て、残りのページを並行取得（結果はオフセット順）
 
-    print("薬リスト取得中...")
-    while True:
+    戻り値: (薬リスト, 取得に失敗したページ数)
+    """
+    fetcher = AsyncFetcher(rates={DDINTER_HOST: MAX_RATE}, session=SESSION,
+                           timeout=30, max_concurrency=MAX_CONCURRENCY)
+
+    async def fetch_page(draw: int, start: int) -> dict | None:
         payload = {
             "draw": str(draw),
             "start": str(start),
             "length": str(page_size),
         }
-
+        resp = await fetcher.fetch(f"{BASE_URL}/server/drug-source/", method="POST", data=payload)
         try:
-            resp = SESSION.post(f"{BASE_URL}/server/drug-source/",
-                                data=payload, timeout=30)
             resp.raise_for_status()
-            data = resp.json()
+            return resp.json()
         except Exception as e:
             print(f"  ERROR start={start}: {e}")
-            # Try to parse as text
-            print(f"  Response: {resp.text[:200] if resp else 'N/A'}")
-            break
-
+            print(f"  Response: {resp.text[:200] if resp is not None else 'N/A'}")
+            return None
+
+    first = await fetch_page(1, 0)
+    if first is None:
+        fetcher.close()
+        return [], 1
+
+    items = first.get("data", [])
+    total = first.get("recordsTotal", 0)
+    all_drugs = _parse_drug_items(items)
+    print(f"  start=0: +{len(items)} (total: {len(all_drugs)}/{total})")
+
+    # サーバーが length を切り詰めた場合は実際の件数をページ幅とする
+    step = len(items) if 0 < len(items) < page_size else page_size
+    offsets = list(range(len(items), total, step)) if items else []
+    if step != page_size:
+        print(f"  ページ幅: {page_size} → {step}（サーバー上限）")
+
+    async def page(entry):
+        draw, start = entry
+        return await fetch_page(draw, start)
+
+    failed = 0
+    async for (_, start), data in ordered_map(page, enumerate(offsets, start=2)):
+        if data is None:
+            failed += 1
+            continue
         items = data.get("data", [])
-        total = data.get("recordsTotal", 0)
+        all_drugs.extend(_parse_drug_items(items))
+        print(f"  start={start}: +{len(items)} (total: {len(all_drugs)}/{total})")
 
-        if not items:
-            break
+    fetcher.close()
+    return all_drugs, failed
 
-        for item in items:
-            # DataTablesレスポンスの各行をパース
-            # item は dict or list
-            if isinstance(item, dict):
-                drug = {
-                    "DDInter_id": item.get("internalID", ""),
-                    "Drug_Name": item.get("name", ""),
-                    "DrugBank_ID": item.get("drugbank_id", ""),
-                }
-            elif isinstance(item, list):
-                # リスト形式の場合: [name, display, internalID, smiles, structure, drugbank_id, exist]
-                drug = {
-                    "DDInter_id": item[2] if len(item) > 2 else "",
-                    "Drug_Name": item[0] if len(item) > 0 else "",
-                    "DrugBank_ID": item[5] if len(item) > 5 else "",
-                }
-            else:
-                continue
-
-            if drug["DDInter_id"]:
-                all_drugs.append(drug)
 
-        print(f"  start={start}: +{len(items)} (total: {len(all_drugs)}/{total})")
+def fetch_all_drugs() -> list[dict]:
+    """DDinter2から全薬リストを取得（DataTables形式）
 
-        start += page_size
-        draw += 1
+    --page-size N で1リクエストの行数を指定（既定 200）。
+    取得に失敗したページがあれば "complete": false で書き出し、次回はキャッシュを使わず取り直す。
+    """
+    if DRUGS_OUTPUT.exists() and "--force" not in sys.argv:
+        with open(DRUGS_OUTPUT, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("complete", True):
+            print(f"キャッシュ使用: {DRUGS_OUTPUT}")
+            return data["drugs"]
+        print(f"前回の薬リストは未完了のため取り直します: {DRUGS_OUTPUT}")
 
-        if start >= total or len(items) < page_size:
-            break
+    page_size = DRUG_PAGE_SIZE
+    if "--page-size" in sys.argv:
+        page_size = int(sys.argv[sys.argv.index("--page-size") + 1])
 
-        time.sleep(REQUEST_DELAY)
+    print("薬リスト取得中...")
+    all_drugs, failed = asyncio.run(_fetch_drug_pages(page_size))
 
     # Save
     output = {
@@ -123,75 +179,161 @@ def fetch_all_drugs() -> list[dict]:
         "source_url": "https://ddinter2.scbdd.com/",
         "license": "CC-BY-NC-SA 4.0",
         "total_drugs": len(all_drugs),
+        "complete": failed == 0,
         "drugs": all_drugs,
     }
     with open(DRUGS_OUTPUT, "w", encoding="utf-8") as f:
         json.dump(output, f, ensure_ascii=False, indent=2)
 
-    print(f"薬リスト保存: {len(all_drugs)} 薬 → {DRUGS_OUTPUT}")
+    print(f"薬リスト保存: {len(all_drugs)} 薬 → {DRUGS_OUTPUT}"
+          + (f"（未完了: {failed} ページ取得失敗、再実行で取り直す）" if failed else ""))
     return all_drugs
 
 
-def fetch_ddis_from_csv() -> list[dict]:
-    """DDinter2のCSV一括ダウンロードからDDIを取得"""
-    all_ddis = []
-    seen_pairs = set()
-
-    for code in DDI_CSV_CODES:
-        url = DDI_CSV_URL.format(code=code)
-        print(f"  ATC code {code}: {url}")
-
-        try:
-            resp = SESSION.get(url, timeout=60)
-            resp.raise_for_status()
-        except Exception as e:
-            print(f"    ERROR: {e}")
-            continue
-
-        # Parse CSV
-        text = resp.text
-        reader = csv.reader(io.StringIO(text))
+def _level_num(level: str) -> str:
+    """Level → numeric: Major=3, Moderate=2, Minor=1"""
+    level = level.lower()
+    if "major" in level:
+        return "3"
+    if "moderate" in level:
+        return "2"
+    if "minor" in level:
+        return "1"
+    return "2"  # default
+
+
+class _IdInterner:
+    """DDInter ID 文字列 → 連番 int（スレッド間で共有）"""
+
+    def __init__(self):
+        self.index = {}
+        self.ids = []
+        self._lock = threading.Lock()
+
+    def __call__(self, dd_id: str) -> int:
+        idx = self.index.get(dd_id)
+        if idx is None:
+            with self._lock:
+                idx = self.index.get(dd_id)
+                if idx is None:
+                    idx = len(self.ids)
+                    self.ids.append(dd_id)
+                    self.index[dd_id] = idx
+        return idx
+
+
+def _stream_ddi_csv(code: str, intern: _IdInterner) -> Iterator[list[tuple]]:
+    """1つのATCコード別CSVをストリーミングで読み、(a, b, level, name_a, name_b) を
+    CSV_CHUNK_ROWS 行ずつ返す（取得・読み取りの失敗は例外）
+
+    a, b は整数ID。薬名はその行の表記を持つ（同じ文字列はファイル内で1つのオブジェクトを共有）。
+    """
+    url = DDI_CSV_URL.format(code=code)
+    resp = SESSION.get(url, timeout=60, stream=True)
+    try:
+        resp.raise_for_status()
+        lines = (line.decode("utf-8", errors="replace")
+                 for line in resp.iter_lines(chunk_size=CSV_CHUNK_SIZE))
+        reader = csv.reader(lines)
         header = next(reader, None)
-        print(f"    Header: {header}")
+        print(f"  ATC code {code}: {url}\n    Header: {header}")
 
-        count = 0
+        chunk = []
+        names = {}
         for row in reader:
             if len(row) < 5:
                 continue
 
             # DDInterID_A, Drug_A, DDInterID_B, Drug_B, Level
-            dd_id_a = row[0].strip()
-            drug_a = row[1].strip()
-            dd_id_b = row[2].strip()
-            drug_b = row[3].strip()
-            level = row[4].strip()
-
-            pair_key = tuple(sorted([dd_id_a, dd_id_b]))
-            if pair_key in seen_pairs:
+            name_a = names.setdefault(row[1].strip(), row[1].strip())
+            name_b = names.setdefault(row[3].strip(), row[3].strip())
+            chunk.append((intern(row[0].strip()), intern(row[2].strip()),
+                          _level_num(row[4].strip()), name_a, name_b))
+            if len(chunk) >= CSV_CHUNK_ROWS:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        resp.close()
+
+
+_END = object()
+
+
+def _feed_chunks(code: str, intern: _IdInterner, out: queue.Queue, stop: threading.Event):
+    """_stream_ddi_csv の chunk を out に入れる（スレッドで実行）。最後に _END か例外を入れる
+
+    out は maxsize=1 なので、統合側が取り出すまで次の chunk は読まない（読み取りが止まる）。
+    stop が立ったら読むのをやめて接続を閉じる。
+    """
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.5)
+                return True
+            except queue.Full:
                 continue
-            seen_pairs.add(pair_key)
+        return False
 
-            # Level → numeric: Major=3, Moderate=2, Minor=1
-            level_num = "2"  # default
-            if "major" in level.lower():
-                level_num = "3"
-            elif "moderate" in level.lower():
-                level_num = "2"
-            elif "minor" in level.lower():
-                level_num = "1"
+    try:
+        with closing(_stream_ddi_csv(code, intern)) as chunks:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+        put(_END)
+    except Exception as e:
+        put(e)
 
-            all_ddis.append({
-                "drug_a": dd_id_a,
-                "drug_b": dd_id_b,
-                "drug_a_name": drug_a,
-                "drug_b_name": drug_b,
-                "level": level_num,
-                "mechanism": "",
-            })
-            count += 1
 
-        print(f"    DDI取得: {count}")
-        time.sleep(REQUEST_DELAY)
+def fetch_ddis_from_csv() -> list[dict]:
+    """DDinter2のCSV一括ダウンロードからDDIを取得
+
+    8つのATCコード別CSVを並行にストリーミング取得・パースし、chunk 単位で
+    DDI_CSV_CODES の順に統合する（重複除去・薬名の選択は逐次処理と同じ）。
+    コードごとに先読みは1 chunk までなので、パース済みの行は 1ファイルあたり数 chunk しか持たない。
+    途中で失敗したコードは、そのコードで追加した分を取り消して使わない。
+    """
+    all_ddis = []
+    seen_pairs = set()
+    intern = _IdInterner()
+    stop = threading.Event()
+    queues = {code: queue.Queue(maxsize=1) for code in DDI_CSV_CODES}
+    for code in DDI_CSV_CODES:
+        threading.Thread(target=_feed_chunks, args=(code, intern, queues[code], stop), daemon=True).start()
+
+    try:
+        for code in DDI_CSV_CODES:
+            mark = len(all_ddis)
+            added = []
+            while True:
+                item = queues[code].get()
+                if item is _END:
+                    print(f"    {code}: DDI取得: {len(added)}")
+                    break
+                if isinstance(item, Exception):
+                    print(f"  ATC code {code}: ERROR: {item}")
+                    seen_pairs.difference_update(added)
+                    del all_ddis[mark:]
+                    break
+
+                for a, b, level_num, name_a, name_b in item:
+                    pair_key = (a << 32 | b) if a < b else (b << 32 | a)
+                    if pair_key in seen_pairs:
+                        continue
+                    seen_pairs.add(pair_key)
+                    added.append(pair_key)
+
+                    all_ddis.append({
+                        "drug_a": intern.ids[a],
+                        "drug_b": intern.ids[b],
+                        "drug_a_name": name_a,
+                        "drug_b_name": name_b,
+                        "level": level_num,
+                        "mechanism": "",
+                    })
+    finally:
+        stop.set()
 
     return all_ddis
 
@@ -243,52 +385,118 @@ def fetch_ddis_from_api(drugs: list[dict]) -> list[dict]:
         if start >= total or len(items) < page_size:
             break
 
-        time.sleep(REQUEST_DELAY)
+        throttle_sleep(DDINTER_HOST, REQUEST_DELAY)
 
     return all_ddis
 
 
-def fetch_ddis_per_drug(drugs: list[dict]) -> list[dict]:
-    """各薬のDDI情報を個別取得（grapher-datasource）"""
-    all_ddis = []
-    seen_pairs = set()
-    errors = 0
+def _japan_ddinter_ids() -> set[str]:
+    """drug_master.json（new_03 の前回出力）で日本販売薬と分かっている DDInter ID"""
+    if not DRUG_MASTER.exists():
+        return set()
+    with open(DRUG_MASTER, encoding="utf-8") as f:
+        master = json.load(f)
+    return {d["ddinter_id"] for d in master.get("drugs", [])
+            if d.get("ddinter_id") and (d.get("yakka_matched") or d.get("name_ja"))}
 
-    for i, drug in enumerate(drugs):
-        dd_id = drug.get("DDInter_id", "")
-        if not dd_id:
-            continue
 
-        url = f"{BASE_URL}/server/grapher-datasource/{dd_id}/"
+def _known_degree(done: dict) -> Counter:
+    """既知DDI（前回出力 + ジャーナル）での DDInter ID ごとの相手数"""
+    pairs = [(dd_id, p[0]) for dd_id, partners in done.items() for p in partners]
+    if DDI_OUTPUT.exists():
+        with open(DDI_OUTPUT, encoding="utf-8") as f:
+            pairs += [(d["drug_a"], d["drug_b"]) for d in json.load(f).get("interactions", [])]
+    return partner_degree(pairs)
 
-        try:
-            resp = SESSION.get(url, timeout=30)
-            resp.raise_for_status()
-            data = resp.json()
-        except Exception as e:
-            errors += 1
-            if errors <= 5:
-                print(f"  ERROR {dd_id}: {e}")
-            continue
 
-        # grapher-datasource format: {info: {id, Name}, interactions: [{id, name, level[], actions[]}, ...]}
-        interactions = data.get("interactions", [])
+def fetch_ddis_per_drug(drugs: list[dict], budget: TimeBudget = None) -> tuple[list[dict], bool]:
+    """各薬のDDI情報を個別取得（grapher-datasource）
 
-        for ix in interactions:
-            partner_id = ix.get("id", "")
-            partner_name = ix.get("name", "")
-            levels = ix.get("level", [])
-            # level is array like [3] or [2, 1] → take max
-            level = str(max(levels)) if levels else "2"
+    AIMD で同時実行数を自動調整しながら並行取得する。
+    取得は優先順（日本販売薬 → 既知DDIの相手が多い薬 → 残り）、
+    結果は薬ごとにジャーナルへ追記するので中断しても続きから取得できる。
+    重複除去は薬リスト順に行うので、結果は逐次取得と同じ。
+    404 などの恒久的な 4xx は「DDIなし」としてジャーナルに記録し、取り直さない。
+    戻り値は (DDIリスト, 時間予算で止めず一時的なエラーも無く全薬を処理したか)。
+    """
+    return asyncio.run(_fetch_ddis_per_drug(drugs, budget or TimeBudget()))
 
-            if not partner_id:
+
+async def _fetch_ddis_per_drug(drugs: list[dict], budget: TimeBudget) -> tuple[list[dict], bool]:
+    errors = 0
+    permanent = 0
+    stopped = False
+    journal = Journal(PER_DRUG_JOURNAL)
+    done = journal.replay()  # dd_id → [[partner_id, partner_name, level], ...]
+    if done:
+        print(f"  ジャーナルから再開: {len(done)} 薬取得済み")
+
+    todo = [d for d in drugs if d.get("DDInter_id") and d["DDInter_id"] not in done]
+    preferred = _japan_ddinter_ids()
+    todo = priority_order(todo, lambda d: d["DDInter_id"], preferred, _known_degree(done))
+    print(f"  取得対象: {len(todo)} 薬（うち日本販売薬 {sum(d['DDInter_id'] in preferred for d in todo)}）")
+
+    limiter = AimdLimiter(initial=2, maximum=MAX_CONCURRENCY)
+    fetcher = AsyncFetcher(rates={DDINTER_HOST: MAX_RATE}, session=SESSION,
+                           timeout=30, retries=2, limiter=limiter)
+
+    async def fetch(entry):
+        _, drug = entry
+        return await fetcher.fetch(f"{BASE_URL}/server/grapher-datasource/{drug['DDInter_id']}/")
+
+    async with aclosing(ordered_map(fetch, enumerate(todo, start=1), window=MAX_CONCURRENCY * 2)) as results:
+        async for (i, drug), resp in results:
+            if budget.expired:
+                stopped = True
+                break
+            dd_id = drug["DDInter_id"]
+
+            if resp is not None and 400 <= resp.status_code < 500 and resp.status_code not in RETRY_STATUS:
+                permanent += 1
+                if permanent <= 5:
+                    print(f"  SKIP {dd_id}: HTTP {resp.status_code}")
+                done[dd_id] = []
+                journal.append(dd_id, [])
+                continue
+
+            try:
+                if resp is None:
+                    raise RuntimeError("no response")
+                resp.raise_for_status()
+                data = resp.json()
+            except Exception as e:
+                errors += 1
+                if errors <= 5:
+                    print(f"  ERROR {dd_id}: {e}")
                 continue
 
+            # grapher-datasource format: {info: {id, Name}, interactions: [{id, name, level[], actions[]}, ...]}
+            partners = []
+            for ix in data.get("interactions", []):
+                levels = ix.get("level", [])
+                # level is array like [3] or [2, 1] → take max
+                level = str(max(levels)) if levels else "2"
+                if ix.get("id"):
+                    partners.append([ix["id"], ix.get("name", ""), level])
+            done[dd_id] = partners
+            journal.append(dd_id, partners)
+
+            if i % 100 == 0:
+                print(f"  進捗: {i}/{len(todo)}, err: {errors}, 並行数: {int(limiter.limit)}")
+
+    journal.close()
+    fetcher.close()
+
+    # 薬リスト順に組み立て（重複ペアは先に出た薬の側を残す）
+    all_ddis = []
+    seen_pairs = set()
+    for drug in drugs:
+        dd_id = drug.get("DDInter_id", "")
+        for partner_id, partner_name, level in done.get(dd_id, ()):
             pair_key = tuple(sorted([dd_id, partner_id]))
             if pair_key in seen_pairs:
                 continue
             seen_pairs.add(pair_key)
-
             all_ddis.append({
                 "drug_a": dd_id,
                 "drug_b": partner_id,
@@ -298,13 +506,27 @@ def fetch_ddis_per_drug(drugs: list[dict]) -> list[dict]:
                 "mechanism": "",
             })
 
-        if (i + 1) % 100 == 0:
-            print(f"  進捗: {i+1}/{len(drugs)}, DDI: {len(all_ddis)}, err: {errors}")
+    # 一時的なエラーの薬はジャーナルに無いので、完了扱いにせず次回取り直す
+    complete = not stopped and errors == 0
+    print(f"DDI取得完了: {len(all_ddis)} ペア, エラー: {errors}, 恒久エラー(4xx): {permanent}, "
+          f"取得済み {len(done)} 薬{'' if complete else '（未完了: 再実行で続きを取得）'}")
+    return all_ddis, complete
 
-        time.sleep(REQUEST_DELAY)
 
-    print(f"DDI取得完了: {len(all_ddis)} ペア, エラー: {errors}")
-    return all_ddis
+def save_ddis(all_ddis: list[dict], complete: bool = True):
+    """DDI を書き出す。per-drug 取得が最後まで終わったらジャーナルを消す"""
+    output = {
+        "source": "DDinter 2.0",
+        "license": "CC-BY-NC-SA 4.0",
+        "total_interactions": len(all_ddis),
+        "complete": complete,
+        "interactions": all_ddis,
+    }
+    with open(DDI_OUTPUT, "w", encoding="utf-8") as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"保存: {DDI_OUTPUT}")
+    if complete and PER_DRUG_JOURNAL.exists():
+        PER_DRUG_JOURNAL.unlink()
 
 
 def main():
@@ -322,11 +544,19 @@ def main():
         print(f"  Sample: {json.dumps(d, ensure_ascii=False)[:200]}")
 
     # === Phase 2: DDI ===
-    if DDI_OUTPUT.exists():
-        print(f"\nキャッシュ使用: {DDI_OUTPUT}")
+    ddi_data = None
+    if DDI_OUTPUT.exists() and "--force" not in sys.argv:
         with open(DDI_OUTPUT, encoding="utf-8") as f:
             ddi_data = json.load(f)
+
+    if ddi_data is not None and ddi_data.get("complete", True):
+        print(f"\nキャッシュ使用: {DDI_OUTPUT}")
         all_ddis = ddi_data["interactions"]
+    elif ddi_data is not None:
+        # 前回 --time-budget で中断した per-drug 取得の続き
+        print(f"\n=== Phase 2: DDI取得（前回中断分の続き） ===")
+        all_ddis, complete = fetch_ddis_per_drug(drugs, TimeBudget.from_argv())
+        save_ddis(all_ddis, complete)
     else:
         print(f"\n=== Phase 2: DDI取得 ===")
 
@@ -336,23 +566,15 @@ def main():
         print(f"CSV DDI: {len(csv_ddis)}")
 
         # Strategy 2: 残りは per-drug API
+        complete = True
         if len(csv_ddis) > 0:
             all_ddis = csv_ddis
             print("CSV DDIで十分なデータ取得。per-drug APIはスキップ。")
         else:
             print("\nCSV取得失敗。per-drug APIで取得...")
-            all_ddis = fetch_ddis_per_drug(drugs)
-
-        # Save
-        output = {
-            "source": "DDinter 2.0",
-            "license": "CC-BY-NC-SA 4.0",
-            "total_interactions": len(all_ddis),
-            "interactions": all_ddis,
-        }
-        with open(DDI_OUTPUT, "w", encoding="utf-8") as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
-        print(f"保存: {DDI_OUTPUT}")
+            all_ddis, complete = fetch_ddis_per_drug(drugs, TimeBudget.from_argv())
+
+        save_ddis(all_ddis, complete)
 
     # Stats
     levels = Counter(d["level"] for d in all_ddis)
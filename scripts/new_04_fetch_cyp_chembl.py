@@ -7,16 +7,21 @@ ChEMBL REST API から CYP代謝データを取得。
 ライセンス: CC BY-SA 3.0
 
 API: GET /chembl/api/data/metabolism/
-     パラメータ: format=json, metabolizing_enzyme_name=CYP3A4 等
+     パラメータ: format=json, enzyme_name__iregex=(cytochrome p450|cyp) 等
+     既定は CYP 絞り込み・最大ページ幅・オフセット並行取得。
+     --full-scan で従来の全件走査（limit=100 を逐次）。
 
 出力: data/cyp_data.json
 """
 
+import asyncio
 import json
-import time
+import sys
 from pathlib import Path
 
-import requests
+from fetch_engine import AsyncFetcher, ordered_map
+from fetch_telemetry import throttle_sleep
+from http_cache import CachedSession
 
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR.parent / "data"
@@ -24,7 +29,7 @@ OUTPUT = DATA_DIR / "cyp_data.json"
 DRUG_MASTER = DATA_DIR / "drug_master.json"
 
 BASE_URL = "https://www.ebi.ac.uk/chembl/api/data"
-SESSION = requests.Session()
+SESSION = CachedSession()
 SESSION.headers.update({
     "Accept": "application/json",
     "User-Agent": "kusuri-research/1.0",
@@ -51,18 +56,97 @@ CYP_CHEMBL_TARGETS = {
 
 REQUEST_DELAY = 0.5
 
+# サーバー側絞り込み（既定モード）
+CHEMBL_HOST = "www.ebi.ac.uk"
+CHEMBL_RATE = 5.0          # req/s
+CHEMBL_PAGE_SIZE = 1000    # ChEMBL API の limit 上限
+MAX_CONCURRENCY = 4
+METABOLISM_FILTER = {"enzyme_name__iregex": "(cytochrome p450|cyp)"}
+METABOLISM_FIELDS = "enzyme_name,substrate_name"
 
-def fetch_cyp_metabolism() -> dict:
-    """ChEMBLからCYP代謝情報を取得"""
-    if OUTPUT.exists():
-        print(f"キャッシュ使用: {OUTPUT}")
-        with open(OUTPUT, encoding="utf-8") as f:
-            return json.load(f)
 
-    cyp_map = {}  # drug_name → [cyp_enzymes]
+def match_cyp(enzyme: str) -> str | None:
+    """酵素名を CYP_ENZYMES のいずれかに対応付ける
 
-    # Method 1: metabolism endpoint
-    print("=== ChEMBL metabolism endpoint ===")
+    "CYP3A4" / "Cytochrome P450 3A4" / "cytochrome P-450 2C19" などを同一視する。
+    """
+    key = enzyme.upper().replace(" ", "").replace("-", "")
+    key = key.replace("CYTOCHROMEP450", "CYP")
+    for cyp in CYP_ENZYMES:
+        if cyp in key:
+            return cyp
+    return None
+
+
+def add_metabolism(cyp_map: dict, items: list) -> int:
+    """metabolism レコードを cyp_map（薬名小文字 → CYP の set）に追加。追加件数を返す"""
+    found = 0
+    for item in items:
+        enzyme = item.get("enzyme_name") or item.get("metabolizing_enzyme_name") or ""
+        substrate = item.get("substrate_name") or ""
+
+        if not enzyme or not substrate:
+            continue
+
+        # CYPのみ対象
+        matched_cyp = match_cyp(enzyme)
+        if not matched_cyp:
+            continue
+
+        cyp_map.setdefault(substrate.lower(), set()).add(matched_cyp)
+        found += 1
+    return found
+
+
+async def _fetch_metabolism_filtered() -> list[dict]:
+    """CYP 酵素の metabolism レコードだけをサーバー側で絞り込んで取得
+
+    1ページ目で total_count を得て、残りのオフセットを並行に取得する。
+    取得に失敗したページがあれば一部だけのデータをキャッシュしないよう RuntimeError で止める。
+    """
+    url = f"{BASE_URL}/metabolism.json"
+    fetcher = AsyncFetcher(rates={CHEMBL_HOST: CHEMBL_RATE}, session=SESSION,
+                           timeout=60, max_concurrency=MAX_CONCURRENCY)
+
+    async def fetch_page(offset: int) -> dict | None:
+        params = {**METABOLISM_FILTER, "only": METABOLISM_FIELDS,
+                  "offset": offset, "limit": CHEMBL_PAGE_SIZE}
+        resp = await fetcher.fetch(url, params=params)
+        try:
+            resp.raise_for_status()
+            return resp.json()
+        except Exception as e:
+            print(f"  ERROR offset={offset}: {e}")
+            return None
+
+    first = await fetch_page(0)
+    if first is None:
+        fetcher.close()
+        raise RuntimeError("ChEMBL metabolism: offset=0 の取得に失敗")
+
+    items = list(first.get("metabolisms", []))
+    total_count = first.get("page_meta", {}).get("total_count", 0)
+    # limit が上限より小さく切り詰められた場合は実際のページ幅で進める
+    step = first.get("page_meta", {}).get("limit") or CHEMBL_PAGE_SIZE
+    print(f"  offset=0: +{len(items)} (total_api={total_count})")
+
+    failed = []
+    async for offset, data in ordered_map(fetch_page, range(step, total_count, step)):
+        if data is None:
+            failed.append(offset)
+            continue
+        results = data.get("metabolisms", [])
+        items.extend(results)
+        print(f"  offset={offset}: +{len(results)} ({len(items)}/{total_count})")
+
+    fetcher.close()
+    if failed:
+        raise RuntimeError(f"ChEMBL metabolism: {len(failed)} ページの取得に失敗（offset={failed[:5]}）")
+    return items
+
+
+def _scan_metabolism_full(cyp_map: dict):
+    """metabolism エンドポイントを全件走査して CYP のみ拾う（--full-scan）"""
     url = f"{BASE_URL}/metabolism.json"
     offset = 0
     limit = 100
@@ -84,29 +168,7 @@ def fetch_cyp_metabolism() -> dict:
         if not results:
             break
 
-        for item in results:
-            enzyme = item.get("metabolizing_enzyme_name", "")
-            substrate = item.get("substrate_name", "")
-
-            if not enzyme or not substrate:
-                continue
-
-            # CYPのみ対象
-            enzyme_upper = enzyme.upper().replace(" ", "")
-            matched_cyp = None
-            for cyp in CYP_ENZYMES:
-                if cyp in enzyme_upper:
-                    matched_cyp = cyp
-                    break
-
-            if not matched_cyp:
-                continue
-
-            sub_lower = substrate.lower()
-            if sub_lower not in cyp_map:
-                cyp_map[sub_lower] = set()
-            cyp_map[sub_lower].add(matched_cyp)
-            total_found += 1
+        total_found += add_metabolism(cyp_map, results)
 
         total_count = data.get("page_meta", {}).get("total_count", 0)
         offset += limit
@@ -115,7 +177,25 @@ def fetch_cyp_metabolism() -> dict:
         if offset >= total_count or not results:
             break
 
-        time.sleep(REQUEST_DELAY)
+        throttle_sleep(CHEMBL_HOST, REQUEST_DELAY)
+
+
+def fetch_cyp_metabolism() -> dict:
+    """ChEMBLからCYP代謝情報を取得"""
+    if OUTPUT.exists() and "--force" not in sys.argv:
+        print(f"キャッシュ使用: {OUTPUT}")
+        with open(OUTPUT, encoding="utf-8") as f:
+            return json.load(f)
+
+    cyp_map = {}  # drug_name → [cyp_enzymes]
+
+    # Method 1: metabolism endpoint
+    print("=== ChEMBL metabolism endpoint ===")
+    if "--full-scan" in sys.argv:
+        _scan_metabolism_full(cyp_map)
+    else:
+        items = asyncio.run(_fetch_metabolism_filtered())
+        print(f"  CYPレコード: {add_metabolism(cyp_map, items)} / {len(items)}")
 
     # Method 2: 既知のCYP-薬マッピング（ChEMBL文献ベース）
     # 主要薬のCYP代謝は広く知られている - フォールバック
@@ -5,16 +5,22 @@ JADER副作用データの処理（既存 03_fetch_jader.py のロジック再
 
 JADER（Japanese Adverse Drug Event Report database）は厚労省の副作用報告DB。
 手動DLが必要（PMDAサイト）→ data/jader_raw/ に配置。
-未入手時はフォールバック（クラスベース副作用推定）を使用。
+drug.csv × reac.csv を症例IDで結合して数えた 被疑薬→有害事象 の症例数（jader_aggregate）
+から不均衡分析（PRR / ROR / IC, jader_signals）でシグナルのある有害事象を選ぶ。
+未入手時・JADER に一致する一般名が無い薬はフォールバック（クラスベース副作用推定）を使用。
 
 出力: data/adverse_effects_new.json
 """
 
 import json
 import re
+import sys
 from pathlib import Path
 from collections import defaultdict, Counter
 
+from jader_aggregate import aggregate_jader, jader_drug_key
+from jader_signals import Signals, compute_signals
+
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR.parent / "data"
 JADER_DIR = DATA_DIR / "jader_raw"
@@ -224,6 +230,34 @@ def generate_adverse_effects(drugs: list[dict]) -> list[dict]:
     return results
 
 
+def jader_adverse_effects(drugs: list[dict], signals: Signals) -> list[dict]:
+    """JADER のシグナル（PRR / ROR / IC）から副作用を作る（一般名が一致しない・シグナルが無い薬はクラスベース）"""
+    counts = signals.counts
+    fallback = {r["drug_id"]: r for r in generate_adverse_effects(drugs)}
+    results = []
+    matched = 0
+    for drug in drugs:
+        # 薬価収載名 → 日本語名 の順に JADER の一般名と正規化キーで照合（複数一致なら症例数の多い方）
+        codes = [counts.drug_index.get(jader_drug_key(drug.get(key, ""))) for key in ("yakka_name", "name_ja")]
+        codes = [c for c in codes if c is not None]
+        code = max(codes, key=lambda c: counts.drug_cases[c]) if codes else None
+        effects = signals.top_events(code) if code is not None else []
+        if not effects:
+            results.append(dict(fallback[drug["id"]], source="class"))
+            continue
+        matched += 1
+        results.append({
+            "drug_id": drug["id"],
+            "name_en": drug.get("name_en", ""),
+            "drug_classes": fallback[drug["id"]]["drug_classes"],
+            "source": "JADER",
+            "jader_cases": int(counts.drug_cases[code]),
+            "adverse_effects": effects,
+        })
+    print(f"JADER一般名に一致: {matched}/{len(drugs)} 薬")
+    return results
+
+
 def main():
     if not DRUG_MASTER.exists():
         print(f"ERROR: {DRUG_MASTER} not found. Run new_03 first.")
@@ -235,19 +269,19 @@ def main():
     drugs = master["drugs"]
     print(f"Drug master: {len(drugs)} 薬")
 
-    # Check if JADER raw data exists
-    has_jader = JADER_DIR.exists() and (JADER_DIR / "drug.csv").exists()
-
-    if has_jader:
-        print("JADER生データを検出。JADER処理を実行...")
-        # Future: implement full JADER processing
-        print("（未実装 - フォールバック使用）")
-
-    print("クラスベース副作用推定を使用")
-    results = generate_adverse_effects(drugs)
+    counts = aggregate_jader(JADER_DIR, suspect_only="--all-drugs" not in sys.argv,
+                             drug_key=jader_drug_key)
+    if counts is not None:
+        print("JADER生データを検出。JADER集計を使用")
+        results = jader_adverse_effects(drugs, compute_signals(counts))
+        source = "JADER (PMDA) + class-based estimation for unmatched drugs"
+    else:
+        print("クラスベース副作用推定を使用")
+        results = generate_adverse_effects(drugs)
+        source = "Class-based estimation (JADER fallback)"
 
     output = {
-        "source": "Class-based estimation (JADER fallback)",
+        "source": source,
         "total_drugs": len(results),
         "adverse_effects": results,
     }
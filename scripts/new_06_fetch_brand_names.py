@@ -10,22 +10,17 @@ SSK薬価基準マスターから商品名（ブランド名）を取得。
 出力: data/brand_names_new.json
 """
 
-import csv
 import json
-import os
 import re
-import zipfile
-import urllib.request
 from pathlib import Path
 
+from ssk_master import SskRow, download_ssk_master, load_ssk_columns
+
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR.parent / "data"
 DRUG_MASTER = DATA_DIR / "drug_master.json"
 OUTPUT = DATA_DIR / "brand_names_new.json"
 
-SSK_ZIP_URL = "https://www.ssk.or.jp/seikyushiharai/tensuhyo/kihonmasta/r06/kihonmasta_04.files/y_ALL20260219.zip"
-SSK_CACHE = DATA_DIR / "ssk_yakka_master.csv"
-
 DOSAGE_FORMS = [
     "ドライシロップ", "シロップ", "カプセル", "ローション",
     "エアゾール", "パッチ", "フィルム", "ペースト", "リキッド",
@@ -35,26 +30,7 @@ DOSAGE_FORMS = [
     "ゲル", "粉末",
 ]
 
-
-def download_ssk_master() -> Path:
-    """SSK薬価マスターをダウンロード"""
-    if SSK_CACHE.exists():
-        print(f"キャッシュ使用: {SSK_CACHE}")
-        return SSK_CACHE
-
-    print(f"SSKマスターダウンロード: {SSK_ZIP_URL}")
-    zip_path = str(SSK_CACHE) + ".zip"
-    urllib.request.urlretrieve(SSK_ZIP_URL, zip_path)
-
-    with zipfile.ZipFile(zip_path, "r") as zf:
-        names = zf.namelist()
-        csv_name = [n for n in names if n.endswith(".csv")][0]
-        with zf.open(csv_name) as src, open(SSK_CACHE, "wb") as dst:
-            dst.write(src.read())
-
-    os.remove(zip_path)
-    print(f"保存: {SSK_CACHE}")
-    return SSK_CACHE
+SSK_CACHE_VERSION = 1  # ssk_brand_row の処理を変えたら上げる（列キャッシュの作り直し）
 
 
 def extract_base_name(full_name: str) -> str:
@@ -77,34 +53,31 @@ def extract_ingredient_name(generic_str: str) -> str:
     return extract_base_name(name)
 
 
-def parse_ssk_master(csv_path: Path) -> dict:
-    """SSKマスターから 一般名→商品名 マッピング構築"""
-    with open(csv_path, encoding="shift_jis", errors="replace") as f:
-        rows = list(csv.reader(f))
-
-    ingredient_brands = {}
-    for r in rows:
-        if len(r) < 38:
-            continue
-        brand_full = r[4].strip()
-        generic_raw = r[37].strip()
+def ssk_brand_row(r: SskRow) -> tuple[str, str] | None:
+    """SSK 1行 → (成分名, 商品名の基本名)。【般】の無い行・短すぎる名前は None"""
+    if not r.generic.startswith("【般】"):
+        return None
 
-        if not generic_raw.startswith("【般】"):
-            continue
+    ingredient = extract_ingredient_name(r.generic)
+    if len(ingredient) < 2:
+        return None
 
-        ingredient = extract_ingredient_name(generic_raw)
-        if len(ingredient) < 2:
-            continue
+    brand_base = extract_base_name(r.brand)
+    if len(brand_base) < 2:
+        return None
+    return ingredient, brand_base
 
-        brand_base = extract_base_name(brand_full)
-        if len(brand_base) < 2:
-            continue
-
-        if ingredient not in ingredient_brands:
-            ingredient_brands[ingredient] = set()
 
+def parse_ssk_master(ssk_path: Path) -> dict:
+    """SSKマスターから 一般名→商品名 マッピングを構築（正規化済みの行はキャッシュから読む）"""
+    table = load_ssk_columns("brands_new06", ("ingredient", "brand"), ssk_brand_row,
+                             SSK_CACHE_VERSION, ssk_path)
+    ingredient_brands = {}
+    for ingredient, brand_base in zip(table["ingredient"], table["brand"]):
+        brands = ingredient_brands.setdefault(ingredient, set())
+        # Only add if different from ingredient name
         if brand_base != ingredient and not brand_base.startswith(ingredient):
-            ingredient_brands[ingredient].add(brand_base)
+            brands.add(brand_base)
 
     return ingredient_brands
 
@@ -149,10 +122,10 @@ def main():
     print(f"Drug master: {len(drugs)} 薬")
 
     # Download SSK
-    csv_path = download_ssk_master()
+    ssk_path = download_ssk_master()
 
     # Parse
-    ingredient_brands = parse_ssk_master(csv_path)
+    ingredient_brands = parse_ssk_master(ssk_path)
     total_brands = sum(len(v) for v in ingredient_brands.values())
     print(f"SSK: {len(ingredient_brands)} 成分, {total_brands} ユニーク商品名")
 
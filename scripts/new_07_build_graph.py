@@ -9,7 +9,7 @@ new_07_build_graph.py
   data/cyp_data.json           — CYP代謝情報
   data/adverse_effects_new.json — 副作用
   data/brand_names_new.json    — 商品名
-  data/ssk_yakka_master.csv    — SSK薬価基準マスター（薬効分類コード取得）
+  data/ssk_yakka_master.zip    — SSK薬価基準マスター（薬効分類コード取得。旧 .csv も可）
   /tmp/mhlw_drugs.xlsx         — 厚労省薬価基準Excel（注射薬）
   /tmp/mhlw_usage.xlsx         — 厚労省薬価基準Excel（内用薬）
   data/wikidata_atc.json       — Wikidata DrugBank→ATCマッピング
@@ -18,8 +18,6 @@ new_07_build_graph.py
   data/graph/graph-light.json  — Cytoscape.js用グラフデータ
 """
 
-import csv
-import io
 import json
 import re
 import subprocess
@@ -27,9 +25,14 @@ import sys
 from pathlib import Path
 from collections import Counter, defaultdict
 
+from checkpoint_journal import write_json_atomic
+from ssk_master import SskRow, file_sha256, load_ssk_columns
+from xlsx_reader import iter_xlsx_columns
+
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR.parent / "data"
 GRAPH_DIR = DATA_DIR / "graph"
+CACHE_DIR = DATA_DIR / "cache"
 
 INPUT_FILES = {
     "drug_master": DATA_DIR / "drug_master.json",
@@ -39,9 +42,9 @@ INPUT_FILES = {
     "brand_names": DATA_DIR / "brand_names_new.json",
 }
 
-SSK_CSV = DATA_DIR / "ssk_yakka_master.csv"
 OLD_GRAPH = GRAPH_DIR / "graph-light.json"
 MHLW_EXCELS = [Path("/tmp/mhlw_drugs.xlsx"), Path("/tmp/mhlw_usage.xlsx")]
+MHLW_CACHE_VERSION = 1
 WIKIDATA_ATC = DATA_DIR / "wikidata_atc.json"
 
 OUTPUT = GRAPH_DIR / "graph-light.json"
@@ -378,6 +381,7 @@ SSK_DOSAGE_FORMS = [
     "点鼻", "注射", "軟膏", "顆粒", "細粒", "散", "錠", "液",
     "坐剤", "ゼリー", "ゲル", "粉末",
 ]
+SSK_CACHE_VERSION = 1  # _ssk_category_row の処理を変えたら上げる（列キャッシュの作り直し）
 
 
 def _extract_ssk_ingredient(generic: str) -> str:
@@ -393,6 +397,28 @@ def _extract_ssk_ingredient(generic: str) -> str:
     return name
 
 
+def _ssk_category_row(row: SskRow) -> tuple[str, str, str] | None:
+    """SSK 1行 → (4桁コード, 一般名, 商品名の基本名)。使わない一般名・商品名は空文字"""
+    yj = row.yj_code
+    if len(yj) < 4:
+        return None
+
+    ing = ""
+    if row.generic.startswith("【般】"):
+        ing = _extract_ssk_ingredient(row.generic)
+        if len(ing) < 2:
+            ing = ""
+
+    brand = row.brand
+    for form in sorted(SSK_DOSAGE_FORMS, key=len, reverse=True):
+        idx = brand.find(form)
+        if idx > 0:
+            brand = brand[:idx]
+            break
+    brand = re.sub(r"[\d０-９．・％%ｍｇμＬ]+$", "", brand).strip()
+    return yj[:4], ing, brand if len(brand) >= 2 else ""
+
+
 def _clean_biosimilar(name: str) -> str:
     """バイオシミラー名から後続品表記・括弧を除去
     例: アダリムマブ［アダリムマブ後続１］ → アダリムマブ
@@ -424,33 +450,54 @@ def _atc_to_jtc(atc_code: str) -> str:
     return ""
 
 
+def _parse_mhlw_excel(xlsx_path: Path) -> tuple[dict, int]:
+    """厚労省 Excel 1冊の 成分名→4桁コード（B列: 12桁コード, C列: 成分名）と使った行数"""
+    name_to_code = {}
+    count = 0
+    for i, (code12, ingredient) in enumerate(iter_xlsx_columns(xlsx_path, (1, 2))):
+        if i == 0:
+            continue  # ヘッダー行
+        code12 = str(code12 or "").strip()   # 数字だけのコードは数値セルのことがある
+        ingredient = str(ingredient or "").strip()
+        if len(code12) >= 4 and ingredient:
+            name_to_code.setdefault(ingredient, code12[:4])
+            count += 1
+    return name_to_code, count
+
+
 def _load_mhlw_excel() -> dict:
-    """厚労省薬価基準Excelから成分名→4桁薬効分類コード辞書を構築"""
-    mhlw_dict = {}
-    try:
-        import openpyxl
-    except ImportError:
-        print("  MHLW Excel: openpyxl not installed (skipping)")
-        return mhlw_dict
+    """厚労省薬価基準Excelから成分名→4桁薬効分類コード辞書を構築
 
+    ブックごとの結果は data/cache/mhlw_<ファイル名>.json にキャッシュし、
+    ブックの sha256 が変わったときだけ読み直す。
+    """
+    mhlw_dict = {}
     for xlsx_path in MHLW_EXCELS:
         if not xlsx_path.exists():
             print(f"  MHLW Excel: {xlsx_path.name} not found")
             continue
-        wb = openpyxl.load_workbook(xlsx_path, read_only=True)
-        ws = wb[wb.sheetnames[0]]
-        count = 0
-        for i, row in enumerate(ws.iter_rows(values_only=True)):
-            if i == 0:
-                continue  # ヘッダー行
-            code12 = str(row[1] or "").strip()
-            ingredient = str(row[2] or "").strip()
-            if len(code12) >= 4 and ingredient:
-                code4 = code12[:4]
-                mhlw_dict.setdefault(ingredient, code4)
-                count += 1
-        wb.close()
-        print(f"  MHLW Excel: {xlsx_path.name} → {count} rows")
+
+        digest = file_sha256(xlsx_path)
+        cache_file = CACHE_DIR / f"mhlw_{xlsx_path.stem}.json"
+        cached = None
+        if cache_file.exists():
+            with open(cache_file, encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("version") != MHLW_CACHE_VERSION or cached.get("sha256") != digest:
+                cached = None
+
+        if cached is None:
+            name_to_code, count = _parse_mhlw_excel(xlsx_path)
+            cached = {"version": MHLW_CACHE_VERSION, "sha256": digest,
+                      "rows": count, "name_to_code": name_to_code}
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            write_json_atomic(cache_file, cached, indent=None)
+            print(f"  MHLW Excel: {xlsx_path.name} → {count} rows")
+        else:
+            print(f"  MHLW Excel: {xlsx_path.name} → {cached['rows']} rows (cached)")
+
+        for ingredient, code4 in cached["name_to_code"].items():
+            mhlw_dict.setdefault(ingredient, code4)
 
     print(f"  MHLW Excel: {len(mhlw_dict)} unique ingredients, "
           f"{len(set(mhlw_dict.values()))} codes")
@@ -487,43 +534,20 @@ def build_category_lookup(drugs: list, brand_data: dict) -> dict:
 
     # ===== Source 1: SSK 薬価基準マスター =====
     ssk_name_to_code = {}
-    if SSK_CSV.exists():
-        with open(SSK_CSV, "rb") as f:
-            text = f.read().decode("shift_jis", errors="replace")
-        reader = csv.reader(io.StringIO(text))
-        for row in reader:
-            if len(row) < 38:
-                continue
-            yj = row[31]
-            generic = row[37].strip()
-            if len(yj) < 4 or not generic.startswith("【般】"):
-                continue
-            code4 = yj[:4]
-            ing = _extract_ssk_ingredient(generic)
-            if len(ing) >= 2:
+    ssk_brand_to_code = {}
+    ssk_table = load_ssk_columns("category", ("code4", "ingredient", "brand"),
+                                 _ssk_category_row, SSK_CACHE_VERSION)
+    if ssk_table is not None:
+        # 一般名→コード と 商品名→コード（正規化済みの列はキャッシュから）
+        for code4, ing, brand in zip(ssk_table["code4"], ssk_table["ingredient"],
+                                     ssk_table["brand"]):
+            if ing:
                 ssk_name_to_code.setdefault(ing, code4)
-
-        # Also build brand→code for additional matching
-        ssk_brand_to_code = {}
-        reader2 = csv.reader(io.StringIO(text))
-        for row in reader2:
-            if len(row) < 35:
-                continue
-            yj = row[31]
-            if len(yj) < 4:
-                continue
-            brand = row[4].strip()
-            for form in sorted(SSK_DOSAGE_FORMS, key=len, reverse=True):
-                idx = brand.find(form)
-                if idx > 0:
-                    brand = brand[:idx]
-                    break
-            brand = re.sub(r"[\d０-９．・％%ｍｇμＬ]+$", "", brand).strip()
-            if len(brand) >= 2:
-                ssk_brand_to_code.setdefault(brand, yj[:4])
+            # Also build brand→code for additional matching
+            if brand:
+                ssk_brand_to_code.setdefault(brand, code4)
         print(f"  SSK: {len(ssk_name_to_code)} generic, {len(ssk_brand_to_code)} brand mappings")
     else:
-        ssk_brand_to_code = {}
         print("  SSK: not found (skipping)")
 
     # ===== Source 2: Wikidata ATC =====
@@ -1,76 +1,197 @@
 #!/usr/bin/env python3
 """
 new_08_fetch_atc.py
-Wikidata SPARQL から DrugBank ID → ATC コードを一括取得。
+Wikidata SPARQL から DrugBank ID → ATC コードを取得。
+
+クエリは分割して並行実行する:
+  - drug_master.json がある場合: 使用中の DrugBank ID を VALUES で CHUNK_SIZE 件ずつ
+  - 無い場合: DrugBank ID の範囲（DB00000〜）を FILTER で区切る。RANGE_MAX 以上の ID は
+    上限なしの最後のチャンクでまとめて取得する（ID が増えても取りこぼさない）
+各チャンクの結果は data/wikidata_atc.jsonl に追記するので、失敗・中断しても
+再実行時は未完了のチャンクだけを取得する。結果は CSV でストリーミングにパース。
 
 出力:
   data/wikidata_atc.json — { "DB00001": ["B01AE02"], ... }
 """
 
+import asyncio
+import csv
+import hashlib
 import json
-import time
-import urllib.request
-import urllib.parse
+import sys
 from pathlib import Path
 
+from checkpoint_journal import Journal
+from fetch_engine import AsyncFetcher, ordered_map
+from http_cache import CachedSession
+
 SCRIPT_DIR = Path(__file__).parent
 DATA_DIR = SCRIPT_DIR.parent / "data"
 OUTPUT = DATA_DIR / "wikidata_atc.json"
+JOURNAL = DATA_DIR / "wikidata_atc.jsonl"
+DRUG_MASTER = DATA_DIR / "drug_master.json"
 
 SPARQL_ENDPOINT = "https://query.wikidata.org/sparql"
+SPARQL_HOST = "query.wikidata.org"
+SPARQL_HEADERS = {
+    "User-Agent": "KusuriGraph/1.0 (drug interaction graph builder)",
+    "Accept": "text/csv",
+}
 
-QUERY = """
-SELECT ?drugbankId ?atc WHERE {
+CHUNK_SIZE = 200           # VALUES 1クエリ当たりの DrugBank ID 数
+RANGE_WIDTH = 1000         # ID 範囲モードの1チャンク幅
+RANGE_MAX = 20000          # ID 範囲モードで区切る上限（これ以上は1チャンクにまとめる）
+MAX_CONCURRENCY = 5        # WDQS は1IPあたり同時5クエリまで
+SPARQL_RATE = 5.0          # req/s
+SPARQL_TIMEOUT = 120
+
+QUERY_VALUES = """
+SELECT ?drugbankId ?atc WHERE {{
+  VALUES ?drugbankId {{ {values} }}
   ?item wdt:P715 ?drugbankId .
   ?item wdt:P267 ?atc .
-}
+}}
+"""
+
+QUERY_RANGE = """
+SELECT ?drugbankId ?atc WHERE {{
+  ?item wdt:P715 ?drugbankId .
+  ?item wdt:P267 ?atc .
+  FILTER(?drugbankId >= "{low}" && ?drugbankId < "{high}")
+}}
 """
 
+QUERY_TAIL = """
+SELECT ?drugbankId ?atc WHERE {{
+  ?item wdt:P715 ?drugbankId .
+  ?item wdt:P267 ?atc .
+  FILTER(?drugbankId >= "{low}")
+}}
+"""
 
-def fetch_wikidata_atc() -> dict:
-    """Wikidata SPARQL で DrugBank ID → ATC コードを一括取得"""
-    print("Wikidata SPARQL クエリ実行中...")
-
-    params = urllib.parse.urlencode({
-        "query": QUERY.strip(),
-        "format": "json",
-    })
-    url = f"{SPARQL_ENDPOINT}?{params}"
-
-    req = urllib.request.Request(url)
-    req.add_header("User-Agent", "KusuriGraph/1.0 (drug interaction graph builder)")
-    req.add_header("Accept", "application/sparql-results+json")
-
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            with urllib.request.urlopen(req, timeout=120) as resp:
-                data = json.loads(resp.read().decode("utf-8"))
-            break
-        except Exception as e:
-            if attempt < max_retries - 1:
-                wait = (attempt + 1) * 10
-                print(f"  リトライ {attempt+1}/{max_retries} ({e})... {wait}秒待機")
-                time.sleep(wait)
-            else:
-                raise
-
-    results = data.get("results", {}).get("bindings", [])
-    print(f"  取得件数: {len(results)} マッピング")
-
-    # DrugBank ID → ATC コードリスト
+
+def load_drugbank_ids() -> list[str]:
+    """drug_master.json で使われている DrugBank ID（無ければ空）"""
+    if not DRUG_MASTER.exists():
+        return []
+    with open(DRUG_MASTER, encoding="utf-8") as f:
+        master = json.load(f)
+    ids = {d.get("drugbank_id", "") for d in master.get("drugs", [])}
+    return sorted(i for i in ids if i.startswith("DB"))
+
+
+def build_chunks(drugbank_ids: list[str]) -> list[tuple[str, str]]:
+    """(チャンクキー, SPARQL) のリストを作る
+
+    キーは内容から決まるので、drug_master が変わった場合は別チャンクとして取り直す。
+    """
+    chunks = []
+    if drugbank_ids:
+        for i in range(0, len(drugbank_ids), CHUNK_SIZE):
+            ids = drugbank_ids[i:i + CHUNK_SIZE]
+            digest = hashlib.sha1(" ".join(ids).encode()).hexdigest()[:12]
+            values = " ".join(f'"{db_id}"' for db_id in ids)
+            chunks.append((f"values:{ids[0]}-{ids[-1]}:{digest}",
+                           QUERY_VALUES.format(values=values)))
+    else:
+        for start in range(0, RANGE_MAX, RANGE_WIDTH):
+            low, high = f"DB{start:05d}", f"DB{start + RANGE_WIDTH:05d}"
+            chunks.append((f"range:{low}-{high}", QUERY_RANGE.format(low=low, high=high)))
+        low = f"DB{RANGE_MAX:05d}"
+        chunks.append((f"range:{low}-", QUERY_TAIL.format(low=low)))
+    return chunks
+
+
+def parse_atc_csv(resp) -> dict:
+    """SPARQL の CSV 応答を逐次読み {DrugBank ID: [ATC]} を返す"""
     db_to_atc = {}
-    for r in results:
-        db_id = r["drugbankId"]["value"]
-        atc = r["atc"]["value"]
-        db_to_atc.setdefault(db_id, [])
-        if atc not in db_to_atc[db_id]:
-            db_to_atc[db_id].append(atc)
+    try:
+        lines = (line.decode("utf-8") for line in resp.iter_lines())
+        for row in csv.DictReader(lines):
+            db_id = row.get("drugbankId", "")
+            atc = row.get("atc", "")
+            if not db_id or not atc:
+                continue
+            db_to_atc.setdefault(db_id, [])
+            if atc not in db_to_atc[db_id]:
+                db_to_atc[db_id].append(atc)
+    finally:
+        resp.close()
+    return db_to_atc
+
+
+async def _fetch_chunks(chunks: list[tuple[str, str]], journal: Journal) -> int:
+    """未完了チャンクを並行取得してジャーナルに追記。失敗チャンク数を返す"""
+    fetcher = AsyncFetcher(rates={SPARQL_HOST: SPARQL_RATE}, session=CachedSession(),
+                           max_concurrency=MAX_CONCURRENCY, timeout=SPARQL_TIMEOUT,
+                           headers=SPARQL_HEADERS)
+
+    async def fetch_chunk(chunk: tuple[str, str]) -> dict | None:
+        key, query = chunk
+        resp = await fetcher.fetch(SPARQL_ENDPOINT, params={"query": query.strip()},
+                                   stream=True)
+        if resp is None or resp.status_code != 200:
+            status = resp.status_code if resp is not None else "no response"
+            print(f"  {key}: ERROR ({status})")
+            return None
+        # 本文の読み込み・パースはイベントループ外で
+        return await asyncio.to_thread(parse_atc_csv, resp)
+
+    failed = 0
+    async for (key, _), result in ordered_map(fetch_chunk, chunks, window=MAX_CONCURRENCY * 2):
+        if result is None:
+            failed += 1
+            continue
+        journal.append(key, result)
+        print(f"  {key}: {len(result)} DrugBank ID")
+        if key.endswith("-") and result:
+            print(f"  注意: DB{RANGE_MAX:05d} 以上の ID が {len(result)} 件"
+                  "（RANGE_MAX を上げると範囲ごとに並行取得できる）")
+
+    fetcher.close()
+    return failed
+
+
+def fetch_wikidata_atc() -> dict | None:
+    """Wikidata SPARQL で DrugBank ID → ATC コードを取得
+
+    失敗したチャンクがあれば None（完了分はジャーナルに残り、再実行で続きから）。
+    """
+    drugbank_ids = load_drugbank_ids()
+    chunks = build_chunks(drugbank_ids)
+    if drugbank_ids:
+        print(f"Wikidata SPARQL クエリ実行中... ({len(drugbank_ids)} DrugBank ID, {len(chunks)} チャンク)")
+    else:
+        print(f"Wikidata SPARQL クエリ実行中... (ID 範囲 {len(chunks)} チャンク)")
+
+    journal = Journal(JOURNAL, fsync_every=1)
+    done = journal.replay()
+    todo = [c for c in chunks if c[0] not in done]
+    if done:
+        print(f"  ジャーナルから再開: {len(chunks) - len(todo)}/{len(chunks)} チャンク完了済み")
+
+    with journal:
+        failed = asyncio.run(_fetch_chunks(todo, journal))
+    if failed:
+        print(f"  {failed} チャンク失敗。再実行すると未完了分のみ取得します")
+        return None
+
+    done = journal.replay()
+
+    # DrugBank ID → ATC コードリスト（チャンク順に統合）
+    db_to_atc = {}
+    for key, _ in chunks:
+        for db_id, atcs in done.get(key, {}).items():
+            db_to_atc.setdefault(db_id, [])
+            for atc in atcs:
+                if atc not in db_to_atc[db_id]:
+                    db_to_atc[db_id].append(atc)
 
     print(f"  ユニーク DrugBank ID: {len(db_to_atc)}")
     total_atc = sum(len(v) for v in db_to_atc.values())
     print(f"  合計 ATC コード: {total_atc}")
 
+    journal.compact(OUTPUT, db_to_atc)
     return db_to_atc
 
 
@@ -78,7 +199,6 @@ def main():
     print("=== Wikidata DrugBank→ATC 取得 ===\n")
 
     # キャッシュがあればスキップ（強制再取得は --force で）
-    import sys
     if OUTPUT.exists() and "--force" not in sys.argv:
         with open(OUTPUT) as f:
             cached = json.load(f)
@@ -87,10 +207,8 @@ def main():
         return
 
     db_to_atc = fetch_wikidata_atc()
-
-    # 保存
-    with open(OUTPUT, "w", encoding="utf-8") as f:
-        json.dump(db_to_atc, f, ensure_ascii=False, indent=2)
+    if db_to_atc is None:
+        sys.exit(1)
 
     size_kb = OUTPUT.stat().st_size / 1024
     print(f"\n保存: {OUTPUT} ({size_kb:.0f} KB)")
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+run_pipeline.py
+new_* パイプラインの取得スクリプトを依存関係に従って並行実行する。
+
+KEGG / DDinter2 / ChEMBL / Wikidata / SSK / 厚労省 はホストもレート制限も別なので、
+依存の無いものは同時に走らせる（各スクリプトはそれぞれのプロセス内で
+自分のホスト別レート制限を守る）。全体の所要時間は最も遅い系列に近づく。
+
+依存関係:
+  new_01 (厚労省)  ─┐
+  new_02 (DDinter) ─┴→ new_03 (名寄せ) ─┬→ new_05 (JADER)
+                                       ├→ new_06 (商品名) ←─ ssk (SSK 先行DL)
+                                       └→ new_08 (Wikidata)
+  new_04 (ChEMBL)
+  全部 → new_07 (グラフ生成)
+
+各行の出力は [ステップ名] 付きで表示し、最後にタイムラインとクリティカルパスを出す。
+タイムラインは data/telemetry/pipeline_timeline.json にも保存。
+
+オプション:
+  --only a,b      指定ステップのみ（依存ステップは実行しない）
+  --skip a,b      指定ステップを除く（依存先は既存の出力を使う）
+  --parallel N    同時実行数の上限（既定: 無制限）
+  --dry-run       実行順序だけ表示
+  --force         各スクリプトへそのまま渡す（キャッシュ済み出力を無視して再取得）
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR.parent / "data"
+TIMELINE_OUTPUT = DATA_DIR / "telemetry" / "pipeline_timeline.json"
+
+# (ステップ名, スクリプト, 依存ステップ)
+PIPELINE = [
+    ("new_01", "new_01_fetch_yakka_drugs.py", []),
+    ("new_02", "new_02_fetch_ddinter2.py", []),
+    ("new_04", "new_04_fetch_cyp_chembl.py", []),
+    ("ssk", "ssk_master.py", []),
+    ("new_03", "new_03_match_names.py", ["new_01", "new_02"]),
+    ("new_05", "new_05_fetch_jader.py", ["new_03"]),
+    ("new_06", "new_06_fetch_brand_names.py", ["new_03", "ssk"]),
+    ("new_08", "new_08_fetch_atc.py", ["new_03"]),
+    ("new_07", "new_07_build_graph.py", ["new_04", "new_05", "new_06", "new_08"]),
+]
+
+FORWARD_ARGS = ["--force"]
+BAR_WIDTH = 40
+
+
+def _arg_list(name: str) -> list[str]:
+    if name in sys.argv:
+        return [s for s in sys.argv[sys.argv.index(name) + 1].split(",") if s]
+    return []
+
+
+def select_steps() -> list[tuple[str, str, list[str]]]:
+    """--only / --skip を反映。外したステップへの依存は無視する"""
+    only, skip = _arg_list("--only"), _arg_list("--skip")
+    names = {name for name, _, _ in PIPELINE}
+    unknown = [n for n in only + skip if n not in names]
+    if unknown:
+        print(f"未知のステップ: {unknown}（{sorted(names)}）")
+        sys.exit(2)
+
+    selected = [s for s in PIPELINE if (not only or s[0] in only) and s[0] not in skip]
+    chosen = {name for name, _, _ in selected}
+    return [(name, script, [d for d in deps if d in chosen]) for name, script, deps in selected]
+
+
+async def run_step(name: str, script: str, args: list[str], width: int) -> int:
+    """スクリプトを子プロセスで実行し、出力に [name] を付けて流す"""
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, str(SCRIPT_DIR / script), *args,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+        cwd=SCRIPT_DIR.parent, env=env,
+    )
+    prefix = f"[{name}]".ljust(width + 2)
+    async for line in proc.stdout:
+        print(f"{prefix} {line.decode('utf-8', errors='replace').rstrip()}", flush=True)
+    return await proc.wait()
+
+
+async def run_pipeline(steps: list, args: list[str], parallel: int | None) -> dict:
+    """依存が終わったものから並行実行。結果 {name: {status, start, end, deps}}"""
+    t0 = time.monotonic()
+    width = max(len(name) for name, _, _ in steps)
+    semaphore = asyncio.Semaphore(parallel) if parallel else None
+    results = {}
+    tasks = {}
+
+    async def run(name, script, deps):
+        await asyncio.gather(*(tasks[d] for d in deps))
+        failed = [d for d in deps if results[d]["status"] != "ok"]
+        if failed:
+            print(f"[{name}] スキップ（依存失敗: {', '.join(failed)}）", flush=True)
+            results[name] = {"status": "skipped", "start": None, "end": None, "deps": deps}
+            return
+
+        if semaphore:
+            await semaphore.acquire()
+        start = time.monotonic() - t0
+        print(f"[{name}] 開始 {script} ({start:.1f}s)", flush=True)
+        try:
+            rc = await run_step(name, script, args, width)
+        finally:
+            if semaphore:
+                semaphore.release()
+        end = time.monotonic() - t0
+        status = "ok" if rc == 0 else f"exit {rc}"
+        print(f"[{name}] 終了 {status} ({end - start:.1f}s)", flush=True)
+        results[name] = {"status": status, "start": round(start, 3), "end": round(end, 3), "deps": deps}
+
+    for name, script, deps in steps:
+        tasks[name] = asyncio.ensure_future(run(name, script, deps))
+    await asyncio.gather(*tasks.values())
+    return results
+
+
+def critical_path(results: dict) -> list[str]:
+    """最後に終わったステップから、最も遅く終わった依存を辿った経路"""
+    done = {n: r for n, r in results.items() if r["end"] is not None}
+    if not done:
+        return []
+    name = max(done, key=lambda n: done[n]["end"])
+    path = [name]
+    while True:
+        deps = [d for d in done[name]["deps"] if d in done]
+        if not deps:
+            break
+        name = max(deps, key=lambda d: done[d]["end"])
+        path.append(name)
+    return path[::-1]
+
+
+def report(results: dict, total: float):
+    path = critical_path(results)
+    scale = BAR_WIDTH / total if total > 0 else 0
+    width = max(len(n) for n in results)
+
+    print(f"\n=== Timeline ({total:.1f}s) ===")
+    for name, r in sorted(results.items(), key=lambda x: (x[1]["start"] is None, x[1]["start"] or 0)):
+        if r["start"] is None:
+            print(f"  {name.ljust(width)}  {r['status']}")
+            continue
+        lead = int(r["start"] * scale)
+        bar = "█" * max(1, int((r["end"] - r["start"]) * scale))
+        mark = "*" if name in path else " "
+        print(f" {mark}{name.ljust(width)}  {' ' * lead}{bar}"
+              f"  {r['start']:.1f}s → {r['end']:.1f}s ({r['end'] - r['start']:.1f}s) {r['status']}")
+
+    if path:
+        serial = sum(r["end"] - r["start"] for r in results.values() if r["start"] is not None)
+        print(f"\nクリティカルパス (*): {' → '.join(path)}")
+        print(f"逐次実行した場合の合計: {serial:.1f}s / 並行実行: {total:.1f}s")
+
+
+def main():
+    steps = select_steps()
+    args = [a for a in FORWARD_ARGS if a in sys.argv]
+    parallel = int(sys.argv[sys.argv.index("--parallel") + 1]) if "--parallel" in sys.argv else None
+
+    print("=== Fetch pipeline ===")
+    for name, script, deps in steps:
+        print(f"  {name}: {script}" + (f"  (after {', '.join(deps)})" if deps else ""))
+    if "--dry-run" in sys.argv:
+        return
+
+    t0 = time.monotonic()
+    results = asyncio.run(run_pipeline(steps, args, parallel))
+    total = time.monotonic() - t0
+    report(results, total)
+
+    TIMELINE_OUTPUT.parent.mkdir(parents=True, exist_ok=True)
+    with open(TIMELINE_OUTPUT, "w", encoding="utf-8") as f:
+        json.dump({
+            "total_s": round(total, 3),
+            "critical_path": critical_path(results),
+            "steps": results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"保存: {TIMELINE_OUTPUT}")
+
+    if any(r["status"] != "ok" for r in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+ssk_master.py
+SSK 薬価基準マスターのストリーミングリーダー（11 / new_06 / new_07 共通）。
+
+ダウンロードした zip はそのまま data/ に置き、CSV を展開せずに
+zip メンバーから Shift_JIS を逐次デコードして1パスで読む。
+以前のパイプラインで展開済みの data/ssk_yakka_master.csv があればそちらを使う。
+
+列（0始まり）:
+  4  = 商品名
+  31 = YJコード（先頭4桁が薬効分類）
+  37 = 【般】一般名（一般名処方マスタに載っている品目のみ）
+
+使い方:
+    for row in iter_ssk_rows():
+        row.brand, row.yj_code, row.generic
+
+行ごとの正規化（剤形除去・成分名抽出など）の結果は load_ssk_columns で
+列形式のキャッシュ（data/cache/ssk_<tag>.json）に保存できる。マスターの
+sha256 が変わらない限り、次回は Shift_JIS のデコードも正規化もせずに読み込む。
+    table = load_ssk_columns("brands", ("ingredient", "brand"), derive)
+    for ingredient, brand in zip(table["ingredient"], table["brand"]): ...
+"""
+
+import csv
+import hashlib
+import io
+import json
+import zipfile
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple
+
+from checkpoint_journal import write_json_atomic
+from http_cache import fetch_bytes
+
+SCRIPT_DIR = Path(__file__).parent
+DATA_DIR = SCRIPT_DIR.parent / "data"
+CACHE_DIR = DATA_DIR / "cache"
+
+SSK_ZIP_URL = "https://www.ssk.or.jp/seikyushiharai/tensuhyo/kihonmasta/r06/kihonmasta_04.files/y_ALL20260219.zip"
+SSK_ZIP = DATA_DIR / "ssk_yakka_master.zip"
+SSK_CSV = DATA_DIR / "ssk_yakka_master.csv"   # 旧形式（展開済み CSV）
+SSK_ENCODING = "shift_jis"
+
+COL_BRAND = 4
+COL_YJ = 31
+COL_GENERIC = 37
+MIN_COLUMNS = 35   # これ未満の行は商品名・YJコードとも使わない
+HASH_CHUNK_SIZE = 1 << 20
+
+
+class SskRow(NamedTuple):
+    brand: str      # 商品名（前後空白除去済み）
+    yj_code: str    # YJコード
+    generic: str    # 【般】一般名（無ければ空文字）
+
+
+def ssk_source() -> Path | None:
+    """手元にある SSK マスター（zip または展開済み CSV）。無ければ None"""
+    for path in (SSK_ZIP, SSK_CSV):
+        if path.exists():
+            return path
+    return None
+
+
+def download_ssk_master() -> Path:
+    """SSK薬価マスターの zip をダウンロード（手元にあればそれを使う）"""
+    path = ssk_source()
+    if path is not None:
+        print(f"キャッシュ使用: {path}")
+        return path
+
+    print(f"SSKマスターダウンロード: {SSK_ZIP_URL}")
+    SSK_ZIP.parent.mkdir(parents=True, exist_ok=True)
+    tmp = SSK_ZIP.with_name(SSK_ZIP.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(fetch_bytes(SSK_ZIP_URL))
+    tmp.replace(SSK_ZIP)
+    print(f"保存: {SSK_ZIP}")
+    return SSK_ZIP
+
+
+def _iter_csv_rows(path: Path) -> Iterator[list[str]]:
+    """zip 内の CSV または CSV ファイルを1行ずつ返す"""
+    if path.suffix == ".zip":
+        with zipfile.ZipFile(path) as zf:
+            csv_name = [n for n in zf.namelist() if n.endswith(".csv")][0]
+            with zf.open(csv_name) as src:
+                text = io.TextIOWrapper(src, encoding=SSK_ENCODING, errors="replace", newline="")
+                yield from csv.reader(text)
+    else:
+        with open(path, encoding=SSK_ENCODING, errors="replace", newline="") as f:
+            yield from csv.reader(f)
+
+
+def iter_ssk_rows(path: Path = None) -> Iterator[SskRow]:
+    """SSK マスターを1パスで読み SskRow を返す（path 省略時は手元のものを使う）"""
+    path = path or ssk_source()
+    if path is None:
+        return
+    for row in _iter_csv_rows(path):
+        if len(row) < MIN_COLUMNS:
+            continue
+        generic = row[COL_GENERIC].strip() if len(row) > COL_GENERIC else ""
+        yield SskRow(row[COL_BRAND].strip(), row[COL_YJ], generic)
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _encode_column(values: list) -> dict:
+    """列を 値の一覧 + 各行の番号 に辞書符号化（同じ成分名・コードの繰り返しを1つにまとめる）"""
+    index = {}
+    codes = [index.setdefault(v, len(index)) for v in values]
+    return {"values": list(index), "codes": codes}
+
+
+def _decode_column(column: dict) -> list:
+    values = column["values"]
+    return [values[c] for c in column["codes"]]
+
+
+def load_ssk_columns(tag: str, columns: tuple[str, ...],
+                     derive: Callable[[SskRow], tuple | None],
+                     version: int = 1, path: Path = None) -> dict[str, list] | None:
+    """各行を derive(row) で変換した表を {列名: [値, ...]} で返す（キャッシュ付き）
+
+    derive は columns と同じ長さのタプルを返す（その行を使わないなら None）。
+    結果は data/cache/ssk_<tag>.json に保存し、マスターの sha256・version・columns が
+    前回と同じならパースせずに読み込む。derive の処理を変えたら version を上げる。
+    マスターが無ければ None。
+    """
+    path = path or ssk_source()
+    if path is None:
+        return None
+    digest = file_sha256(path)
+
+    cache_file = CACHE_DIR / f"ssk_{tag}.json"
+    if cache_file.exists():
+        try:
+            with open(cache_file, encoding="utf-8") as f:
+                cached = json.load(f)
+            if (cached.get("version") == version and cached.get("sha256") == digest
+                    and cached.get("columns") == list(columns)):
+                return {name: _decode_column(cached["data"][name]) for name in columns}
+        except (ValueError, KeyError):
+            pass
+
+    table = {name: [] for name in columns}
+    for row in iter_ssk_rows(path):
+        values = derive(row)
+        if values is None:
+            continue
+        for name, value in zip(columns, values):
+            table[name].append(value)
+
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    write_json_atomic(cache_file, {
+        "version": version,
+        "tag": tag,
+        "source": path.name,
+        "sha256": digest,
+        "columns": list(columns),
+        "rows": len(table[columns[0]]) if columns else 0,
+        "data": {name: _encode_column(values) for name, values in table.items()},
+    }, indent=None)
+    return table
+
+
+if __name__ == "__main__":
+    # 先行ダウンロード用（run_pipeline.py から他の取得と並行に実行）
+    download_ssk_master()
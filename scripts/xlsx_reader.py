@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+xlsx_reader.py
+XLSX の指定列だけを読む軽量ストリーミングリーダー（標準ライブラリのみ）。
+
+XLSX は zip 内の XML なので、openpyxl でブック全体を開かずに
+  xl/workbook.xml (+ _rels)  → 先頭シートのパス
+  xl/sharedStrings.xml       → 共有文字列表（openpyxl と同じく全件をメモリに持つ）
+  xl/worksheets/sheetN.xml   → iterparse で行を逐次読み、必要な列のセルだけ取り出して1行ずつ返す
+の順に読む。行はバッファしないので、メモリはシートの行数によらず共有文字列表の分だけ。
+ふりがな（<rPh>）は openpyxl と同じく値に含めない。数値セルは int / float、真偽値セルは bool で返す。
+
+使い方:
+    for code, name in iter_xlsx_columns(path, (1, 2)):   # 0始まりの列番号（B, C 列）
+        ...
+"""
+
+import re
+import zipfile
+from pathlib import Path
+from typing import Iterator
+from xml.etree.ElementTree import iterparse
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_CELL_REF = re.compile(r"^([A-Z]+)")
+
+
+def column_index(ref: str) -> int:
+    """セル参照 "C12" → 列番号 2（0始まり）"""
+    letters = _CELL_REF.match(ref).group(1)
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - ord("A") + 1
+    return index - 1
+
+
+def _first_sheet_path(zf: zipfile.ZipFile) -> str:
+    """workbook.xml の先頭シートに対応する zip 内パス"""
+    with zf.open("xl/workbook.xml") as f:
+        for _, elem in iterparse(f):
+            if elem.tag == f"{NS_MAIN}sheet":
+                rel_id = elem.get(f"{NS_REL}id")
+                break
+        else:
+            raise ValueError("workbook.xml にシートがありません")
+
+    with zf.open("xl/_rels/workbook.xml.rels") as f:
+        for _, elem in iterparse(f):
+            if elem.tag == f"{NS_PKG_REL}Relationship" and elem.get("Id") == rel_id:
+                target = elem.get("Target")
+                return target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+    raise ValueError(f"シート {rel_id} の実体が見つかりません")
+
+
+def _rich_text(elem) -> str:
+    """<si> / <is> の文字列: 直下の <t> と リッチテキスト <r><t> を連結（<rPh> のふりがなは除く）"""
+    parts = []
+    for child in elem:
+        if child.tag == f"{NS_MAIN}t":
+            parts.append(child.text or "")
+        elif child.tag == f"{NS_MAIN}r":
+            parts += [t.text or "" for t in child.findall(f"{NS_MAIN}t")]
+    return "".join(parts)
+
+
+def _shared_strings(zf: zipfile.ZipFile) -> list[str]:
+    """sharedStrings.xml の文字列（番号順）"""
+    strings = []
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return strings
+
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, elem in iterparse(f):
+            if elem.tag != f"{NS_MAIN}si":
+                continue
+            strings.append(_rich_text(elem))
+            elem.clear()
+    return strings
+
+
+def _number(text: str):
+    """数値セルの値: 整数なら int、それ以外は float（"1.5E-3" など）"""
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _cell_value(cell, strings: list[str]):
+    """セルの値（共有文字列・インライン文字列は str、数値は int / float、真偽値は bool）"""
+    kind = cell.get("t", "n")
+    if kind == "inlineStr":
+        inline = cell.find(f"{NS_MAIN}is")
+        return _rich_text(inline) if inline is not None else None
+    v = cell.find(f"{NS_MAIN}v")
+    if v is None or v.text is None:
+        return None
+    if kind == "s":
+        index = int(v.text)
+        return strings[index] if index < len(strings) else ""
+    if kind == "n":
+        return _number(v.text)
+    if kind == "b":
+        return v.text == "1"
+    return v.text  # "str"（数式の文字列結果）・"e"（エラー値）
+
+
+def iter_xlsx_columns(path: Path, columns: tuple[int, ...]) -> Iterator[tuple]:
+    """先頭シートの各行について columns の列の値をタプルで返す（空セルは None）"""
+    wanted_cols = {c: i for i, c in enumerate(columns)}
+
+    with zipfile.ZipFile(path) as zf:
+        sheet = _first_sheet_path(zf)
+        strings = _shared_strings(zf)
+        with zf.open(sheet) as f:
+            row = None
+            next_col = 0
+            for event, elem in iterparse(f, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == f"{NS_MAIN}row":
+                        row = [None] * len(columns)
+                        next_col = 0
+                    continue
+                if elem.tag == f"{NS_MAIN}c":
+                    ref = elem.get("r")
+                    col = column_index(ref) if ref else next_col
+                    next_col = col + 1
+                    if col in wanted_cols:
+                        row[wanted_cols[col]] = _cell_value(elem, strings)
+                    elem.clear()
+                elif elem.tag == f"{NS_MAIN}row":
+                    yield tuple(row)
+                    elem.clear()